@@ -0,0 +1,271 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+from dotenv import load_dotenv
+from llm_client import get_client
+from schema_manager import (
+    schema_selection_messages,
+    parse_schema_selection,
+    structure_messages
+)
+
+load_dotenv()
+
+client = get_client()
+
+MODEL = "gpt-4o"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def episode_key(topics_file: str) -> str:
+    """
+    Key an episode by its topics file.
+
+    The key is the file name followed by a hash of the file's full path, so
+    files with the same name in different directories (e.g.,
+    show_a/transcription_topics.json and show_b/transcription_topics.json)
+    get different keys, and the key stays short enough for a custom_id.
+    """
+    name = os.path.splitext(os.path.basename(topics_file))[0][:32]
+    digest = hashlib.sha256(os.path.realpath(topics_file).encode("utf-8")).hexdigest()[:12]
+    return f"{name}-{digest}"
+
+
+def _custom_id(episode: str, topic_key: str, step: str) -> str:
+    return f"{episode}::{topic_key}::{step}"
+
+
+def _split_custom_id(custom_id: str) -> Tuple[str, str, str]:
+    episode, topic_key, step = custom_id.rsplit("::", 2)
+    return episode, topic_key, step
+
+
+def _batch_line(custom_id: str, messages: List[Dict[str, str]]) -> str:
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": MODEL,
+            "messages": messages,
+            "temperature": 0.3,
+            "response_format": {"type": "json_object"}
+        }
+    }, ensure_ascii=False)
+
+
+def write_batch_file(lines: List[str], path: str) -> str:
+    """Write batch request lines to a JSONL file."""
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+    return path
+
+
+def submit_and_wait(batch_file: str, poll_interval: float = 30.0) -> Dict[str, str]:
+    """
+    Upload a JSONL batch file, submit it and wait for it to finish.
+
+    Args:
+        batch_file: Path of the JSONL file of requests
+        poll_interval: Seconds between two status checks
+
+    Returns:
+        Dictionary mapping custom_id to the response content; failed requests are left out
+    """
+    with open(batch_file, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"Submitted batch {batch.id} ({batch_file})")
+
+    while batch.status not in TERMINAL_STATUSES:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"  {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+        else:
+            print(f"  {batch.status}")
+
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Error: batch {batch.id} ended with status '{batch.status}'")
+        sys.exit(1)
+
+    contents = {}
+    output = client.files.content(batch.output_file_id).text
+    for line in io.StringIO(output):
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get("response") or {}
+        if entry.get("error") or response.get("status_code") != 200:
+            print(f"Warning: request {entry.get('custom_id')} failed: {entry.get('error') or response.get('status_code')}")
+            continue
+        contents[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return contents
+
+
+def process_corpus_batch(
+    topics_files: List[str],
+    output_dir: str,
+    work_dir: str = "batches",
+    poll_interval: float = 30.0
+) -> Dict[str, Any]:
+    """
+    Structure many episodes with the Batch API.
+
+    Schema selection for every topic of every episode is submitted as one
+    batch; the structure extraction requests, which need the selected
+    schema, are submitted as a second batch. Results are written to
+    output_dir in the same layout as text_to_structure, one file per episode.
+
+    Args:
+        topics_files: Topics JSON files, one per episode
+        output_dir: Directory to save one structured output file per
+            episode, named <episode key>_structured.json (see episode_key)
+        work_dir: Directory for the batch JSONL files
+        poll_interval: Seconds between two status checks
+
+    Returns:
+        Dictionary with the number of topics, elapsed seconds and topics/hour
+
+    Raises:
+        ValueError: If a topics file is given more than once
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(work_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    episodes = {}
+    for topics_file in topics_files:
+        episode = episode_key(topics_file)
+        if episode in episodes:
+            raise ValueError(f"Topics file '{topics_file}' is given more than once")
+        with open(topics_file, "r", encoding="utf-8") as f:
+            episodes[episode] = {
+                topic_key: topic_data
+                for topic_key, topic_data in json.load(f).items()
+                if topic_data.get("transcript")
+            }
+    total_topics = sum(len(topics) for topics in episodes.values())
+    print(f"Found {total_topics} topics in {len(episodes)} episodes")
+
+    # Batch 1: schema selection
+    print("\n[BATCH 1] Schema selection...")
+    selection_lines = [
+        _batch_line(
+            _custom_id(episode, topic_key, "select"),
+            schema_selection_messages(topic_data["transcript"])
+        )
+        for episode, topics in episodes.items()
+        for topic_key, topic_data in topics.items()
+    ]
+    selections = submit_and_wait(
+        write_batch_file(selection_lines, os.path.join(work_dir, "schema_selection.jsonl")),
+        poll_interval
+    )
+
+    # Batch 2: structure extraction with the selected schemas
+    print("\n[BATCH 2] Structure extraction...")
+    selected = {}
+    structure_lines = []
+    for custom_id, selection_content in selections.items():
+        episode, topic_key, _ = _split_custom_id(custom_id)
+        topic_data = episodes[episode][topic_key]
+        schema_type, schema_selection = parse_schema_selection(selection_content)
+        selected[(episode, topic_key)] = schema_selection
+        structure_lines.append(_batch_line(
+            _custom_id(episode, topic_key, "structure"),
+            structure_messages(
+                topic_data["transcript"],
+                topic_data.get("title"),
+                schema_type,
+                selection_content
+            )
+        ))
+    structures = submit_and_wait(
+        write_batch_file(structure_lines, os.path.join(work_dir, "structure_extraction.jsonl")),
+        poll_interval
+    )
+
+    # Rehydrate results into the structured_output layout, in topic_N order
+    for episode, topics in episodes.items():
+        results = {}
+        for topic_key, topic_data in topics.items():
+            topic_title = topic_data.get("title")
+            transcript = topic_data["transcript"]
+            schema_selection = selected.get((episode, topic_key))
+            content = structures.get(_custom_id(episode, topic_key, "structure"))
+            try:
+                if schema_selection is None or content is None:
+                    raise ValueError("batch request failed")
+                structure_result = json.loads(content)
+                results[topic_key] = {
+                    "title": topic_title,
+                    "original_transcript": transcript,
+                    "schema_type": schema_selection.get("selected_schema"),
+                    "schema_selection": schema_selection,
+                    "topic": structure_result.get("topic", topic_title),
+                    "nodes": structure_result.get("nodes", []),
+                    "connections": structure_result.get("connections", [])
+                }
+            except (ValueError, json.JSONDecodeError) as e:
+                results[topic_key] = {
+                    "title": topic_title,
+                    "original_transcript": transcript,
+                    "error": str(e),
+                    "nodes": [],
+                    "connections": []
+                }
+
+        output_file = os.path.join(output_dir, f"{episode}_structured.json")
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✓ Saved {len(results)} topics to {output_file}")
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "episodes": len(episodes),
+        "topics": total_topics,
+        "seconds": elapsed,
+        "topics_per_hour": total_topics / elapsed * 3600 if elapsed else 0.0
+    }
+
+    print("\n" + "=" * 80)
+    print("BATCH PROCESSING SUMMARY")
+    print("=" * 80)
+    print(f"Episodes: {report['episodes']}")
+    print(f"Topics: {report['topics']}")
+    print(f"Elapsed: {report['seconds']:.1f}s")
+    print(f"Throughput: {report['topics_per_hour']:.0f} topics/hour")
+    print("=" * 80)
+    return report
+
+
+def main():
+    """Main function for command-line usage."""
+    if len(sys.argv) < 3:
+        print("Usage: python batch_processing.py <output_dir> <topics_file> [topics_file ...]")
+        print("  output_dir: Directory to save one structured output file per episode")
+        print("  topics_file: Topics JSON files, one per episode (e.g., transcription_topics.json)")
+        print("\nExample:")
+        print("  python batch_processing.py structured_outputs episodes/*_topics.json")
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    topics_files = sys.argv[2:]
+
+    process_corpus_batch(topics_files, output_dir)
+
+
+if __name__ == "__main__":
+    main()
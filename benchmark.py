@@ -0,0 +1,1388 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from stub_llm_server import start_stub_server, stub_completion_content
+
+
+def _point_client_at(server) -> None:
+    """Route the OpenAI clients of the pipeline modules to the stub server."""
+    # Must run before the pipeline modules are imported, since they create
+    # their clients at import time
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+    # Every run must reach the server, otherwise later runs are cache hits
+    os.environ["LLM_CACHE_BYPASS"] = "1"
+
+
+def benchmark_structuring(
+    topics_file: str = "transcription_topics.json",
+    latency: float = 0.2,
+    worker_counts: List[int] = (1, 4, 16)
+) -> List[Dict[str, Any]]:
+    """
+    Measure wall-clock time of text_to_structure against a stub LLM server.
+
+    Args:
+        topics_file: Topics JSON file to structure
+        latency: Injected latency per chat completion, in seconds
+        worker_counts: max_workers values to compare
+
+    Returns:
+        One row per worker count with elapsed time, request count and speedup
+    """
+    server = start_stub_server(latency=latency)
+    _point_client_at(server)
+    from text_to_structure import process_transcript_topics_file
+
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, "structured_output.json")
+            for workers in worker_counts:
+                requests_before = server.request_count
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    process_transcript_topics_file(topics_file, output_file, max_workers=workers)
+                elapsed = time.perf_counter() - start
+                rows.append({
+                    "workers": workers,
+                    "seconds": elapsed,
+                    "requests": server.request_count - requests_before
+                })
+    finally:
+        server.shutdown()
+
+    baseline = rows[0]["seconds"]
+    for row in rows:
+        row["speedup"] = baseline / row["seconds"]
+
+    print("=" * 80)
+    print(f"STRUCTURING BENCHMARK ({topics_file}, {latency}s injected latency per call)")
+    print("=" * 80)
+    print(f"{'workers':>8} {'requests':>9} {'seconds':>9} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['workers']:>8} {row['requests']:>9} {row['seconds']:>9.2f} {row['speedup']:>7.1f}x")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_fused(
+    topics_file: str = "transcription_topics.json",
+    latency: float = 0.2
+) -> List[Dict[str, Any]]:
+    """
+    Compare tokens and latency per topic of the two-step and fused schema modes.
+
+    Args:
+        topics_file: Topics JSON file to structure
+        latency: Injected latency per chat completion, in seconds
+
+    Returns:
+        One row per mode with requests, prompt/completion tokens and seconds per topic
+    """
+    server = start_stub_server(latency=latency)
+    _point_client_at(server)
+    from schema_manager import transcript_to_structured_format
+
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = [t for t in json.load(f).values() if t.get("transcript")]
+
+    rows = []
+    try:
+        for mode in ("two_step", "fused"):
+            before = (server.request_count, server.prompt_tokens, server.completion_tokens)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for topic in topics:
+                    transcript_to_structured_format(topic["transcript"], topic["title"], mode=mode)
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "mode": mode,
+                "requests": (server.request_count - before[0]) / len(topics),
+                "prompt_tokens": (server.prompt_tokens - before[1]) / len(topics),
+                "completion_tokens": (server.completion_tokens - before[2]) / len(topics),
+                "seconds": elapsed / len(topics)
+            })
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(f"SCHEMA MODE BENCHMARK ({len(topics)} topics, {latency}s injected latency per call)")
+    print("=" * 80)
+    print(f"{'mode':>10} {'calls/topic':>12} {'prompt tok/topic':>17} {'compl. tok/topic':>17} {'s/topic':>8}")
+    for row in rows:
+        print(
+            f"{row['mode']:>10} {row['requests']:>12.1f} {row['prompt_tokens']:>17.0f} "
+            f"{row['completion_tokens']:>17.0f} {row['seconds']:>8.2f}"
+        )
+    print("=" * 80)
+    return rows
+
+
+def _prompt_digest() -> str:
+    """Hash every system prompt built by schema_manager."""
+    from schema.schema_type import SchemaType
+    from schema_manager import system_prompt, structure_system_prompt, fused_system_prompt
+
+    digest = hashlib.sha256()
+    digest.update(system_prompt().encode("utf-8"))
+    digest.update(fused_system_prompt().encode("utf-8"))
+    for schema_type in SchemaType:
+        digest.update(structure_system_prompt(schema_type).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def benchmark_prompts(iterations: int = 2000) -> Dict[str, Any]:
+    """
+    Time system prompt construction with and without memoization, and
+    check that the prompts are byte-identical across processes.
+
+    Args:
+        iterations: Number of topics to simulate
+
+    Returns:
+        Dictionary with microseconds per topic for both paths and the stability check
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    from schema.schema_type import SchemaType
+    from schema_manager import system_prompt, structure_system_prompt
+
+    schema_types = list(SchemaType)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        system_prompt.__wrapped__()
+        structure_system_prompt.__wrapped__(schema_types[i % len(schema_types)])
+    uncached = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        system_prompt()
+        structure_system_prompt(schema_types[i % len(schema_types)])
+    cached = (time.perf_counter() - start) / iterations * 1e6
+
+    local_digest = _prompt_digest()
+    other_digest = subprocess.run(
+        [sys.executable, "-c", "import benchmark; print(benchmark._prompt_digest())"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONHASHSEED": "random"},
+        check=True
+    ).stdout.strip()
+
+    print("=" * 80)
+    print(f"PROMPT BUILD BENCHMARK ({iterations} topics, schema + structure system prompts)")
+    print("=" * 80)
+    print(f"Rebuilt per call: {uncached:>10.1f} us/topic")
+    print(f"Memoized:         {cached:>10.1f} us/topic ({uncached / cached:.0f}x faster)")
+    print(f"Byte-stable across processes: {'yes' if local_digest == other_digest else 'NO'} ({local_digest[:16]})")
+    print("=" * 80)
+    return {
+        "uncached_us": uncached,
+        "cached_us": cached,
+        "byte_stable": local_digest == other_digest
+    }
+
+
+def benchmark_batch(
+    topics_file: str = "transcription_topics.json",
+    episodes: int = 4,
+    latency: float = 0.2,
+    batch_latency: float = 2.0,
+    max_workers: int = 4
+) -> List[Dict[str, Any]]:
+    """
+    Compare throughput of the interactive and batch structuring paths.
+
+    Args:
+        topics_file: Topics JSON file copied to make up the corpus
+        episodes: Number of copies of the episode in the corpus
+        latency: Injected latency per interactive chat completion, in seconds
+        batch_latency: Injected time for a whole batch to complete, in seconds
+        max_workers: Concurrency of the interactive path
+
+    Returns:
+        One row per path with topics, seconds and topics/hour
+    """
+    server = start_stub_server(latency=latency, batch_latency=batch_latency)
+    _point_client_at(server)
+    from text_to_structure import process_transcript_topics_file
+    from batch_processing import process_corpus_batch
+
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            corpus = []
+            for i in range(episodes):
+                episode_file = os.path.join(tmp_dir, f"episode_{i + 1}_topics.json")
+                shutil.copy(topics_file, episode_file)
+                corpus.append(episode_file)
+
+            with open(topics_file, "r", encoding="utf-8") as f:
+                topics = len(json.load(f)) * episodes
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for episode_file in corpus:
+                    process_transcript_topics_file(
+                        episode_file,
+                        episode_file.replace("_topics.json", "_structured.json"),
+                        max_workers=max_workers
+                    )
+            elapsed = time.perf_counter() - start
+            rows.append({"path": f"interactive x{max_workers}", "topics": topics, "seconds": elapsed})
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_corpus_batch(
+                    corpus,
+                    os.path.join(tmp_dir, "batch_output"),
+                    work_dir=os.path.join(tmp_dir, "batches"),
+                    poll_interval=0.1
+                )
+            elapsed = time.perf_counter() - start
+            rows.append({"path": "batch", "topics": topics, "seconds": elapsed})
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(
+        f"BATCH BENCHMARK ({episodes} episodes, {latency}s per interactive call, "
+        f"{batch_latency}s per batch)"
+    )
+    print("=" * 80)
+    print(f"{'path':>16} {'topics':>7} {'seconds':>9} {'topics/hour':>12}")
+    for row in rows:
+        row["topics_per_hour"] = row["topics"] / row["seconds"] * 3600
+        print(f"{row['path']:>16} {row['topics']:>7} {row['seconds']:>9.2f} {row['topics_per_hour']:>12.0f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_streaming(
+    topics_file: str = "transcription_topics.json",
+    latency: float = 0.2,
+    stream_delay: float = 0.005
+) -> List[Dict[str, Any]]:
+    """
+    Compare time to first node of streamed and blocking structure extraction.
+
+    Args:
+        topics_file: Topics JSON file to structure
+        latency: Injected latency before the first token, in seconds
+        stream_delay: Injected delay between two streamed chunks, in seconds
+
+    Returns:
+        One row per path with seconds to the first node and to the full result
+    """
+    server = start_stub_server(latency=latency)
+    server.stream_delay = stream_delay
+    _point_client_at(server)
+    from schema_manager import transcript_to_structured_format
+
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = [t for t in json.load(f).values() if t.get("transcript")]
+
+    rows = []
+    try:
+        for streamed in (False, True):
+            first_node = []
+            total = 0.0
+            for topic in topics:
+                start = time.perf_counter()
+                first = []
+                on_item = (lambda kind, item: first or first.append(time.perf_counter() - start)) if streamed else None
+                with contextlib.redirect_stdout(io.StringIO()):
+                    transcript_to_structured_format(topic["transcript"], topic["title"], on_item=on_item)
+                elapsed = time.perf_counter() - start
+                # Without streaming, nodes are only available once the whole response is parsed
+                first_node.append(first[0] if first else elapsed)
+                total += elapsed
+            rows.append({
+                "path": "streamed" if streamed else "blocking",
+                "first_node": sum(first_node) / len(topics),
+                "seconds": total / len(topics)
+            })
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(
+        f"STREAMING BENCHMARK ({len(topics)} topics, {latency}s to first token, "
+        f"{stream_delay}s between chunks)"
+    )
+    print("=" * 80)
+    print(f"{'path':>10} {'first node (s)':>15} {'full result (s)':>16}")
+    for row in rows:
+        print(f"{row['path']:>10} {row['first_node']:>15.2f} {row['seconds']:>16.2f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_rate_limit(
+    requests: int = 300,
+    threads: int = 32,
+    requests_per_minute: float = 1200,
+    latency: float = 0.05,
+    error_rate: float = 0.02
+) -> List[Dict[str, Any]]:
+    """
+    Measure sustained throughput against a server enforcing a rate limit.
+
+    Args:
+        requests: Number of chat completions to send
+        threads: Number of threads sending them
+        requests_per_minute: Limit enforced by the stub server with 429s
+        latency: Injected latency per chat completion, in seconds
+        error_rate: Fraction of requests failing with a transient 500
+
+    Returns:
+        One row per client with completed/failed requests, 429s and requests/second
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from openai import OpenAI
+    from llm_client import RateLimitedClient
+
+    messages = [{"role": "user", "content": "Say hello."}]
+    clients = {
+        "openai default retries": lambda url: OpenAI(api_key="stub-key", base_url=url),
+        "scheduled (learned)": lambda url: RateLimitedClient(
+            OpenAI(api_key="stub-key", base_url=url, max_retries=0),
+            base_delay=0.1
+        ),
+        "scheduled (configured)": lambda url: RateLimitedClient(
+            OpenAI(api_key="stub-key", base_url=url, max_retries=0),
+            requests_per_minute=requests_per_minute,
+            base_delay=0.1
+        ),
+    }
+
+    rows = []
+    for name, make_client in clients.items():
+        # A fresh server per client so each starts from a full rate-limit window
+        server = start_stub_server(latency=latency, requests_per_minute=requests_per_minute, error_rate=error_rate)
+        client = make_client(server.base_url)
+
+        def send(_):
+            try:
+                client.chat.completions.create(model="gpt-4o", messages=messages)
+                return True
+            except Exception:
+                return False
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                outcomes = list(executor.map(send, range(requests)))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+
+        completed = sum(outcomes)
+        rows.append({
+            "client": name,
+            "completed": completed,
+            "failed": requests - completed,
+            "rejected": server.rejected,
+            "seconds": elapsed,
+            "requests_per_second": completed / elapsed
+        })
+
+    print("=" * 80)
+    print(
+        f"RATE LIMIT BENCHMARK ({requests} requests, {threads} threads, "
+        f"{requests_per_minute:.0f} RPM enforced, {error_rate:.0%} transient errors)"
+    )
+    print("=" * 80)
+    print(f"{'client':>24} {'completed':>10} {'failed':>7} {'429s':>6} {'seconds':>8} {'req/s':>7}")
+    for row in rows:
+        print(
+            f"{row['client']:>24} {row['completed']:>10} {row['failed']:>7} {row['rejected']:>6} "
+            f"{row['seconds']:>8.2f} {row['requests_per_second']:>7.1f}"
+        )
+    print(f"{'limit':>24} {'':>10} {'':>7} {'':>6} {'':>8} {requests_per_minute / 60:>7.1f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_sub_chunks(
+    topics_file: str = "transcription_topics.json",
+    largest: int = 6,
+    latency: float = 0.2,
+    stream_delay: float = 0.005
+) -> List[Dict[str, Any]]:
+    """
+    Compare latency of the largest topics with and without sub-chunking.
+
+    Args:
+        topics_file: Topics JSON file to take the topics from
+        largest: Number of largest topics to structure
+        latency: Injected latency before the first token, in seconds
+        stream_delay: Injected generation time per 16 characters of response, in seconds
+
+    Returns:
+        One row per setting with mean/max seconds per topic and nodes per topic
+    """
+    server = start_stub_server(latency=latency)
+    server.stream_delay = stream_delay
+    _point_client_at(server)
+    from schema_manager import transcript_to_structured_format
+    from sub_chunking import DEFAULT_SUB_CHUNK_CHARS
+
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = sorted(
+            (t for t in json.load(f).values() if t.get("transcript")),
+            key=lambda t: len(t["transcript"]),
+            reverse=True
+        )[:largest]
+
+    rows = []
+    try:
+        for sub_chunk_chars in (None, DEFAULT_SUB_CHUNK_CHARS, DEFAULT_SUB_CHUNK_CHARS // 2):
+            seconds = []
+            nodes = 0
+            for topic in topics:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = transcript_to_structured_format(
+                        topic["transcript"],
+                        topic["title"],
+                        sub_chunk_chars=sub_chunk_chars
+                    )
+                seconds.append(time.perf_counter() - start)
+                nodes += len(result["nodes"])
+            rows.append({
+                "sub_chunk_chars": sub_chunk_chars,
+                "mean_seconds": sum(seconds) / len(seconds),
+                "max_seconds": max(seconds),
+                "nodes": nodes / len(topics)
+            })
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(
+        f"SUB-CHUNK BENCHMARK ({len(topics)} largest topics, "
+        f"{min(len(t['transcript']) for t in topics)}-{max(len(t['transcript']) for t in topics)} characters)"
+    )
+    print("=" * 80)
+    print(f"{'sub-chunk chars':>16} {'mean s/topic':>13} {'max s/topic':>12} {'nodes/topic':>12}")
+    for row in rows:
+        label = row["sub_chunk_chars"] or "off"
+        print(f"{label:>16} {row['mean_seconds']:>13.2f} {row['max_seconds']:>12.2f} {row['nodes']:>12.1f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_graph(
+    structured_file: str = "structured_output_2.json",
+    episodes: int = 200
+) -> List[Dict[str, Any]]:
+    """
+    Compare memory and lookup cost of plain dicts and the graph model.
+
+    Args:
+        structured_file: Structured output file loaded once per simulated episode
+        episodes: Number of episodes held in memory at once
+
+    Returns:
+        One row per representation with MB held and microseconds per edge lookup
+    """
+    import gc
+    import tracemalloc
+    from graph_model import EpisodeGraph
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    def resolve_dicts(corpus):
+        # Resolve both ends of every connection by scanning the node list
+        for data in corpus:
+            for topic in data.values():
+                for conn in topic["connections"]:
+                    next((n for n in topic["nodes"] if n["id"] == conn["source_node_id"]), None)
+                    next((n for n in topic["nodes"] if n["id"] == conn["target_node_id"]), None)
+
+    def resolve_graphs(corpus):
+        for episode in corpus:
+            for topic in episode:
+                for edge in topic.edges:
+                    topic.node(edge.source_node_id)
+                    topic.node(edge.target_node_id)
+
+    loaders = {
+        "dicts": (lambda: json.loads(text), resolve_dicts),
+        "graph model": (lambda: EpisodeGraph.from_dict(json.loads(text)), resolve_graphs),
+    }
+
+    rows = []
+    for name, (load, resolve) in loaders.items():
+        start = time.perf_counter()
+        corpus = [load() for _ in range(episodes)]
+        load_seconds = time.perf_counter() - start
+        del corpus
+
+        # Measured in a second pass, since tracing slows allocations down
+        gc.collect()
+        tracemalloc.start()
+        corpus = [load() for _ in range(episodes)]
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        edges = sum(len(topic["connections"]) for topic in json.loads(text).values()) * episodes
+        start = time.perf_counter()
+        resolve(corpus)
+        lookup = (time.perf_counter() - start) / edges * 1e6
+        rows.append({"representation": name, "mb": held / 1e6, "load_seconds": load_seconds, "lookup_us": lookup})
+        del corpus
+
+    print("=" * 80)
+    print(f"GRAPH MODEL BENCHMARK ({episodes} episodes of {structured_file} in memory)")
+    print("=" * 80)
+    print(f"{'representation':>16} {'MB held':>9} {'load s':>8} {'us/edge lookup':>15}")
+    for row in rows:
+        print(f"{row['representation']:>16} {row['mb']:>9.1f} {row['load_seconds']:>8.2f} {row['lookup_us']:>15.2f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_validation(
+    structured_file: str = "structured_output_2.json",
+    episodes: int = 200
+) -> List[Dict[str, Any]]:
+    """
+    Compare the table-driven graph validator with per-element schema lookups.
+
+    The naive validator is what a check written against the schema API looks
+    like: enum construction and list scans per node and connection, and
+    get_allowed_node_pairs rebuilt for every connection.
+
+    Args:
+        structured_file: Structured output file validated once per simulated episode
+        episodes: Number of episode copies in the corpus
+
+    Returns:
+        One row per validator with topics per second and violations found
+    """
+    from schema.schema_type import Schema, SchemaType
+    from schema.nodes_type import NodeType
+    from schema.connections_type import ConnectionType, ConnectionTypeDefinition
+    from graph_model import EpisodeGraph
+    from graph_validator import validate_episode
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    corpus = [EpisodeGraph.from_dict(data) for _ in range(episodes)]
+    topics = sum(len(episode) for episode in corpus)
+
+    def naive(episode):
+        violations = []
+        for topic in episode:
+            schema = Schema(SchemaType(topic.attributes["schema_type"]))
+            for node in topic.nodes:
+                if NodeType(node.type).value not in schema.get_allowed_node_types():
+                    violations.append("illegal_node_type")
+            for edge in topic.edges:
+                source = next((n for n in topic.nodes if n.id == edge.source_node_id), None)
+                target = next((n for n in topic.nodes if n.id == edge.target_node_id), None)
+                if source is None or target is None:
+                    violations.append("dangling_edge")
+                    continue
+                connection_type = ConnectionType(edge.type)
+                if connection_type.value not in schema.get_allowed_connection_types():
+                    violations.append("illegal_connection_type")
+                pairs = ConnectionTypeDefinition.get_allowed_node_pairs(connection_type)
+                if (NodeType(source.type).value, NodeType(target.type).value) not in pairs:
+                    violations.append("unexpected_node_pair")
+        return violations
+
+    validators = {
+        "naive": naive,
+        # Connectivity is not checked by the naive validator
+        "tables": lambda episode: [
+            v["code"] for v in validate_episode(episode) if v["code"] != "disconnected_graph"
+        ],
+    }
+
+    rows = []
+    for name, validate in validators.items():
+        start = time.perf_counter()
+        found = sum(len(validate(episode)) for episode in corpus)
+        elapsed = time.perf_counter() - start
+        rows.append({"validator": name, "seconds": elapsed, "topics_per_second": topics / elapsed, "violations": found})
+
+    print("=" * 80)
+    print(f"VALIDATION BENCHMARK ({episodes} episodes of {structured_file}, {topics} topics)")
+    print("=" * 80)
+    print(f"{'validator':>10} {'seconds':>9} {'topics/s':>10} {'violations':>11} {'speedup':>8}")
+    for row in rows:
+        speedup = rows[0]["seconds"] / row["seconds"]
+        print(f"{row['validator']:>10} {row['seconds']:>9.3f} {row['topics_per_second']:>10.0f} {row['violations']:>11} {speedup:>7.1f}x")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_registry(iterations: int = 200000) -> List[Dict[str, Any]]:
+    """
+    Microbenchmark schema lookups through the schema classes and the compiled registry.
+
+    Args:
+        iterations: Calls timed per lookup
+
+    Returns:
+        One row per lookup with nanoseconds per call for each side
+    """
+    import timeit
+    from schema.schema_type import Schema, SchemaType
+    from schema.nodes_type import NodeType, NodeTypeDefinition
+    from schema.connections_type import ConnectionType, ConnectionTypeDefinition
+    from schema.registry import SchemaRegistry, get_registry
+
+    registry = get_registry()
+
+    def description(name):
+        try:
+            return NodeTypeDefinition.get_definition(NodeType[name])["description"]
+        except KeyError:
+            return f"Node type: {name}"
+
+    lookups = {
+        "node type allowed": (
+            lambda: "FACT" in Schema(SchemaType("informative")).get_allowed_node_types(),
+            lambda: registry.is_node_allowed("informative", "FACT")
+        ),
+        "connection allowed": (
+            lambda: "IS_EXAMPLE" in Schema(SchemaType("informative")).get_allowed_connection_types(),
+            lambda: registry.is_connection_allowed("informative", "IS_EXAMPLE")
+        ),
+        "legal node pair": (
+            lambda: ("FACT", "CLAIM") in ConnectionTypeDefinition.get_allowed_node_pairs(
+                ConnectionType("SUPPORTING_RELATION")
+            ),
+            lambda: registry.is_legal_pair("FACT", "CLAIM", "SUPPORTING_RELATION")
+        ),
+        "node description": (
+            lambda: description("FACT"),
+            lambda: registry.node_description("FACT")
+        ),
+        "schemas of a type": (
+            lambda: [s.value for s in SchemaType if "FACT" in Schema.ALLOWED_NODE_TYPES[s]],
+            lambda: registry.schemas_for_node_type("FACT")
+        ),
+        "types by category": (
+            lambda: NodeTypeDefinition.get_node_types_by_category()["informative"],
+            lambda: registry.node_types_by_schema["informative"]
+        ),
+    }
+
+    rows = []
+    for name, (classes, compiled) in lookups.items():
+        classes_ns = timeit.timeit(classes, number=iterations) / iterations * 1e9
+        compiled_ns = timeit.timeit(compiled, number=iterations) / iterations * 1e9
+        rows.append({"lookup": name, "classes_ns": classes_ns, "registry_ns": compiled_ns})
+    build_ms = timeit.timeit(SchemaRegistry, number=100) / 100 * 1e3
+
+    print("=" * 80)
+    print(f"SCHEMA REGISTRY BENCHMARK ({iterations} calls per lookup, registry built in {build_ms:.2f} ms)")
+    print("=" * 80)
+    print(f"{'lookup':>20} {'classes ns':>11} {'registry ns':>12} {'speedup':>8}")
+    for row in rows:
+        speedup = row["classes_ns"] / row["registry_ns"]
+        print(f"{row['lookup']:>20} {row['classes_ns']:>11.0f} {row['registry_ns']:>12.0f} {speedup:>7.1f}x")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_repair(
+    topics_file: str = "transcription_topics.json",
+    fault_rate: float = 0.3,
+    max_attempts: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Compare the token cost of invalid structure responses: regenerate vs repair.
+
+    Each topic's structure is extracted once against a stub server that makes
+    fault_rate of the responses unusable. An unusable response is either
+    extracted again from scratch, or fixed with repair.repair_structure.
+
+    Args:
+        topics_file: Topics JSON file to structure
+        fault_rate: Fraction of responses made unusable by the stub
+        max_attempts: Extractions per topic before the regenerate strategy gives up
+
+    Returns:
+        One row per strategy with the failures seen and the tokens spent on them
+    """
+    server = start_stub_server(fault_rate=fault_rate)
+    _point_client_at(server)
+    from schema.schema_type import SchemaType
+    from llm_cache import cached_chat_completion
+    from llm_client import get_client
+    from schema_manager import structure_messages
+    from repair import parse_structure, structure_problems, repair_structure
+
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = [t for t in json.load(f).values() if t.get("transcript")]
+    schema_type = SchemaType.INFORMATIVE
+
+    def extract(messages):
+        return cached_chat_completion(
+            get_client(),
+            model="gpt-4o",
+            messages=messages,
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            stage="structure"
+        )
+
+    def is_usable(content):
+        structure, error = parse_structure(content)
+        return error is None and not structure_problems(structure, schema_type)
+
+    rows = []
+    try:
+        for strategy in ("regenerate", "repair"):
+            failures = 0
+            unrepaired = 0
+            extra = [0, 0]
+            with contextlib.redirect_stdout(io.StringIO()):
+                for topic in topics:
+                    messages = structure_messages(topic["transcript"], topic["title"], schema_type)
+                    content = extract(messages)
+                    if is_usable(content):
+                        continue
+                    failures += 1
+                    before = (server.prompt_tokens, server.completion_tokens)
+                    if strategy == "regenerate":
+                        for _ in range(max_attempts - 1):
+                            if is_usable(extract(messages)):
+                                break
+                        else:
+                            unrepaired += 1
+                    else:
+                        structure = repair_structure(messages, content, schema_type)
+                        unrepaired += bool(structure_problems(structure, schema_type))
+                    extra[0] += server.prompt_tokens - before[0]
+                    extra[1] += server.completion_tokens - before[1]
+            rows.append({
+                "strategy": strategy,
+                "failures": failures,
+                "unrepaired": unrepaired,
+                "prompt_tokens": extra[0] / max(1, failures),
+                "completion_tokens": extra[1] / max(1, failures)
+            })
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(f"REPAIR BENCHMARK ({len(topics)} topics, {fault_rate:.0%} of responses unusable)")
+    print("=" * 80)
+    print(f"{'strategy':>11} {'failures':>9} {'unfixed':>8} {'prompt tok/failure':>19} {'compl. tok/failure':>19}")
+    for row in rows:
+        print(
+            f"{row['strategy']:>11} {row['failures']:>9} {row['unrepaired']:>8} "
+            f"{row['prompt_tokens']:>19.0f} {row['completion_tokens']:>19.0f}"
+        )
+    print("=" * 80)
+    return rows
+
+
+def benchmark_filter(
+    structured_file: str = "structured_output_2.json",
+    rollup_episodes: int = 50,
+    files: int = 16
+) -> List[Dict[str, Any]]:
+    """
+    Compare peak memory and time of in-memory and streaming filtering, and of sequential and pooled files.
+
+    Args:
+        structured_file: Structured output file used as one episode
+        rollup_episodes: Episodes merged into the season rollup file
+        files: Episode files filtered in the many-files comparison
+
+    Returns:
+        One row per run with seconds and peak MB (rollup runs only)
+    """
+    import tracemalloc
+    from filter_structure import filter_structured_data, stream_filter_structured_data, filter_many
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        episode = json.load(f)
+
+    rows = []
+    work_dir = tempfile.mkdtemp(prefix="filter_benchmark_")
+    try:
+        rollup_file = os.path.join(work_dir, "rollup.json")
+        with open(rollup_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    # A topic without nodes or connections must still get lists
+                    "episode_0_empty": {"title": "Empty topic"},
+                    **{f"episode_{e}_{key}": topic for e in range(1, rollup_episodes + 1) for key, topic in episode.items()}
+                },
+                f, indent=2, ensure_ascii=False
+            )
+        rollup_mb = os.path.getsize(rollup_file) / 1e6
+
+        for name, run in (("in memory", filter_structured_data), ("streaming", stream_filter_structured_data)):
+            output_file = os.path.join(work_dir, f"{name.replace(' ', '_')}.json")
+            tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(rollup_file, output_file)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append({"run": f"rollup, {name}", "seconds": elapsed, "peak_mb": peak / 1e6})
+        with open(os.path.join(work_dir, "in_memory.json"), "rb") as a, open(os.path.join(work_dir, "streaming.json"), "rb") as b:
+            identical = a.read() == b.read()
+        with open(os.path.join(work_dir, "in_memory.json"), "r", encoding="utf-8") as f:
+            empty_topic = json.load(f)["episode_0_empty"]
+        empty_lists = empty_topic["nodes"] == [] and empty_topic["connections"] == []
+
+        episodes_dir = os.path.join(work_dir, "episodes")
+        os.makedirs(episodes_dir)
+        for i in range(1, files + 1):
+            shutil.copy(structured_file, os.path.join(episodes_dir, f"structured_output_{i}.json"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for path in sorted(os.listdir(episodes_dir)):
+                stream_filter_structured_data(os.path.join(episodes_dir, path), os.path.join(work_dir, path), False)
+            rows.append({"run": f"{files} files, sequential", "seconds": time.perf_counter() - start, "peak_mb": None})
+            start = time.perf_counter()
+            filter_many([episodes_dir], os.path.join(work_dir, "pooled"))
+            rows.append({"run": f"{files} files, process pool", "seconds": time.perf_counter() - start, "peak_mb": None})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("=" * 80)
+    print(
+        f"FILTER BENCHMARK (rollup of {rollup_episodes} episodes, {rollup_mb:.1f} MB; identical output: {identical}; "
+        f"empty topic has lists: {empty_lists})"
+    )
+    print("=" * 80)
+    print(f"{'run':>26} {'seconds':>9} {'peak MB':>9}")
+    for row in rows:
+        peak = f"{row['peak_mb']:.1f}" if row["peak_mb"] is not None else "-"
+        print(f"{row['run']:>26} {row['seconds']:>9.2f} {peak:>9}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_projection(
+    structured_file: str = "structured_output_2.json",
+    rollup_episodes: int = 20,
+    views: List[str] = ("filtered", "typed", "compact")
+) -> List[Dict[str, Any]]:
+    """
+    Compare writing several projections one file read per view vs all in a single pass.
+
+    Args:
+        structured_file: Structured output file used as one episode
+        rollup_episodes: Episodes merged into the file that is projected
+        views: Projection presets to write
+
+    Returns:
+        One row per strategy with seconds
+    """
+    from projection import Projection
+    from filter_structure import project_structured_data
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        episode = json.load(f)
+
+    rows = []
+    work_dir = tempfile.mkdtemp(prefix="projection_benchmark_")
+    try:
+        rollup_file = os.path.join(work_dir, "rollup.json")
+        with open(rollup_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {f"episode_{e}_{key}": topic for e in range(1, rollup_episodes + 1) for key, topic in episode.items()},
+                f, indent=2, ensure_ascii=False
+            )
+
+        start = time.perf_counter()
+        for view in views:
+            # What each consumer does today: its own full read, pass and dump
+            projection = Projection.load(view)
+            with open(rollup_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with open(os.path.join(work_dir, f"separate_{view}.json"), "w", encoding="utf-8") as f:
+                json.dump({key: projection.project(topic) for key, topic in data.items()}, f, indent=2, ensure_ascii=False)
+        rows.append({"strategy": "one pass per view", "seconds": time.perf_counter() - start})
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            project_structured_data(
+                rollup_file,
+                {os.path.join(work_dir, f"single_{view}.json"): view for view in views}
+            )
+        rows.append({"strategy": "single pass", "seconds": time.perf_counter() - start})
+
+        identical = True
+        for view in views:
+            with open(os.path.join(work_dir, f"separate_{view}.json"), "rb") as a, \
+                    open(os.path.join(work_dir, f"single_{view}.json"), "rb") as b:
+                identical = identical and a.read() == b.read()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("=" * 80)
+    print(f"PROJECTION BENCHMARK ({len(views)} views of {rollup_episodes} episodes; identical output: {identical})")
+    print("=" * 80)
+    print(f"{'strategy':>20} {'seconds':>9}")
+    for row in rows:
+        print(f"{row['strategy']:>20} {row['seconds']:>9.2f}")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_summary(
+    structured_file: str = "final_result.json",
+    rollup_episodes: int = 8,
+    latency: float = 0.3
+) -> List[Dict[str, Any]]:
+    """
+    Compare the single-prompt and hierarchical summaries, and re-running after editing one topic.
+
+    Args:
+        structured_file: Filtered structured file used as one episode
+        rollup_episodes: Episodes merged into the season rollup
+        latency: Injected latency per chat completion, in seconds
+
+    Returns:
+        One row per run with requests, largest prompt, total prompt tokens,
+        seconds, and whether the input had to be trimmed to fit
+    """
+    server = start_stub_server(latency=latency)
+    _point_client_at(server)
+    from llm_cache import LLMCache
+    from summarize_podcast import summarize_from_structured_data, summarize_hierarchically
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        episode = json.load(f)
+
+    rows = []
+    work_dir = tempfile.mkdtemp(prefix="summary_benchmark_")
+    try:
+        rollup_file = os.path.join(work_dir, "rollup.json")
+        with open(rollup_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {f"episode_{e}_{key}": topic for e in range(1, rollup_episodes + 1) for key, topic in episode.items()},
+                f, indent=2, ensure_ascii=False
+            )
+
+        def run(name, summarize, path, **kwargs):
+            first = len(server.requests)
+            start = time.perf_counter()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                summarize(path, **kwargs)
+            elapsed = time.perf_counter() - start
+            prompts = [
+                sum(len(m.get("content", "")) // 4 for m in request["messages"])
+                for request in server.requests[first:]
+            ]
+            rows.append({
+                "run": name,
+                "requests": len(prompts),
+                "max_prompt_tokens": max(prompts, default=0),
+                "prompt_tokens": sum(prompts),
+                "seconds": elapsed,
+                "trimmed": "over the token budget" in output.getvalue()
+            })
+
+        for label, path in (("episode", structured_file), (f"{rollup_episodes}-episode rollup", rollup_file)):
+            run(f"{label}, single prompt", summarize_from_structured_data, path)
+            run(f"{label}, hierarchical", summarize_hierarchically, path)
+
+        # Editing one topic re-runs its summary and the merges above it only
+        cache = LLMCache(path=os.path.join(work_dir, "cache.sqlite3"))
+        edited_file = os.path.join(work_dir, "edited.json")
+        shutil.copy(structured_file, edited_file)
+        run("episode, cold cache", summarize_hierarchically, edited_file, cache=cache)
+        edited = json.loads(json.dumps(episode))
+        first_topic = next(iter(edited.values()))
+        first_topic["nodes"][0]["content"] += " (edited)"
+        with open(edited_file, "w", encoding="utf-8") as f:
+            json.dump(edited, f, indent=2, ensure_ascii=False)
+        run("episode, 1 topic edited", summarize_hierarchically, edited_file, cache=cache)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("=" * 80)
+    print(f"SUMMARY BENCHMARK ({latency}s injected latency per call)")
+    print("=" * 80)
+    print(f"{'run':>32} {'calls':>6} {'max prompt tok':>15} {'prompt tok':>11} {'seconds':>8} {'trimmed':>8}")
+    for row in rows:
+        print(
+            f"{row['run']:>32} {row['requests']:>6} {row['max_prompt_tokens']:>15} "
+            f"{row['prompt_tokens']:>11} {row['seconds']:>8.2f} {'yes' if row['trimmed'] else 'no':>8}"
+        )
+    print("=" * 80)
+    return rows
+
+
+def benchmark_prompt_encoding(
+    structured_file: str = "final_result.json",
+    typed_file: str = "structured_output_2.json",
+    transcript_file: str = "transcription.txt",
+    judge: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Compare the prompt tokens of the structured data as indented JSON, compact JSON and encoded text.
+
+    With judge=True, a summary is also generated from the indented JSON and
+    from the encoded text of structured_file and judged against the
+    transcript, to check that the encoding does not lower the score. This
+    uses the real API: the stub server answers with fixed responses.
+
+    Args:
+        structured_file: Filtered structured file (final_result.json)
+        typed_file: Structured output file, projected with node and connection types
+        transcript_file: Transcript given to the judge
+        judge: Compare the judge scores of both summaries (real API calls)
+
+    Returns:
+        One row per input and form with tokens and the reduction vs indented JSON
+    """
+    from graph_prompt import encode_graph, decode_graph
+    from projection import Projection
+    from token_budget import count_tokens
+
+    with open(structured_file, "r", encoding="utf-8") as f:
+        filtered = json.load(f)
+    with open(typed_file, "r", encoding="utf-8") as f:
+        typed_projection = Projection.load("typed")
+        typed = {key: typed_projection.project(topic) for key, topic in json.load(f).items()}
+
+    rows = []
+    round_trips = {}
+    for name, data in ((structured_file, filtered), (f"{typed_file} (typed)", typed)):
+        encoded = encode_graph(data)
+        round_trips[name] = decode_graph(encoded) == data
+        forms = (
+            ("indented JSON", json.dumps(data, indent=2, ensure_ascii=False)),
+            ("compact JSON", json.dumps(data, separators=(",", ":"), ensure_ascii=False)),
+            ("encoded", encoded)
+        )
+        baseline = count_tokens(forms[0][1])
+        for form, text in forms:
+            tokens = count_tokens(text)
+            rows.append({
+                "input": name,
+                "form": form,
+                "chars": len(text),
+                "tokens": tokens,
+                "reduction": 1 - tokens / baseline if baseline else 0.0
+            })
+
+    scores = {}
+    if judge:
+        import summarize_podcast
+
+        with open(transcript_file, "r", encoding="utf-8") as f:
+            full_transcript = f.read()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for form, encode in (
+                    ("indented JSON", lambda data: json.dumps(data, indent=2, ensure_ascii=False)),
+                    ("encoded", encode_graph)
+                ):
+                    # The summary prompt as it was built before the encoding, and now
+                    summarize_podcast.encode_graph = encode
+                    summary = summarize_podcast.summarize_from_structured_data(structured_file)
+                    scores[form] = summarize_podcast.judge_summary(summary, full_transcript).get("score")
+        finally:
+            summarize_podcast.encode_graph = encode_graph
+
+    print("=" * 80)
+    print("PROMPT ENCODING BENCHMARK")
+    print("=" * 80)
+    print(f"{'input':>34} {'form':>14} {'chars':>8} {'tokens':>8} {'reduction':>10}")
+    for row in rows:
+        print(
+            f"{row['input']:>34} {row['form']:>14} {row['chars']:>8} "
+            f"{row['tokens']:>8} {row['reduction']:>9.0%}"
+        )
+    for name, ok in round_trips.items():
+        print(f"Round trip of {name}: {'identical' if ok else 'DIFFERENT'}")
+    if scores:
+        print("Judge score: " + ", ".join(f"{form} {score}" for form, score in scores.items()))
+    print("=" * 80)
+    return rows
+
+
+def benchmark_judge(
+    summary_file: str = os.path.join("summaries", "summary_from_structured_data.txt"),
+    transcript_file: str = "transcription.txt",
+    topics_file: str = "transcription_topics.json",
+    long_episodes: int = 8,
+    latency: float = 0.3,
+    prompt_token_delay: float = 0.00005
+) -> List[Dict[str, Any]]:
+    """
+    Compare judging a summary in one request vs section by section against the topic transcripts.
+
+    Args:
+        summary_file: Summary to judge
+        transcript_file: Transcript of the episode
+        topics_file: Topics of the episode (title, transcript)
+        long_episodes: Copies of the episode joined into a long episode
+        latency: Injected latency per chat completion, in seconds
+        prompt_token_delay: Injected latency per prompt token, in seconds
+
+    Returns:
+        One row per run with requests, largest prompt, seconds, and whether
+        the transcript had to be trimmed to fit
+    """
+    server = start_stub_server(latency=latency)
+    server.prompt_token_delay = prompt_token_delay
+    _point_client_at(server)
+    from summarize_podcast import judge_summary, judge_summary_by_topic
+
+    with open(summary_file, "r", encoding="utf-8") as f:
+        summary = f.read()
+    with open(transcript_file, "r", encoding="utf-8") as f:
+        full_transcript = f.read()
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = json.load(f)
+
+    long_summary = "\n\n".join([summary] * long_episodes)
+    long_transcript = "\n\n".join([full_transcript] * long_episodes)
+    long_topics = {
+        f"episode_{e}_{key}": topic for e in range(1, long_episodes + 1) for key, topic in topics.items()
+    }
+
+    rows = []
+
+    def run(name, judge, *args):
+        first = len(server.requests)
+        start = time.perf_counter()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            judgment = judge(*args)
+        elapsed = time.perf_counter() - start
+        prompts = [
+            sum(len(m.get("content", "")) // 4 for m in request["messages"])
+            for request in server.requests[first:]
+        ]
+        rows.append({
+            "run": name,
+            "requests": len(prompts),
+            "max_prompt_tokens": max(prompts, default=0),
+            "seconds": elapsed,
+            "trimmed": "over the token budget" in output.getvalue(),
+            "score": judgment.get("score")
+        })
+
+    try:
+        run("episode, one request", judge_summary, summary, full_transcript)
+        run("episode, by topic", judge_summary_by_topic, summary, topics)
+        run(f"{long_episodes}x episode, one request", judge_summary, long_summary, long_transcript)
+        run(f"{long_episodes}x episode, by topic", judge_summary_by_topic, long_summary, long_topics)
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(f"JUDGE BENCHMARK ({latency}s + {prompt_token_delay * 1000:.2f}s per 1k prompt tokens per call)")
+    print("=" * 80)
+    print(f"{'run':>28} {'calls':>6} {'max prompt tok':>15} {'seconds':>8} {'trimmed':>8} {'score':>6}")
+    for row in rows:
+        print(
+            f"{row['run']:>28} {row['requests']:>6} {row['max_prompt_tokens']:>15} "
+            f"{row['seconds']:>8.2f} {'yes' if row['trimmed'] else 'no':>8} {row['score']!s:>6}"
+        )
+    print("=" * 80)
+    return rows
+
+
+def benchmark_regenerate_streaming(
+    structured_file: str = "final_result.json",
+    latency: float = 0.5,
+    stream_delay: float = 0.001
+) -> List[Dict[str, Any]]:
+    """
+    Compare time to first line of the blocking, streamed and async streamed podcast regeneration.
+
+    Args:
+        structured_file: Filtered structured file to regenerate from
+        latency: Injected latency before the first token, in seconds
+        stream_delay: Injected delay between two streamed chunks, in seconds
+
+    Returns:
+        One row per path with seconds to the first line and to the saved file
+    """
+    server = start_stub_server(latency=latency)
+    server.stream_delay = stream_delay
+    _point_client_at(server)
+    import asyncio
+    from constructive import (
+        regenerate_from_structured_data, save_podcast, stream_regenerated_podcast,
+        astream_regenerated_podcast, stream_podcast_to_file
+    )
+
+    rows = []
+    outputs = {}
+    work_dir = tempfile.mkdtemp(prefix="regenerate_benchmark_")
+    try:
+        def run(path, regenerate):
+            output_dir = os.path.join(work_dir, path)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                first_line = regenerate(output_dir, start)
+            rows.append({
+                "path": path,
+                "first_line": first_line if first_line is not None else time.perf_counter() - start,
+                "seconds": time.perf_counter() - start
+            })
+            with open(os.path.join(output_dir, "regenerated_podcast.txt"), "r", encoding="utf-8") as f:
+                outputs[path] = f.read()
+
+        def blocking(output_dir, start):
+            # Nothing is available before the whole podcast is saved
+            save_podcast(regenerate_from_structured_data(structured_file), output_dir)
+            return None
+
+        def streamed(output_dir, start):
+            first_line = None
+            for _ in stream_podcast_to_file(stream_regenerated_podcast(structured_file), output_dir):
+                if first_line is None:
+                    first_line = time.perf_counter() - start
+            return first_line
+
+        def async_streamed(output_dir, start):
+            async def consume():
+                first_line = None
+                lines = []
+                async for line in astream_regenerated_podcast(structured_file):
+                    if first_line is None:
+                        first_line = time.perf_counter() - start
+                    lines.append(line)
+                save_podcast("".join(lines), output_dir)
+                return first_line
+            return asyncio.run(consume())
+
+        run("blocking", blocking)
+        run("streamed", streamed)
+        run("async streamed", async_streamed)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("=" * 80)
+    print(f"REGENERATE STREAMING BENCHMARK ({latency}s to first token, {stream_delay}s between chunks)")
+    print("=" * 80)
+    print(f"{'path':>16} {'first line (s)':>15} {'saved (s)':>10}")
+    for row in rows:
+        print(f"{row['path']:>16} {row['first_line']:>15.2f} {row['seconds']:>10.2f}")
+    identical = len(set(outputs.values())) == 1
+    print(f"Saved podcasts: {'identical' if identical else 'DIFFERENT'} ({len(outputs['blocking'])} characters)")
+    print("=" * 80)
+    return rows
+
+
+def benchmark_regenerate_by_topic(
+    structured_file: str = "final_result.json",
+    latency: float = 0.5,
+    stream_delay: float = 0.002
+) -> List[Dict[str, Any]]:
+    """
+    Compare regenerating the podcast in one request vs one request per topic, concurrently.
+
+    Response time grows with the response length (the stub server spends
+    stream_delay per chunk), as generation does with the real API.
+
+    Args:
+        structured_file: Filtered structured file to regenerate from
+        latency: Injected latency per chat completion, in seconds
+        stream_delay: Injected delay per generated chunk, in seconds
+
+    Returns:
+        One row per mode with requests, longest response, and seconds
+    """
+    server = start_stub_server(latency=latency)
+    server.stream_delay = stream_delay
+    _point_client_at(server)
+    from constructive import regenerate_from_structured_data, regenerate_by_topic
+
+    rows = []
+    outputs = {}
+    try:
+        for mode, regenerate in (("one request", regenerate_from_structured_data), ("by topic", regenerate_by_topic)):
+            first = len(server.requests)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                outputs[mode] = regenerate(structured_file)
+            elapsed = time.perf_counter() - start
+            requests = server.requests[first:]
+            rows.append({
+                "mode": mode,
+                "requests": len(requests),
+                "max_response_chars": max((len(stub_completion_content(r["messages"])) for r in requests), default=0),
+                "seconds": elapsed
+            })
+    finally:
+        server.shutdown()
+
+    print("=" * 80)
+    print(f"REGENERATE BY TOPIC BENCHMARK ({latency}s + {stream_delay}s per {server.stream_chunk_chars} chars)")
+    print("=" * 80)
+    print(f"{'mode':>12} {'calls':>6} {'longest response':>17} {'seconds':>8}")
+    for row in rows:
+        print(f"{row['mode']:>12} {row['requests']:>6} {row['max_response_chars']:>17} {row['seconds']:>8.2f}")
+    speakers = {
+        mode: len({block.split("\n", 1)[0] for block in text.split("\n\n")}) for mode, text in outputs.items()
+    }
+    print("Speakers: " + ", ".join(f"{mode} {count}" for mode, count in speakers.items()))
+    print("=" * 80)
+    return rows
+
+
+BENCHMARKS = {
+    "structuring": benchmark_structuring,
+    "fused": benchmark_fused,
+    "prompts": benchmark_prompts,
+    "batch": benchmark_batch,
+    "streaming": benchmark_streaming,
+    "ratelimit": benchmark_rate_limit,
+    "subchunks": benchmark_sub_chunks,
+    "graph": benchmark_graph,
+    "validate": benchmark_validation,
+    "registry": benchmark_registry,
+    "repair": benchmark_repair,
+    "filter": benchmark_filter,
+    "projection": benchmark_projection,
+    "summary": benchmark_summary,
+    "encoding": benchmark_prompt_encoding,
+    "judge": benchmark_judge,
+    "regenerate": benchmark_regenerate_streaming,
+    "regenerate_topics": benchmark_regenerate_by_topic,
+}
+
+
+def main():
+    """Main function for command-line usage."""
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: python benchmark.py <benchmark>")
+        print(f"  benchmark: one of {', '.join(BENCHMARKS)}")
+        print("\nExample:")
+        print("  python benchmark.py structuring")
+        sys.exit(1)
+
+    BENCHMARKS[sys.argv[1]]()
+
+
+if __name__ == "__main__":
+    main()
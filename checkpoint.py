@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Any, Optional
+
+
+def topic_fingerprint(transcript: str, title: str, **options: Any) -> str:
+    """
+    Hash the inputs that determine the structured result of a topic.
+
+    Args:
+        transcript: Transcript text of the topic
+        title: Title of the topic
+        options: Processing options that change the result (e.g., mode)
+    """
+    payload = json.dumps(
+        {"transcript": transcript, "title": title, "options": options},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TopicJournal:
+    """
+    Append-only journal of completed topics.
+
+    Each completed topic is written as one JSON line as soon as it finishes,
+    so a crash or sys.exit part way through a run keeps everything done so
+    far. On restart, topics whose fingerprint is already in the journal are
+    taken from it instead of being processed again.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize a TopicJournal instance.
+
+        Args:
+            path: Path of the JSON Lines journal file
+        """
+        self.path = path
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        complete = 0
+        with open(self.path, "rb+") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                complete += len(line)
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                self._results[entry["fingerprint"]] = entry["result"]
+            # A run interrupted mid-write leaves a partial last line: cut it,
+            # so that the next append starts on a line of its own
+            if f.seek(0, os.SEEK_END) > complete:
+                f.truncate(complete)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Get the journaled result for a fingerprint, if any."""
+        return self._results.get(fingerprint)
+
+    def append(self, fingerprint: str, topic_key: str, result: Dict[str, Any]) -> None:
+        """Record a completed topic and flush it to disk immediately."""
+        line = json.dumps(
+            {"fingerprint": fingerprint, "topic_key": topic_key, "result": result},
+            ensure_ascii=False
+        )
+        with self._lock:
+            self._results[fingerprint] = result
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __repr__(self) -> str:
+        return f"TopicJournal(path={self.path}, topics={len(self._results)})"
@@ -1,36 +1,51 @@
-from openai import OpenAI
 from dotenv import load_dotenv
+import asyncio
 import os
 import sys
 import json
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Iterable, Iterator, AsyncIterator
+from llm_cache import LLMCache, cached_chat_completion, cached_chat_completion_stream, print_cache_stats
+from token_budget import fit_to_budget, print_token_totals
+from graph_prompt import GRAPH_FORMAT, encode_graph, encode_topic
+from llm_client import get_client
 
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+client = get_client()
 
+# Nodes of the previous topic given as context to each topic in regenerate_by_topic
+DEFAULT_CONTEXT_TURNS = 2
 
-def regenerate_from_structured_data(structured_file: str) -> str:
+
+def read_structured_data(structured_file: str) -> Dict[str, Any]:
+    """Load a structured JSON file, exiting with a message if it cannot be read."""
     try:
         print("Reading structured data...")
         with open(structured_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+            return json.load(f)
     except FileNotFoundError:
         print(f"Error: File '{structured_file}' not found.")
         sys.exit(1)
     except Exception as e:
         print(f"Error reading file: {e}")
         sys.exit(1)
-    
+
+
+def regeneration_messages(data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Build the messages asking to regenerate a podcast from structured data."""
     # Prepare the structured data for the LLM
-    structured_summary = json.dumps(data, indent=2, ensure_ascii=False)
+    structured_summary = encode_graph(data)
     
-    prompt = f"""You are an expert at analyzing podcast content and creating another podcast transcript.
+    def build(structured_summary: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert at analyzing podcast content and creating another podcast transcript.
     I will provide you with a structured representation of a podcast transcript that has been organized into topics, 
     nodes (key concepts/entities), and connections (relationships between concepts). The new podcast should be based on the given structured data ONLY.
 
+    Format of the data: {GRAPH_FORMAT}
+
     Structured Podcast Data:
     {structured_summary}
 
@@ -43,25 +58,33 @@ def regenerate_from_structured_data(structured_file: str) -> str:
     Speaker2 Name
     what he said ...
     """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert at analyzing and regenerating podcast content based on graph schema. Provide clear, comprehensive, and well-structured regenerated podcast."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    return fit_to_budget(build, structured_summary, label="structured data")
+
+
+def regenerate_from_structured_data(structured_file: str) -> str:
+    data = read_structured_data(structured_file)
     
     print("Regenerating podcast from structured data...")
     try:
-        response = client.chat.completions.create(
+        summary = cached_chat_completion(
+            client,
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert at analyzing and regenerating podcast content based on graph schema. Provide clear, comprehensive, and well-structured regenerated podcast."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7
+            messages=regeneration_messages(data),
+            temperature=0.7,
+            stage="regenerate"
         )
         
-        summary = response.choices[0].message.content
         print("✓ podcast generated from structured data")
         return summary
         
@@ -70,6 +93,264 @@ def regenerate_from_structured_data(structured_file: str) -> str:
         sys.exit(1)
 
 
+def stream_regenerated_podcast(structured_file: str) -> Iterator[str]:
+    """
+    Regenerate a podcast from structured data, line by line as it is generated.
+    
+    The response is streamed and each line is yielded as soon as it is
+    complete, so consumers (preview, text-to-speech) can start on the first
+    speaker turn instead of waiting for the whole podcast.
+    
+    Args:
+        structured_file: Path to the filtered structured JSON file
+        
+    Yields:
+        Lines of the podcast, each ending with "\n" except maybe the last;
+        joined, they are the text regenerate_from_structured_data returns
+    """
+    messages = regeneration_messages(read_structured_data(structured_file))
+    
+    print("Streaming regenerated podcast from structured data...")
+    pending = ""
+    for delta in cached_chat_completion_stream(
+        client,
+        model="gpt-4o",
+        messages=messages,
+        temperature=0.7,
+        stage="regenerate"
+    ):
+        pending += delta
+        while "\n" in pending:
+            line, pending = pending.split("\n", 1)
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+async def astream_regenerated_podcast(structured_file: str) -> AsyncIterator[str]:
+    """
+    Async version of stream_regenerated_podcast.
+    
+    One worker thread reads the stream and hands each line to the event
+    loop through a queue, so the loop is not blocked while waiting for
+    tokens. If the consumer stops early or is cancelled, the worker stops
+    reading at the next line and closes the stream.
+    
+    Yields:
+        Lines of the podcast, as stream_regenerated_podcast
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def post(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The event loop is closed: nobody is waiting anymore
+            pass
+
+    def produce() -> None:
+        lines = stream_regenerated_podcast(structured_file)
+        try:
+            for line in lines:
+                if stop.is_set():
+                    return
+                post((line, None))
+        except BaseException as e:
+            # Includes the SystemExit of read_structured_data
+            post((None, e))
+            return
+        finally:
+            lines.close()
+        post((None, None))
+
+    threading.Thread(target=produce, name="podcast-stream", daemon=True).start()
+    try:
+        while True:
+            line, error = await queue.get()
+            if error is not None:
+                raise error
+            if line is None:
+                break
+            yield line
+    finally:
+        stop.set()
+
+
+def speaker_roster(data: Dict[str, Any]) -> List[str]:
+    """Get the speakers of the structured data, in order of first appearance."""
+    speakers = {}
+    for topic in data.values():
+        for node in topic.get("nodes") or []:
+            if isinstance(node, dict) and node.get("speaker"):
+                speakers.setdefault(node["speaker"], None)
+    return list(speakers)
+
+
+def closing_exchange(topic: Dict[str, Any], turns: int = DEFAULT_CONTEXT_TURNS) -> str:
+    """
+    Describe how a topic ends: its last nodes, as "Speaker: content" lines.
+
+    Topics are regenerated concurrently, so the context carried over from
+    the previous topic comes from its graph, not from its regenerated text.
+    """
+    nodes = [node for node in topic.get("nodes") or [] if isinstance(node, dict)]
+    return "\n".join(
+        f"{node.get('speaker') or 'Unknown speaker'}: {node.get('content', '')}"
+        for node in nodes[-turns:]
+    )
+
+
+def topic_regeneration_messages(
+    topic_key: str,
+    topic: Dict[str, Any],
+    roster: List[str],
+    previous_topic: Optional[Dict[str, Any]] = None,
+    is_last: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Build the messages asking to regenerate the dialogue of one topic.
+
+    Args:
+        topic_key: Key of the topic (e.g., topic_1)
+        topic: Topic entry of the structured file (title, nodes, connections)
+        roster: Speakers of the whole episode
+        previous_topic: Topic before this one (None for the first topic)
+        is_last: Whether this is the last topic of the episode
+    """
+    topic_data = encode_topic(topic_key, topic)
+
+    if previous_topic is None:
+        position = "This is the first topic: open the podcast and introduce the speakers."
+    else:
+        exchange = "\n    ".join(closing_exchange(previous_topic).splitlines())
+        position = f"""This topic follows "{previous_topic.get('title', '')}", which ended with:
+    {exchange}
+    Continue the conversation from there: do not open the podcast or introduce the speakers again."""
+    if is_last:
+        position += "\n    This is the last topic: close the podcast."
+    else:
+        position += "\n    Do not close the podcast: more topics follow."
+
+    def build(topic_data: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert at analyzing podcast content and creating another podcast transcript.
+    I will provide you with a structured representation of one topic of a podcast transcript: nodes (key concepts/entities) and connections (relationships between concepts).
+    Write the part of the new podcast covering this topic. It should be based on the given structured data ONLY.
+
+    Speakers of the podcast: {", ".join(roster) if roster else "unknown"}
+    Use only these speakers, with these exact names.
+
+    {position}
+
+    Format of the data: {GRAPH_FORMAT}
+
+    Structured Topic Data:
+    {topic_data}
+
+    All content of the topic's structured data should be present, and the dialogue should flow smoothly without gaps or abrupt transitions.
+    The generated podcast transcript should be in such form:
+    Speaker1 Name
+    what he said
+
+    Speaker2 Name
+    what he said ...
+    """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert at analyzing and regenerating podcast content based on graph schema. Provide clear, comprehensive, and well-structured regenerated podcast."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    return fit_to_budget(build, topic_data, label=f"{topic_key} structured data")
+
+
+def stitch_topic_dialogues(parts: List[str]) -> str:
+    """
+    Join the regenerated topics into one podcast.
+
+    Turns are separated by blank lines, as in the single-request output;
+    when a topic starts with the speaker who ended the previous one, the
+    turns are merged instead of repeating the speaker's name.
+    """
+    podcast = ""
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if podcast:
+            last_speaker = podcast.rsplit("\n\n", 1)[-1].split("\n", 1)[0].strip()
+            speaker, _, text = part.partition("\n")
+            if text and speaker.strip() == last_speaker:
+                podcast += "\n" + text
+                continue
+            podcast += "\n\n"
+        podcast += part
+    return podcast
+
+
+def regenerate_by_topic(
+    structured_file: str,
+    max_workers: int = 16,
+    cache: Optional[LLMCache] = None
+) -> str:
+    """
+    Regenerate the podcast one topic per request, all topics concurrently.
+
+    Each request only writes the dialogue of one topic, so the wall-clock
+    time is about that of the slowest topic instead of growing with the
+    length of the episode. For continuity, every request gets the speaker
+    roster of the episode, the previous topic's title and closing exchange
+    (from its graph), and whether the podcast opens or closes with it; the
+    dialogues are then stitched in topic order.
+
+    Args:
+        structured_file: Path to the filtered structured JSON file
+        max_workers: Requests in flight at once (the client's limiter may allow fewer)
+        cache: Response cache (default: the shared cache)
+
+    Returns:
+        The regenerated podcast, in the same format as regenerate_from_structured_data
+    """
+    data = read_structured_data(structured_file)
+    roster = speaker_roster(data)
+    topics = list(data.items())
+
+    def regenerate_topic(position: int) -> str:
+        topic_key, topic = topics[position]
+        return cached_chat_completion(
+            client,
+            model="gpt-4o",
+            messages=topic_regeneration_messages(
+                topic_key,
+                topic,
+                roster,
+                previous_topic=topics[position - 1][1] if position else None,
+                is_last=position == len(topics) - 1
+            ),
+            temperature=0.7,
+            cache=cache,
+            stage="regenerate_topic"
+        )
+
+    print(f"Regenerating podcast from structured data, {len(topics)} topics concurrently...")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            parts = list(executor.map(regenerate_topic, range(len(topics))))
+
+        print("✓ podcast generated from structured data")
+        return stitch_topic_dialogues(parts)
+
+    except Exception as e:
+        print(f"Error regenerating podcast: {e}")
+        sys.exit(1)
+
+
 # def judge_summary(
 #     summary: str,
 #     full_transcript: str,
@@ -195,8 +476,57 @@ def save_podcast(text: str, output_dir: str = "Regenerated_Podcasts") -> None:
     print(f"✓ Regenerated podcast saved to: {output_file}")
 
 
+def stream_podcast_to_file(
+    lines: Iterable[str],
+    output_dir: str = "Regenerated_Podcasts"
+) -> Iterator[str]:
+    """
+    Write podcast lines to regenerated_podcast.txt as they arrive, passing them on.
+    
+    Lines are appended and flushed to regenerated_podcast.txt.part as they
+    come, so the podcast can be followed while it is generated; the file
+    is renamed to regenerated_podcast.txt once the last line is written,
+    so that file is never left half-written. If the stream fails or is
+    not read to the end, the partial file is removed.
+    
+    Args:
+        lines: Lines of the podcast (e.g., from stream_regenerated_podcast)
+        output_dir: Directory to save the podcast in
+        
+    Yields:
+        The same lines, once written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    output_file = os.path.join(output_dir, "regenerated_podcast.txt")
+    partial_file = output_file + ".part"
+    completed = False
+    try:
+        with open(partial_file, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line)
+                f.flush()
+                yield line
+        os.replace(partial_file, output_file)
+        completed = True
+    finally:
+        if not completed and os.path.exists(partial_file):
+            os.remove(partial_file)
+    
+    print(f"✓ Regenerated podcast saved to: {output_file}")
+
+
 def main():
     """Main function to recostruct podcast from structured data"""
+    # --stream: print and save the podcast line by line as it is generated
+    stream = "--stream" in sys.argv
+    # --by-topic: regenerate the topics concurrently and stitch them together
+    by_topic = "--by-topic" in sys.argv
+    if stream and by_topic:
+        # Topics are regenerated concurrently and only stitched at the end
+        print("Error: --stream and --by-topic cannot be used together.")
+        sys.exit(1)
+    
     print("=" * 80)
     
     # File paths
@@ -206,7 +536,22 @@ def main():
     # Step 1: Generate summary from structured data
     print("\n[STEP 1] Regenerating podcast content from structured data...")
     print("-" * 80)
-    new_podcast = regenerate_from_structured_data(structured_file)
+    if stream:
+        start = time.perf_counter()
+        first_line = None
+        try:
+            for line in stream_podcast_to_file(stream_regenerated_podcast(structured_file)):
+                if first_line is None:
+                    first_line = time.perf_counter() - start
+                print(line, end="", flush=True)
+        except Exception as e:
+            print(f"Error regenerating podcast: {e}")
+            sys.exit(1)
+        print(f"\n✓ First line after {first_line or 0.0:.2f}s, podcast after {time.perf_counter() - start:.2f}s")
+    elif by_topic:
+        new_podcast = regenerate_by_topic(structured_file)
+    else:
+        new_podcast = regenerate_from_structured_data(structured_file)
     
     # Step 2: Read full transcript
     print("\n[STEP 2] Reading full transcript...")
@@ -251,7 +596,10 @@ def main():
     # print(f"\nStrengths:\n{judgment.get('strengths', 'N/A')}")
     # print(f"\nWeaknesses:\n{judgment.get('weaknesses', 'N/A')}")
     # print("=" * 80)
-    save_podcast(new_podcast)
+    if not stream:
+        save_podcast(new_podcast)
+    print_cache_stats()
+    print_token_totals()
 
     print("\n✓ Regenrated Podcasts are save to 'Regenerated_Podcasts/' directory")
 
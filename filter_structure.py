@@ -1,6 +1,12 @@
+import glob
 import json
+import os
 import sys
-from typing import Dict, Any, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Union
+from graph_model import expand_paths
+from projection import PRESETS, Projection
+from stream_json import ObjectWriter, iter_object_members
 
 
 def filter_structured_data(input_file: str, output_file: str) -> Dict[str, Any]:
@@ -35,43 +41,20 @@ def filter_structured_data(input_file: str, output_file: str) -> Dict[str, Any]:
     # Filter each topic
     filtered_data = {}
     total_topics = len(data)
+    # A single pass over the dicts: building the graph model (graph_model.py)
+    # would cost more than the filtering itself
+    projection = Projection.load("filtered")
     
     print(f"\nFound {total_topics} topics to filter")
     print("=" * 80)
     
     for topic_key, topic_data in data.items():
-        # Extract title
-        title = topic_data.get("title", "")
+        # The "filtered" view keeps the title, node id/content/speaker and
+        # connection id/content/source_node_id/target_node_id
+        filtered_topic = projection.project(topic_data)
+        filtered_data[topic_key] = filtered_topic
         
-        # Filter nodes: keep only id, content, speaker
-        nodes = []
-        for node in topic_data.get("nodes", []):
-            filtered_node = {
-                "id": node.get("id", ""),
-                "content": node.get("content", ""),
-                "speaker": node.get("speaker", "")
-            }
-            nodes.append(filtered_node)
-        
-        # Filter connections: keep only id, content, source_node_id, target_node_id
-        connections = []
-        for conn in topic_data.get("connections", []):
-            filtered_conn = {
-                "id": conn.get("id", ""),
-                "content": conn.get("content", ""),
-                "source_node_id": conn.get("source_node_id", ""),
-                "target_node_id": conn.get("target_node_id", "")
-            }
-            connections.append(filtered_conn)
-        
-        # Create filtered topic entry
-        filtered_data[topic_key] = {
-            "title": title,
-            "nodes": nodes,
-            "connections": connections
-        }
-        
-        print(f"✓ Filtered {topic_key}: {len(nodes)} nodes, {len(connections)} connections")
+        print(f"✓ Filtered {topic_key}: {len(filtered_topic['nodes'])} nodes, {len(filtered_topic['connections'])} connections")
     
     # Save filtered data
     print("\n" + "=" * 80)
@@ -99,22 +82,197 @@ def filter_structured_data(input_file: str, output_file: str) -> Dict[str, Any]:
     return filtered_data
 
 
+def project_structured_data(
+    input_file: str,
+    views: Dict[str, Union[str, Dict[str, Any], Projection]],
+    verbose: bool = True
+) -> Dict[str, int]:
+    """
+    Write several projections of a structured output file in one pass.
+    
+    Topics are read one at a time with an incremental parser, and each
+    topic is projected and written to every view as soon as it is read, so
+    memory is bounded by the largest topic rather than the whole file, and
+    the file is read and parsed once whatever the number of views.
+    
+    Args:
+        input_file: Path to the input structured JSON file
+        views: Projection of each output file: a preset name (see
+            projection.PRESETS), a spec file, a spec, or a Projection
+        verbose: Print a line per topic and the summary
+        
+    Returns:
+        Dictionary with the number of topics, nodes and connections read
+    """
+    try:
+        projections = {
+            output_file: view if isinstance(view, Projection) else Projection.load(view)
+            for output_file, view in views.items()
+        }
+    except ValueError as e:
+        print(f"Error: Invalid projection: {e}")
+        sys.exit(1)
+    
+    totals = {"topics": 0, "nodes": 0, "connections": 0}
+    if verbose:
+        print(f"Streaming structured data from: {input_file}")
+        for output_file, projection in projections.items():
+            print(f"  - {projection.name} view -> {output_file}")
+        print("=" * 80)
+    
+    files = []
+    try:
+        with open(input_file, "r", encoding="utf-8") as f_in:
+            files = [open(output_file, "w", encoding="utf-8") for output_file in projections]
+            writers = [(ObjectWriter(f), projection) for f, projection in zip(files, projections.values())]
+            for key, topic_data in iter_object_members(f_in):
+                for writer, projection in writers:
+                    writer.write(key, projection.project(topic_data))
+                nodes = sum(isinstance(node, dict) for node in topic_data.get("nodes", []))
+                connections = sum(isinstance(conn, dict) for conn in topic_data.get("connections", []))
+                totals["topics"] += 1
+                totals["nodes"] += nodes
+                totals["connections"] += connections
+                if verbose:
+                    print(f"✓ Filtered {key}: {nodes} nodes, {connections} connections")
+            for writer, _ in writers:
+                writer.close()
+    except FileNotFoundError:
+        print(f"Error: Input file '{input_file}' not found.")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON in input file: {e}")
+        sys.exit(1)
+    finally:
+        for f in files:
+            f.close()
+    
+    if verbose:
+        print("\n" + "=" * 80)
+        print(f"✓ Successfully saved {len(projections)} views")
+        print("FILTERING SUMMARY")
+        print("=" * 80)
+        print(f"Total topics: {totals['topics']}")
+        print(f"Total nodes: {totals['nodes']}")
+        print(f"Total connections: {totals['connections']}")
+        print("=" * 80)
+    return totals
+
+
+def stream_filter_structured_data(input_file: str, output_file: str, verbose: bool = True) -> Dict[str, int]:
+    """
+    Filter a structured output file one topic at a time.
+    
+    Same output as filter_structured_data, byte for byte, with memory bounded
+    by the largest topic (see project_structured_data).
+    
+    Args:
+        input_file: Path to the input structured JSON file
+        output_file: Path to save the filtered output JSON file
+        verbose: Print a line per topic and the summary
+        
+    Returns:
+        Dictionary with the number of topics, nodes and connections written
+    """
+    return project_structured_data(input_file, {output_file: "filtered"}, verbose)
+
+
+def filter_many(
+    input_paths: List[str],
+    output_dir: str,
+    max_workers: Optional[int] = None,
+    view: Union[str, Dict[str, Any]] = "filtered"
+) -> Dict[str, Dict[str, int]]:
+    """
+    Filter many structured output files in a process pool.
+    
+    Each file is streamed (see project_structured_data) by a worker
+    process and written to output_dir under the same file name.
+    
+    Args:
+        input_paths: Files, directories (every *.json inside) or glob patterns
+        output_dir: Directory to write the filtered files to
+        max_workers: Worker processes (default: one per CPU)
+        view: Projection written for each file (preset name, spec file or spec)
+        
+    Returns:
+        Totals of each file, keyed by input path
+    """
+    input_files = expand_paths(input_paths)
+    os.makedirs(output_dir, exist_ok=True)
+    output_files = [os.path.join(output_dir, os.path.basename(path)) for path in input_files]
+    if len(set(output_files)) < len(output_files):
+        print("Error: Input files must have distinct names to share an output directory.")
+        sys.exit(1)
+    
+    print(f"Filtering {len(input_files)} files into {output_dir}")
+    print("=" * 80)
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            input_file: executor.submit(project_structured_data, input_file, {output_file: view}, False)
+            for input_file, output_file in zip(input_files, output_files)
+        }
+        for input_file, future in futures.items():
+            results[input_file] = future.result()
+            totals = results[input_file]
+            print(f"✓ Filtered {input_file}: {totals['topics']} topics, {totals['nodes']} nodes, {totals['connections']} connections")
+    
+    print("=" * 80)
+    print(f"Total topics: {sum(totals['topics'] for totals in results.values())}")
+    print("=" * 80)
+    return results
+
+
 def main():
     """Main function for command-line usage."""
-    if len(sys.argv) < 2:
-        print("Usage: python filter_structure.py [input_file] [output_file]")
+    # Options can appear anywhere on the command line
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    args = [arg for arg in args if arg != "--stream"]
+    options = {"--workers": None, "--projection": None}
+    views = {}
+    while any(arg in options or arg == "--view" for arg in args):
+        position = next(i for i, arg in enumerate(args) if arg in options or arg == "--view")
+        if position + 1 >= len(args):
+            print(f"Error: {args[position]} needs a value")
+            sys.exit(1)
+        if args[position] == "--view":
+            output_file, _, view = args[position + 1].partition("=")
+            views[output_file] = view or "filtered"
+        else:
+            options[args[position]] = args[position + 1]
+        args = args[:position] + args[position + 2:]
+    max_workers = int(options["--workers"]) if options["--workers"] else None
+    projection = options["--projection"] or "filtered"
+    
+    if len(args) < 1:
+        print("Usage: python filter_structure.py [input_file|directory|glob] [output_file|output_dir] [--stream] [--projection NAME] [--view OUTPUT=NAME ...] [--workers N]")
         print("  input_file: Path to structured JSON file (default: structured_output_2.json)")
         print("  output_file: Path to save filtered output (default: final_result.json)")
+        print("  directory|glob: Filter every structured file in a process pool, into output_dir (default: filtered)")
+        print("  --stream: Read and write one topic at a time (bounded memory)")
+        print(f"  --projection: Fields to keep: {', '.join(PRESETS)} or a JSON spec file (default: filtered)")
+        print("  --view: Write another projection to OUTPUT in the same pass (repeatable; implies --stream)")
+        print("  --workers: Worker processes for many files (default: one per CPU)")
         print("\nExample:")
         print("  python filter_structure.py structured_output_2.json final_result.json")
+        print("  python filter_structure.py structured_output_2.json final_result.json --view typed.json=typed --view compact.json=compact")
+        print("  python filter_structure.py 'episodes/structured_output_*.json' filtered --workers 8")
         sys.exit(1)
     
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "structured_output_2.json"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "final_result.json"
+    input_file = args[0] if len(args) > 0 else "structured_output_2.json"
+    
+    if os.path.isdir(input_file) or glob.has_magic(input_file):
+        filter_many([input_file], args[1] if len(args) > 1 else "filtered", max_workers, projection)
+        return
     
-    filter_structured_data(input_file, output_file)
+    output_file = args[1] if len(args) > 1 else "final_result.json"
+    if stream or views or projection != "filtered":
+        project_structured_data(input_file, {output_file: projection, **views})
+    else:
+        filter_structured_data(input_file, output_file)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,380 @@
+import glob
+import json
+import os
+import sys
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+
+NODE_FIELDS = ("id", "type", "content", "speaker", "text_reference")
+EDGE_FIELDS = ("id", "type", "content", "source_node_id", "target_node_id", "text_reference")
+_NODE_FIELD_SET = frozenset(NODE_FIELDS)
+_EDGE_FIELD_SET = frozenset(EDGE_FIELDS)
+
+# Fields written for each layout of the JSON files (projection.PRESETS
+# derives its "filtered" and "typed" views from "filtered")
+LAYOUTS = {
+    # structured_output_*.json, as written by text_to_structure
+    "structured": {"nodes": NODE_FIELDS, "connections": EDGE_FIELDS},
+    # final_result.json, as written by filter_structure
+    "filtered": {
+        "nodes": ("id", "content", "speaker"),
+        "connections": ("id", "content", "source_node_id", "target_node_id")
+    }
+}
+
+
+def _intern(value: Any) -> Any:
+    # Types, speakers and ids repeat across thousands of records
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _get_interned(record: Dict[str, Any], field: str) -> Any:
+    # Only ids, speakers and types are interned: content is rarely repeated
+    value = record.get(field)
+    return sys.intern(value) if value.__class__ is str else value
+
+
+def _nulls(record: Dict[str, Any], fields: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    # Explicit nulls are rare: most records are returned from the first check
+    if None not in record.values():
+        return None
+    return tuple(field for field in fields if field in record and record[field] is None) or None
+
+
+def _record(element: Any, fields: Tuple[str, ...], defaults: bool, all_fields: Tuple[str, ...]) -> Dict[str, Any]:
+    # JSON object of a node or edge: without defaults, explicit nulls are written back as null
+    record = {}
+    for field in fields:
+        value = getattr(element, field)
+        if value is not None:
+            record[field] = value
+        elif defaults:
+            record[field] = ""
+        elif element.nulls and field in element.nulls:
+            record[field] = None
+    if element.extra and fields == all_fields:
+        record.update(element.extra)
+    return record
+
+
+class Node:
+    """A node of a topic graph; index is its position in TopicGraph.nodes."""
+
+    __slots__ = ("index", "id", "type", "content", "speaker", "text_reference", "extra", "nulls")
+
+    def __init__(
+        self,
+        index: int,
+        id: str,
+        type: Optional[str] = None,
+        content: Optional[str] = None,
+        speaker: Optional[str] = None,
+        text_reference: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        nulls: Optional[Tuple[str, ...]] = None
+    ):
+        self.index = index
+        self.id = id
+        self.type = type
+        self.content = content
+        self.speaker = speaker
+        self.text_reference = text_reference
+        # Fields outside NODE_FIELDS, kept so that writing back is lossless
+        self.extra = extra
+        # Fields set to null in the file (a None attribute is otherwise a missing field)
+        self.nulls = nulls
+
+    def to_dict(self, fields: Tuple[str, ...] = NODE_FIELDS, defaults: bool = False) -> Dict[str, Any]:
+        """Build the JSON object of the node (missing fields are left out, or "" if defaults)."""
+        return _record(self, fields, defaults, NODE_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Node(index={self.index}, id={self.id}, type={self.type})"
+
+
+class Edge:
+    """
+    A connection of a topic graph.
+
+    source and target are node indexes, or -1 when the connection refers to
+    an id that is not a node of the topic (the original ids are kept).
+    """
+
+    __slots__ = (
+        "index", "id", "type", "content", "source", "target",
+        "source_node_id", "target_node_id", "text_reference", "extra", "nulls"
+    )
+
+    def __init__(
+        self,
+        index: int,
+        id: str,
+        type: Optional[str],
+        content: Optional[str],
+        source: int,
+        target: int,
+        source_node_id: Optional[str],
+        target_node_id: Optional[str],
+        text_reference: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        nulls: Optional[Tuple[str, ...]] = None
+    ):
+        self.index = index
+        self.id = id
+        self.type = type
+        self.content = content
+        self.source = source
+        self.target = target
+        self.source_node_id = source_node_id
+        self.target_node_id = target_node_id
+        self.text_reference = text_reference
+        self.extra = extra
+        self.nulls = nulls
+
+    def to_dict(self, fields: Tuple[str, ...] = EDGE_FIELDS, defaults: bool = False) -> Dict[str, Any]:
+        """Build the JSON object of the connection (missing fields are left out, or "" if defaults)."""
+        return _record(self, fields, defaults, EDGE_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Edge(index={self.index}, id={self.id}, {self.source}->{self.target})"
+
+
+class TopicGraph:
+    """
+    Graph of one topic: nodes and connections with integer ids and adjacency indexes.
+
+    Nodes and edges are stored in lists, so node/edge indexes are positions
+    in those lists. Looking up a node by its string id, or the edges going
+    out of / into a node, is a dictionary or list access.
+    """
+
+    __slots__ = ("key", "attributes", "nodes", "edges", "_by_id", "_out", "_in")
+
+    def __init__(self, key: str, attributes: Optional[Dict[str, Any]] = None):
+        """
+        Initialize a TopicGraph instance.
+
+        Args:
+            key: Key of the topic in the JSON file (e.g., topic_1)
+            attributes: Other fields of the topic (title, schema_type, ...), in file order
+        """
+        self.key = _intern(key)
+        self.attributes = attributes if attributes is not None else {}
+        self.nodes: List[Node] = []
+        self.edges: List[Edge] = []
+        self._by_id: Dict[str, int] = {}
+        self._out: List[List[int]] = []
+        self._in: List[List[int]] = []
+
+    @property
+    def title(self) -> Optional[str]:
+        return self.attributes.get("title")
+
+    def add_node(self, id: str, **fields: Any) -> Node:
+        """Add a node; a later node with the same id shadows the earlier one in lookups."""
+        return self._add_node_record({"id": id, **fields})
+
+    def add_edge(self, id: str, source_node_id: Optional[str], target_node_id: Optional[str], **fields: Any) -> Edge:
+        """Add a connection between two node ids (nodes must be added before their connections)."""
+        return self._add_edge_record(
+            {"id": id, "source_node_id": source_node_id, "target_node_id": target_node_id, **fields}
+        )
+
+    def _add_node_record(self, record: Dict[str, Any]) -> Node:
+        # Add a node from its JSON object, without copying it into keyword arguments
+        get = record.get
+        extra = None
+        if not record.keys() <= _NODE_FIELD_SET:
+            extra = {k: v for k, v in record.items() if k not in _NODE_FIELD_SET}
+        node = Node(
+            len(self.nodes),
+            _get_interned(record, "id"),
+            _get_interned(record, "type"),
+            get("content"),
+            _get_interned(record, "speaker"),
+            get("text_reference"),
+            extra,
+            _nulls(record, NODE_FIELDS)
+        )
+        self.nodes.append(node)
+        self._out.append([])
+        self._in.append([])
+        self._by_id[node.id] = node.index
+        return node
+
+    def _add_edge_record(self, record: Dict[str, Any]) -> Edge:
+        # Add a connection from its JSON object (see _add_node_record)
+        get = record.get
+        extra = None
+        if not record.keys() <= _EDGE_FIELD_SET:
+            extra = {k: v for k, v in record.items() if k not in _EDGE_FIELD_SET}
+        source_node_id = _get_interned(record, "source_node_id")
+        target_node_id = _get_interned(record, "target_node_id")
+        source = self._by_id.get(source_node_id, -1)
+        target = self._by_id.get(target_node_id, -1)
+        edge = Edge(
+            len(self.edges),
+            _get_interned(record, "id"),
+            _get_interned(record, "type"),
+            get("content"),
+            source,
+            target,
+            source_node_id,
+            target_node_id,
+            get("text_reference"),
+            extra,
+            _nulls(record, EDGE_FIELDS)
+        )
+        self.edges.append(edge)
+        if source >= 0:
+            self._out[source].append(edge.index)
+        if target >= 0:
+            self._in[target].append(edge.index)
+        return edge
+
+    def node(self, id: str) -> Optional[Node]:
+        """Get a node by its string id."""
+        index = self._by_id.get(id)
+        return self.nodes[index] if index is not None else None
+
+    def out_edges(self, node_index: int) -> List[Edge]:
+        """Get the connections leaving a node."""
+        return [self.edges[i] for i in self._out[node_index]]
+
+    def in_edges(self, node_index: int) -> List[Edge]:
+        """Get the connections arriving at a node."""
+        return [self.edges[i] for i in self._in[node_index]]
+
+    def neighbors(self, node_index: int) -> List[int]:
+        """Get the indexes of the nodes connected to a node, in either direction."""
+        neighbors = [self.edges[i].target for i in self._out[node_index]]
+        neighbors += [self.edges[i].source for i in self._in[node_index]]
+        return [index for index in neighbors if index >= 0]
+
+    def dangling_edges(self) -> List[Edge]:
+        """Get the connections referring to an id that is not a node of the topic."""
+        return [edge for edge in self.edges if edge.source < 0 or edge.target < 0]
+
+    @classmethod
+    def from_dict(cls, key: str, topic_data: Dict[str, Any]) -> "TopicGraph":
+        """Build the graph of a topic entry of a structured or filtered JSON file."""
+        graph = cls(key, dict(topic_data))
+        if "schema_type" in graph.attributes:
+            graph.attributes["schema_type"] = _intern(graph.attributes["schema_type"])
+        for node in topic_data.get("nodes", []):
+            if isinstance(node, dict):
+                graph._add_node_record(node)
+        for conn in topic_data.get("connections", []):
+            if isinstance(conn, dict):
+                graph._add_edge_record(conn)
+        # Nodes and connections are stored in the graph, not in the attributes;
+        # their keys stay in place to keep the field order of the file
+        graph.attributes["nodes"] = None
+        graph.attributes["connections"] = None
+        return graph
+
+    def to_dict(self, layout: str = "structured") -> Dict[str, Any]:
+        """
+        Build the JSON entry of the topic.
+
+        Args:
+            layout: "structured" (all fields, as in structured_output_*.json) or
+                "filtered" (title, and the fields kept by filter_structure)
+        """
+        fields = LAYOUTS[layout]
+        defaults = layout == "filtered"
+        nodes = [node.to_dict(fields["nodes"], defaults) for node in self.nodes]
+        connections = [edge.to_dict(fields["connections"], defaults) for edge in self.edges]
+
+        if layout == "filtered":
+            return {"title": self.attributes.get("title", ""), "nodes": nodes, "connections": connections}
+
+        topic = {}
+        for field, value in self.attributes.items():
+            if field == "nodes":
+                topic[field] = nodes
+            elif field == "connections":
+                topic[field] = connections
+            else:
+                topic[field] = value
+        topic.setdefault("nodes", nodes)
+        topic.setdefault("connections", connections)
+        return topic
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __repr__(self) -> str:
+        return f"TopicGraph(key={self.key}, nodes={len(self.nodes)}, edges={len(self.edges)})"
+
+
+class EpisodeGraph:
+    """Graphs of all the topics of an episode, in file order."""
+
+    __slots__ = ("topics",)
+
+    def __init__(self, topics: Optional[Dict[str, TopicGraph]] = None):
+        """
+        Initialize an EpisodeGraph instance.
+
+        Args:
+            topics: Topic graphs keyed by topic key
+        """
+        self.topics: Dict[str, TopicGraph] = topics if topics is not None else {}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EpisodeGraph":
+        """Build the graphs of every topic of a structured or filtered JSON document."""
+        return cls({key: TopicGraph.from_dict(key, topic_data) for key, topic_data in data.items()})
+
+    @classmethod
+    def load(cls, path: str) -> "EpisodeGraph":
+        """Load a structured_output_*.json or final_result.json file."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self, layout: str = "structured") -> Dict[str, Any]:
+        """Build the JSON document of the episode in a layout (see TopicGraph.to_dict)."""
+        return {key: topic.to_dict(layout) for key, topic in self.topics.items()}
+
+    def save(self, path: str, layout: str = "structured") -> None:
+        """Write the episode in the same format as the pipeline's JSON files."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(layout), f, indent=2, ensure_ascii=False)
+
+    def __iter__(self) -> Iterator[TopicGraph]:
+        return iter(self.topics.values())
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def node_count(self) -> int:
+        return sum(len(topic.nodes) for topic in self.topics.values())
+
+    def edge_count(self) -> int:
+        return sum(len(topic.edges) for topic in self.topics.values())
+
+    def __repr__(self) -> str:
+        return f"EpisodeGraph(topics={len(self.topics)}, nodes={self.node_count()}, edges={self.edge_count()})"
+
+
+def expand_paths(paths: List[str], pattern: str = "*.json") -> List[str]:
+    """
+    Expand input arguments into file paths.
+
+    Args:
+        paths: Files, directories (every file matching pattern inside) or glob patterns
+        pattern: Files taken from a directory
+
+    Returns:
+        The file paths, directories and globs expanded in sorted order
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
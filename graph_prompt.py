@@ -0,0 +1,125 @@
+import re
+from typing import Dict, Any, Optional
+
+
+# Explanation of the encoding, placed before encoded data in prompts
+GRAPH_FORMAT = """Each topic starts with "## <topic key>: <title>" (with "{<schema>}" after the key when the topic has a schema type). Below it, each node is a line "<number> [<speaker>] <content>" (with "(<TYPE>) " before the speaker when nodes have types), where the number identifies the node within the topic; each connection is a line "<source number> -> <target number>: <description>" (or "<source number> -<TYPE>-> <target number>: <description>" when the relationship has a type)."""
+
+_HEADER = re.compile(r"^## (\S+?)(?: \{(\S+)\})?:(?: (.*))?$")
+_NODE = re.compile(r"^(\d+) (?:\(([^)\s]+)\) )?\[([^\]]*)\](?: (.*))?$")
+_EDGE = re.compile(r"^(\d+|\?\S*) -(?:(\S+?)-)?> (\d+|\?\S*)(?:: (.*))?$")
+
+
+def _escape(text: Any) -> str:
+    # One record per line: newlines (and the backslashes escaping them) are escaped
+    if text is None:
+        return ""
+    return str(text).replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _unescape(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), text)
+
+
+def encode_topic(topic_key: str, topic: Dict[str, Any]) -> str:
+    """
+    Encode one topic entry as compact prompt text.
+
+    Nodes are numbered from 1 in file order and connections refer to those
+    numbers, so ids and the repeated field names of the JSON are not sent.
+    A connection to an id that is not a node of the topic is written with
+    the id after a "?" (e.g., "?node_12"). Node and connection types and the
+    topic's schema_type are written when present; other fields (e.g.,
+    text_reference) are left out.
+
+    Args:
+        topic_key: Key of the topic (e.g., topic_1)
+        topic: Topic entry of a structured or filtered file
+
+    Returns:
+        The topic header line followed by one line per node and per connection
+    """
+    schema_type = topic.get("schema_type")
+    header = f"## {topic_key}" + (f" {{{schema_type}}}" if schema_type else "")
+    lines = [f"{header}: {_escape(topic.get('title'))}".rstrip()]
+
+    nodes = [node for node in topic.get("nodes") or [] if isinstance(node, dict)]
+    numbers = {node.get("id"): str(number) for number, node in enumerate(nodes, 1)}
+    for number, node in enumerate(nodes, 1):
+        node_type = f"({node['type']}) " if node.get("type") else ""
+        lines.append(f"{number} {node_type}[{_escape(node.get('speaker'))}] {_escape(node.get('content'))}".rstrip())
+
+    for conn in topic.get("connections") or []:
+        if not isinstance(conn, dict):
+            continue
+        source = numbers.get(conn.get("source_node_id")) or f"?{conn.get('source_node_id') or ''}"
+        target = numbers.get(conn.get("target_node_id")) or f"?{conn.get('target_node_id') or ''}"
+        arrow = f"-{conn['type']}->" if conn.get("type") else "->"
+        content = _escape(conn.get("content"))
+        lines.append(f"{source} {arrow} {target}" + (f": {content}" if content else ""))
+    return "\n".join(lines)
+
+
+def encode_graph(data: Dict[str, Dict[str, Any]]) -> str:
+    """Encode every topic of a structured or filtered document, separated by blank lines."""
+    return "\n\n".join(encode_topic(topic_key, topic) for topic_key, topic in data.items())
+
+
+def decode_graph(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Decode text written by encode_graph back into topic entries.
+
+    Topics are rebuilt in the filtered layout of final_result.json (or the
+    "typed" projection when types are present), with node and connection
+    ids renumbered node_1, node_2, ... and conn_1, conn_2, ... in order, as
+    the pipeline writes them.
+
+    Raises:
+        ValueError: If a line is not a topic header, node or connection
+    """
+    data = {}
+    topic = None
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        match = _HEADER.match(line)
+        if match:
+            topic_key, schema_type, title = match.groups()
+            topic = {"title": _unescape(title)}
+            if schema_type:
+                topic["schema_type"] = schema_type
+            topic["nodes"] = []
+            topic["connections"] = []
+            data[topic_key] = topic
+            continue
+        if topic is None:
+            raise ValueError(f"line {line_number}: expected a topic header, got {line!r}")
+
+        match = _NODE.match(line)
+        if match:
+            number, node_type, speaker, content = match.groups()
+            node: Dict[str, Any] = {"id": f"node_{number}"}
+            if node_type:
+                node["type"] = node_type
+            node["content"] = _unescape(content)
+            node["speaker"] = _unescape(speaker)
+            topic["nodes"].append(node)
+            continue
+
+        match = _EDGE.match(line)
+        if match:
+            source, conn_type, target, content = match.groups()
+            conn: Dict[str, Any] = {"id": f"conn_{len(topic['connections']) + 1}"}
+            if conn_type:
+                conn["type"] = conn_type
+            conn["content"] = _unescape(content)
+            conn["source_node_id"] = source[1:] if source.startswith("?") else f"node_{source}"
+            conn["target_node_id"] = target[1:] if target.startswith("?") else f"node_{target}"
+            topic["connections"].append(conn)
+            continue
+
+        raise ValueError(f"line {line_number}: not a node or connection line: {line!r}")
+    return data
+
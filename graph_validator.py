@@ -0,0 +1,262 @@
+import json
+import sys
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Optional
+from schema.registry import get_registry
+from graph_model import EpisodeGraph, TopicGraph, expand_paths
+
+
+registry = get_registry()
+
+
+# Rule tables, built once at import from the schema registry. Node and
+# connection types are coded as small integers, and every rule becomes a
+# bitmask over those codes, so that checking an element is an integer lookup
+# and a bit test.
+NODE_TYPE_CODES: Dict[str, int] = {node_type: code for code, node_type in enumerate(registry.node_types)}
+CONNECTION_TYPE_CODES: Dict[str, int] = {
+    connection_type: code for code, connection_type in enumerate(registry.connection_types)
+}
+_NODE_TYPE_COUNT = len(NODE_TYPE_CODES)
+
+# Allowed node / connection types of each schema
+SCHEMA_NODE_MASKS: Dict[str, int] = {
+    schema: sum(1 << NODE_TYPE_CODES[t] for t in types) for schema, types in registry.node_type_sets.items()
+}
+SCHEMA_CONNECTION_MASKS: Dict[str, int] = {
+    schema: sum(1 << CONNECTION_TYPE_CODES[t] for t in types)
+    for schema, types in registry.connection_type_sets.items()
+}
+# Allowed (source type, target type) pairs of each connection type, bit source * N + target
+PAIR_MASKS: List[int] = [
+    sum(
+        1 << (NODE_TYPE_CODES[source] * _NODE_TYPE_COUNT + NODE_TYPE_CODES[target])
+        for source, target in registry.node_pairs[connection_type]
+    )
+    for connection_type in registry.connection_types
+]
+
+# Severity of each violation code
+SEVERITIES = {
+    "duplicate_node_id": "error",
+    "unknown_node_type": "error",
+    "illegal_node_type": "error",
+    "unknown_connection_type": "error",
+    "illegal_connection_type": "error",
+    "dangling_edge": "error",
+    # The allowed pairs are examples of typical pairs, not an exhaustive list
+    "unexpected_node_pair": "warning",
+    "disconnected_graph": "warning",
+}
+
+
+def _violation(topic: TopicGraph, code: str, element_id: Any, message: str) -> Dict[str, Any]:
+    return {
+        "topic": topic.key,
+        "code": code,
+        "severity": SEVERITIES[code],
+        "id": element_id,
+        "message": message
+    }
+
+
+def validate_topic(topic: TopicGraph, schema_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Check the graph of one topic against the schema rules.
+
+    Checks:
+        duplicate node ids, node and connection types (known, and allowed by
+        the topic's schema), connections to missing nodes, (source, target)
+        node types against the registry's allowed node pairs,
+        and that all nodes form a single connected component
+
+    Type checks are skipped for layouts without types (final_result.json),
+    and schema checks for topics without a known schema_type.
+
+    Args:
+        topic: Graph of the topic
+        schema_type: Schema to check against (default: the topic's schema_type)
+
+    Returns:
+        Violations, each a dict with topic, code, severity, id and message
+    """
+    violations = []
+    schema_type = schema_type or topic.attributes.get("schema_type")
+    node_mask = SCHEMA_NODE_MASKS.get(schema_type, -1)
+    connection_mask = SCHEMA_CONNECTION_MASKS.get(schema_type, -1)
+
+    node_codes = []
+    seen_ids = set()
+    for node in topic.nodes:
+        if node.id in seen_ids:
+            violations.append(_violation(
+                topic, "duplicate_node_id", node.id, f"node id {node.id} is used more than once"
+            ))
+        seen_ids.add(node.id)
+
+        code = NODE_TYPE_CODES.get(node.type, -1) if isinstance(node.type, str) else -1
+        node_codes.append(code)
+        if node.type is None:
+            continue
+        if code < 0:
+            violations.append(_violation(
+                topic, "unknown_node_type", node.id, f"node {node.id} has unknown type {node.type}"
+            ))
+        elif not node_mask >> code & 1:
+            violations.append(_violation(
+                topic, "illegal_node_type", node.id,
+                f"node {node.id} has type {node.type}, not allowed in the {schema_type} schema"
+            ))
+
+    # Union-find over node indexes for connectivity
+    parents = list(range(len(topic.nodes)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for edge in topic.edges:
+        if edge.source < 0 or edge.target < 0:
+            ends = ((edge.source_node_id, edge.source), (edge.target_node_id, edge.target))
+            missing = [node_id for node_id, index in ends if index < 0]
+            violations.append(_violation(
+                topic, "dangling_edge", edge.id,
+                f"connection {edge.id} refers to missing node(s) {', '.join(map(str, missing))}"
+            ))
+        else:
+            parents[find(edge.source)] = find(edge.target)
+
+        if edge.type is None:
+            continue
+        code = CONNECTION_TYPE_CODES.get(edge.type, -1) if isinstance(edge.type, str) else -1
+        if code < 0:
+            violations.append(_violation(
+                topic, "unknown_connection_type", edge.id, f"connection {edge.id} has unknown type {edge.type}"
+            ))
+            continue
+        if not connection_mask >> code & 1:
+            violations.append(_violation(
+                topic, "illegal_connection_type", edge.id,
+                f"connection {edge.id} has type {edge.type}, not allowed in the {schema_type} schema"
+            ))
+        if edge.source >= 0 and edge.target >= 0:
+            source_code = node_codes[edge.source]
+            target_code = node_codes[edge.target]
+            pair_bit = source_code * _NODE_TYPE_COUNT + target_code
+            if source_code >= 0 and target_code >= 0 and not PAIR_MASKS[code] >> pair_bit & 1:
+                violations.append(_violation(
+                    topic, "unexpected_node_pair", edge.id,
+                    f"connection {edge.id} ({edge.type}) links {topic.nodes[edge.source].type} "
+                    f"to {topic.nodes[edge.target].type}"
+                ))
+
+    components = len({find(index) for index in range(len(parents))})
+    if components > 1:
+        violations.append(_violation(
+            topic, "disconnected_graph", None,
+            f"the {len(parents)} nodes form {components} disconnected components"
+        ))
+    return violations
+
+
+def validate_structure(result: Dict[str, Any], topic_key: str = "topic") -> List[Dict[str, Any]]:
+    """Check a single structured result (e.g., right after the LLM response)."""
+    return validate_topic(TopicGraph.from_dict(topic_key, result))
+
+
+def validate_episode(episode: EpisodeGraph) -> List[Dict[str, Any]]:
+    """Check every topic of an episode."""
+    violations = []
+    for topic in episode:
+        violations.extend(validate_topic(topic))
+    return violations
+
+
+def summarize_violations(violations: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Count violations by code."""
+    return dict(Counter(violation["code"] for violation in violations))
+
+
+def format_violation_counts(violations: List[Dict[str, Any]]) -> str:
+    """One-line summary of violations, e.g. "2 errors (dangling_edge: 2), 1 warning (...)"."""
+    parts = []
+    for severity in ("error", "warning"):
+        counts = Counter(v["code"] for v in violations if v["severity"] == severity)
+        if counts:
+            total = sum(counts.values())
+            details = ", ".join(f"{code}: {count}" for code, count in sorted(counts.items()))
+            parts.append(f"{total} {severity}{'s' if total > 1 else ''} ({details})")
+    return ", ".join(parts) if parts else "no violations"
+
+
+def validate_files(paths: Iterable[str]) -> Dict[str, Any]:
+    """
+    Check structured output files and build a machine-readable report.
+
+    Args:
+        paths: Files, directories (every *.json inside) or glob patterns
+
+    Returns:
+        Dictionary with the files checked, topic count, per-code counts and
+        the violations, each tagged with its file
+    """
+    files = expand_paths(list(paths))
+
+    violations = []
+    topics = 0
+    for path in files:
+        episode = EpisodeGraph.load(path)
+        topics += len(episode)
+        for violation in validate_episode(episode):
+            violations.append({"file": path, **violation})
+
+    return {
+        "files": files,
+        "topics": topics,
+        "counts": summarize_violations(violations),
+        "violations": violations
+    }
+
+
+def main():
+    """Main function for command-line usage."""
+    report_file = None
+    args = sys.argv[1:]
+    if "--report" in args:
+        position = args.index("--report")
+        report_file = args[position + 1] if position + 1 < len(args) else None
+        args = args[:position] + args[position + 2:]
+
+    if not args:
+        print("Usage: python graph_validator.py <structured_file|directory|glob> [...] [--report report.json]")
+        print("  structured_file: Structured output JSON file(s) to check")
+        print("  --report: Write the violations as JSON to this file")
+        print("\nExample:")
+        print("  python graph_validator.py structured_output_2.json --report violations.json")
+        sys.exit(1)
+
+    report = validate_files(args)
+
+    print("=" * 80)
+    print("GRAPH VALIDATION")
+    print("=" * 80)
+    print(f"Files: {len(report['files'])}")
+    print(f"Topics: {report['topics']}")
+    print(f"Violations: {len(report['violations'])}")
+    for code, count in sorted(report["counts"].items()):
+        print(f"  - {code} ({SEVERITIES[code]}): {count}")
+    print("=" * 80)
+
+    if report_file:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✓ Report saved to {report_file}")
+
+    if any(violation["severity"] == "error" for violation in report["violations"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from token_budget import check_budget, count_tokens, get_token_ledger
+
+
+DEFAULT_CACHE_PATH = os.path.join(".llm_cache", "responses.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60  # 30 days
+
+
+class LLMCache:
+    """
+    On-disk cache of chat completion responses.
+
+    Entries are keyed by a hash of the request (model, messages, temperature,
+    response_format), so rerunning an unchanged pipeline stage returns the
+    stored response instead of calling the API again. The cache is bounded
+    in size (least recently used entries are evicted first) and entries
+    expire after a TTL.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        bypass: bool = False
+    ):
+        """
+        Initialize an LLMCache instance.
+
+        Args:
+            path: Path of the SQLite file holding the cache
+            max_bytes: Maximum total size of cached responses
+            ttl_seconds: Age after which an entry is considered stale
+            bypass: If True, never read from nor write to the cache
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Hash the parts of a request that determine its response."""
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "response_format": response_format
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss."""
+        if self.bypass:
+            return None
+
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT content, size, created_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            content, size, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            self.bytes_saved += size
+            return content
+
+    def put(self, key: str, content: str) -> None:
+        """Store a response and evict old entries if the cache is over budget."""
+        if self.bypass:
+            return
+
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def delete(self, key: str) -> None:
+        """Remove one response (e.g., a stored response that turned out unusable)."""
+        if self.bypass:
+            return
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        stale_keys = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for this process."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+            "bypass": self.bypass
+        }
+
+    def __repr__(self) -> str:
+        return f"LLMCache(path={self.path}, hits={self.hits}, misses={self.misses})"
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> LLMCache:
+    """
+    Get the process-wide cache shared by all call sites.
+
+    Configured through the environment:
+        LLM_CACHE_PATH: SQLite file (default: .llm_cache/responses.sqlite3)
+        LLM_CACHE_MAX_BYTES: size bound in bytes
+        LLM_CACHE_TTL_SECONDS: entry lifetime in seconds
+        LLM_CACHE_BYPASS: set to 1 to disable the cache
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(
+                path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                bypass=os.getenv("LLM_CACHE_BYPASS", "0").lower() in ("1", "true", "yes")
+            )
+        return _default_cache
+
+
+def _parses_as_json(content: str) -> bool:
+    try:
+        json.loads(content)
+        return True
+    except ValueError:
+        return False
+
+
+def _response_validator(
+    response_format: Optional[Dict[str, Any]],
+    validate: Optional[Callable[[str], bool]]
+) -> Optional[Callable[[str], bool]]:
+    # JSON-mode responses must at least parse to be worth storing
+    if validate is None and response_format and response_format.get("type") in ("json_object", "json_schema"):
+        return _parses_as_json
+    return validate
+
+
+def _cached_content(
+    cache: LLMCache,
+    key: str,
+    validate: Optional[Callable[[str], bool]]
+) -> Optional[str]:
+    """Get a stored response, evicting it if it does not pass validate."""
+    content = cache.get(key)
+    if content is not None and validate is not None and not validate(content):
+        cache.delete(key)
+        return None
+    return content
+
+
+def cached_chat_completion(
+    client,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    cache: Optional[LLMCache] = None,
+    stage: str = "other",
+    validate: Optional[Callable[[str], bool]] = None
+) -> str:
+    """
+    Run a chat completion through the response cache.
+
+    Only complete responses (finish_reason "stop") that pass validate are
+    stored, so a cut-off or unusable response is not replayed on reruns.
+
+    Args:
+        client: OpenAI client used on a cache miss
+        model: Model name
+        messages: Chat messages
+        temperature: Sampling temperature
+        response_format: Optional response format (e.g., {"type": "json_object"})
+        cache: Cache to use (default: the shared process-wide cache)
+        stage: Pipeline stage the request's tokens are counted under
+        validate: Check a response must pass to be stored or served from the
+            cache (default: JSON responses must parse)
+
+    Returns:
+        The content of the first choice of the response
+    """
+    # Fail before the round trip if the request cannot fit the context window
+    prompt_tokens = check_budget(messages, model)
+    cache = cache or get_default_cache()
+    key = cache.make_key(model, messages, temperature, response_format)
+    validate = _response_validator(response_format, validate)
+
+    content = _cached_content(cache, key, validate)
+    if content is not None:
+        get_token_ledger().record(stage, prompt_tokens, count_tokens(content, model), cached=True)
+        return content
+
+    request = {"model": model, "messages": messages}
+    if temperature is not None:
+        request["temperature"] = temperature
+    if response_format is not None:
+        request["response_format"] = response_format
+
+    response = client.chat.completions.create(**request)
+    choice = response.choices[0]
+    content = choice.message.content
+    if content is not None and choice.finish_reason == "stop" and (validate is None or validate(content)):
+        cache.put(key, content)
+    get_token_ledger().record(stage, prompt_tokens, count_tokens(content or "", model))
+    return content
+
+
+def cached_chat_completion_stream(
+    client,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    cache: Optional[LLMCache] = None,
+    stage: str = "other",
+    validate: Optional[Callable[[str], bool]] = None
+) -> Iterator[str]:
+    """
+    Stream a chat completion through the response cache.
+
+    Yields the content as it is generated. On a cache hit the whole cached
+    content is yielded at once; on a miss the full content is stored once
+    the stream has ended, if it is complete and passes validate (as in
+    cached_chat_completion).
+
+    Args:
+        client: OpenAI client used on a cache miss
+        model: Model name
+        messages: Chat messages
+        temperature: Sampling temperature
+        response_format: Optional response format (e.g., {"type": "json_object"})
+        cache: Cache to use (default: the shared process-wide cache)
+        stage: Pipeline stage the request's tokens are counted under
+        validate: Check a response must pass to be stored or served from the
+            cache (default: JSON responses must parse)
+    """
+    prompt_tokens = check_budget(messages, model)
+    cache = cache or get_default_cache()
+    key = cache.make_key(model, messages, temperature, response_format)
+    validate = _response_validator(response_format, validate)
+
+    content = _cached_content(cache, key, validate)
+    if content is not None:
+        get_token_ledger().record(stage, prompt_tokens, count_tokens(content, model), cached=True)
+        yield content
+        return
+
+    request = {"model": model, "messages": messages, "stream": True}
+    if temperature is not None:
+        request["temperature"] = temperature
+    if response_format is not None:
+        request["response_format"] = response_format
+
+    parts = []
+    finish_reason = None
+    for chunk in client.chat.completions.create(**request):
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+    content = "".join(parts)
+    if finish_reason == "stop" and (validate is None or validate(content)):
+        cache.put(key, content)
+    get_token_ledger().record(stage, prompt_tokens, count_tokens(content, model))
+
+
+def print_cache_stats(cache: Optional[LLMCache] = None) -> None:
+    """Print the cache counters of this run."""
+    stats = (cache or get_default_cache()).get_stats()
+    if stats["bypass"]:
+        print("LLM cache: bypassed")
+        return
+    print(
+        f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['bytes_saved']} bytes saved"
+    )
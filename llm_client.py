@@ -0,0 +1,361 @@
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from token_budget import count_message_tokens
+
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+# Completion tokens reserved for a request that does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+def estimate_request_tokens(
+    messages: List[Dict[str, Any]],
+    max_tokens: Optional[int] = None,
+    model: str = "gpt-4o"
+) -> int:
+    """Estimate the tokens a request counts against the tokens/min limit."""
+    return count_message_tokens(messages, model) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset duration such as "1s", "250ms" or "6m0s" into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}[unit]
+    return total if matched else None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a per-minute rate.
+
+    acquire() blocks until the bucket holds the requested amount (or is
+    full, for amounts larger than the bucket), then takes the whole amount.
+    The level can therefore go negative, in which case later callers wait
+    for the debt to be paid back; over time the rate is exactly per_minute.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize a TokenBucket instance.
+
+        Args:
+            per_minute: Refill rate, in units per minute
+            capacity: Largest burst (default: one second worth of units)
+        """
+        self.per_minute = per_minute
+        self.capacity = capacity if capacity is not None else max(1.0, per_minute / 60.0)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take amount units, waiting for them if needed.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                # An amount larger than the bucket could otherwise never go through
+                needed = min(amount, self.capacity)
+                if self.level >= needed:
+                    self.level -= amount
+                    return waited
+                delay = (needed - self.level) * 60.0 / self.per_minute
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take (negative) units after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, until: float) -> None:
+        """Empty the bucket so that it only has room again after `until` seconds."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, -until * self.per_minute / 60.0)
+
+    def set_rate(self, per_minute: float) -> None:
+        """Change the refill rate and capacity, keeping the current level."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.per_minute = per_minute
+            self.capacity = max(1.0, per_minute / 60.0)
+            self.level = min(self.level, self.capacity)
+
+    def __repr__(self) -> str:
+        return f"TokenBucket(per_minute={self.per_minute}, level={self.level:.1f})"
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to rate limiting (AIMD).
+
+    Each 429 halves the number of requests allowed in flight; each success
+    raises it by 1/limit, so it grows by about one per round of requests
+    until it reaches max_concurrency again.
+    """
+
+    def __init__(self, max_concurrency: int = 16, min_concurrency: int = 1):
+        """
+        Initialize an AdaptiveLimiter instance.
+
+        Args:
+            max_concurrency: Upper bound on requests in flight
+            min_concurrency: Lower bound the limit never goes under
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Wait for a free slot."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, rate_limited: bool = False) -> None:
+        """Free a slot and adapt the limit to the outcome of the request."""
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def __repr__(self) -> str:
+        return f"AdaptiveLimiter(limit={self.limit:.1f}, in_flight={self.in_flight})"
+
+
+class _Completions:
+    def __init__(self, owner: "RateLimitedClient"):
+        self._owner = owner
+
+    def create(self, **kwargs: Any) -> Any:
+        return self._owner.create_chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, owner: "RateLimitedClient"):
+        self.completions = _Completions(owner)
+
+
+class RateLimitedClient:
+    """
+    OpenAI client wrapper scheduling chat completions under rate limits.
+
+    Every chat completion goes through:
+      - a requests/min and a tokens/min token bucket, so bursts from the
+        thread pools do not exceed the account limits
+      - an adaptive concurrency limit, halved on each 429
+      - retries of 429s, 5xx and connection errors with jittered
+        exponential backoff, honoring retry-after when the server sends it
+
+    The limits are taken from the x-ratelimit-* response headers as soon as
+    the server reports them, so they do not need to be configured. Other
+    attributes (files, batches, ...) are passed through to the OpenAI client.
+
+    Example:
+        client = RateLimitedClient(requests_per_minute=500, tokens_per_minute=30000)
+        response = client.chat.completions.create(model="gpt-4o", messages=messages)
+    """
+
+    def __init__(
+        self,
+        client: Optional[OpenAI] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 16,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Initialize a RateLimitedClient instance.
+
+        Args:
+            client: OpenAI client to wrap (default: one built from the environment)
+            requests_per_minute: Requests/min limit (default: learned from headers)
+            tokens_per_minute: Tokens/min limit (default: learned from headers)
+            max_concurrency: Upper bound on requests in flight
+            max_retries: Retries of a failed request before giving up
+            base_delay: Backoff before the first retry, in seconds
+            max_delay: Upper bound on a single backoff, in seconds
+        """
+        # Retries are scheduled here, where they can be paced with the limits
+        self._client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.chat = _Chat(self)
+
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.seconds_waited = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay / 4)
+        # Full jitter: spread retries of concurrent requests over the whole window
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _update_limits(self, headers: Any) -> None:
+        """Adapt the buckets to the x-ratelimit-* headers of a response."""
+        for kind, attribute in (("requests", "request_bucket"), ("tokens", "token_bucket")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if not limit:
+                continue
+            limit = float(limit)
+            with self._lock:
+                bucket = getattr(self, attribute)
+                if bucket is None:
+                    setattr(self, attribute, TokenBucket(limit))
+                elif bucket.per_minute != limit:
+                    bucket.set_rate(limit)
+
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and float(remaining) <= 0 and reset:
+                # The server's window is used up: hold everyone until it resets
+                getattr(self, attribute).drain(reset)
+
+    def create_chat_completion(self, **kwargs: Any) -> Any:
+        """Create a chat completion within the rate limits, retrying transient errors."""
+        reserved = estimate_request_tokens(
+            kwargs.get("messages", []),
+            kwargs.get("max_tokens"),
+            kwargs.get("model", "gpt-4o")
+        )
+
+        attempt = 0
+        while True:
+            waited = 0.0
+            if self.request_bucket is not None:
+                waited += self.request_bucket.acquire(1)
+            if self.token_bucket is not None:
+                waited += self.token_bucket.acquire(reserved)
+
+            self.limiter.acquire()
+            rate_limited = False
+            try:
+                raw = self._client.chat.completions.with_raw_response.create(**kwargs)
+            except (APIStatusError, APIConnectionError, APITimeoutError) as e:
+                status = getattr(e, "status_code", None)
+                headers = e.response.headers if isinstance(e, APIStatusError) else {}
+                rate_limited = status == 429
+                if isinstance(e, APIStatusError) and status not in RETRYABLE_STATUS_CODES:
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+
+                self._update_limits(headers)
+                retry_after = _parse_duration(headers.get("retry-after-ms"))
+                retry_after = retry_after / 1000 if retry_after is not None else _parse_duration(headers.get("retry-after"))
+                delay = self._backoff(attempt, retry_after)
+                if rate_limited:
+                    for bucket in (self.request_bucket, self.token_bucket):
+                        if bucket is not None:
+                            bucket.drain(delay)
+                with self._lock:
+                    self.retries += 1
+                    self.rate_limited += rate_limited
+                    self.seconds_waited += waited + delay
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release(rate_limited)
+
+            self._update_limits(raw.headers)
+            response = raw.parse()
+            usage = getattr(response, "usage", None)
+            if self.token_bucket is not None and usage is not None:
+                # Settle the reservation against the tokens actually used
+                self.token_bucket.adjust(reserved - usage.total_tokens)
+            with self._lock:
+                self.requests += 1
+                self.seconds_waited += waited
+            return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the scheduling counters of this process."""
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "seconds_waited": self.seconds_waited,
+            "concurrency_limit": self.limiter.limit,
+            "requests_per_minute": self.request_bucket.per_minute if self.request_bucket else None,
+            "tokens_per_minute": self.token_bucket.per_minute if self.token_bucket else None
+        }
+
+    def __repr__(self) -> str:
+        return f"RateLimitedClient(requests={self.requests}, retries={self.retries}, limiter={self.limiter})"
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def get_client() -> RateLimitedClient:
+    """
+    Get the process-wide client shared by all modules.
+
+    Configured through the environment:
+        OPENAI_API_KEY / OPENAI_BASE_URL: read by the OpenAI client
+        OPENAI_MAX_RPM: requests/min limit (default: learned from headers)
+        OPENAI_MAX_TPM: tokens/min limit (default: learned from headers)
+        OPENAI_MAX_CONCURRENCY: upper bound on requests in flight (default: 16)
+        OPENAI_MAX_RETRIES: retries of a failed request (default: 6)
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = RateLimitedClient(
+                requests_per_minute=_env_number("OPENAI_MAX_RPM"),
+                tokens_per_minute=_env_number("OPENAI_MAX_TPM"),
+                max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", 16)),
+                max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 6))
+            )
+        return _default_client
@@ -0,0 +1,401 @@
+import ast
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from typing import Dict, Any, List, Callable, Optional
+
+
+STATE_FILE = ".pipeline_state.json"
+
+
+class Stage:
+    """
+    One step of the pipeline: a function turning input files into output files.
+
+    A stage depends on every stage that produces one of its inputs. Its
+    fingerprint covers the content of its inputs, the source of the modules
+    it runs and its parameters, so it only needs to run again when one of
+    those changes or an output is missing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[..., None],
+        inputs: List[str],
+        outputs: List[str],
+        modules: List[str],
+        params: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize a Stage instance.
+
+        Args:
+            name: Name of the stage
+            run: Function called with the stage's inputs, outputs and params
+            inputs: Files read by the stage
+            outputs: Files written by the stage
+            modules: Source files of the code the stage runs
+            params: Parameters passed to run, part of the fingerprint
+        """
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.modules = modules
+        self.params = params or {}
+
+    def fingerprint(self) -> str:
+        """Hash the stage's inputs, code and parameters."""
+        digest = hashlib.sha256()
+        digest.update(self.name.encode("utf-8"))
+        for path in self.inputs + self.modules:
+            digest.update(path.encode("utf-8"))
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        digest.update(json.dumps(self.params, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def __repr__(self) -> str:
+        return f"Stage(name={self.name}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+def local_modules(*entries: str) -> List[str]:
+    """
+    Find the source files a stage runs, from its entry modules' imports.
+
+    Args:
+        entries: Modules the stage calls into (e.g., text_to_structure.py)
+
+    Returns:
+        The entry modules and every module of the repository they import,
+        directly or not, sorted by path
+    """
+    found = set()
+    pending = list(entries)
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                # "from schema import registry" may import a submodule
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            else:
+                continue
+            for name in names:
+                module_path = os.path.join(*name.split(".")) + ".py"
+                if os.path.isfile(module_path):
+                    pending.append(module_path)
+    return sorted(found)
+
+
+def _run_topics(inputs: List[str], outputs: List[str], mode: str = "full") -> None:
+    from topic_extraction import extract_topics
+
+    topics = extract_topics(inputs[0], mode=mode)
+    with open(outputs[0], "w", encoding="utf-8") as f:
+        json.dump(topics, f, indent=2, ensure_ascii=False)
+
+
+def _run_structure(
+    inputs: List[str],
+    outputs: List[str],
+    max_workers: int = 4,
+    mode: str = "two_step",
+    classifier_threshold: Optional[float] = None,
+    sub_chunks: bool = False
+) -> None:
+    from text_to_structure import process_transcript_topics_file
+    from sub_chunking import DEFAULT_SUB_CHUNK_CHARS
+
+    process_transcript_topics_file(
+        inputs[0],
+        outputs[0],
+        max_workers=max_workers,
+        mode=mode,
+        classifier_threshold=classifier_threshold,
+        checkpoint=True,
+        sub_chunk_chars=DEFAULT_SUB_CHUNK_CHARS if sub_chunks else None
+    )
+
+
+def _run_filter(inputs: List[str], outputs: List[str]) -> None:
+    from filter_structure import filter_structured_data
+
+    filter_structured_data(inputs[0], outputs[0])
+
+
+def _run_summary(inputs: List[str], outputs: List[str], judge_by_topic: bool = False) -> None:
+    from summarize_podcast import (
+        summarize_from_structured_data, judge_summary, judge_summary_by_topic, save_summary_and_judgment
+    )
+
+    structured_file, transcript_file, topics_file = inputs
+    summary = summarize_from_structured_data(structured_file)
+    if judge_by_topic:
+        with open(topics_file, "r", encoding="utf-8") as f:
+            topics = json.load(f)
+        judgment = judge_summary_by_topic(summary, topics, summary_source="Structured Data")
+    else:
+        with open(transcript_file, "r", encoding="utf-8") as f:
+            full_transcript = f.read()
+        judgment = judge_summary(summary, full_transcript, summary_source="Structured Data")
+    save_summary_and_judgment(summary, judgment, output_dir=os.path.dirname(outputs[0]))
+
+
+def _run_regenerate(inputs: List[str], outputs: List[str], by_topic: bool = False) -> None:
+    from constructive import regenerate_from_structured_data, regenerate_by_topic, save_podcast
+
+    if by_topic:
+        new_podcast = regenerate_by_topic(inputs[0])
+    else:
+        new_podcast = regenerate_from_structured_data(inputs[0])
+    save_podcast(new_podcast, output_dir=os.path.dirname(outputs[0]))
+
+
+def build_stages(
+    transcript_file: str = "transcription.txt",
+    max_workers: int = 4,
+    judge_by_topic: bool = False,
+    regenerate_by_topic: bool = False,
+    sub_chunks: bool = False
+) -> List[Stage]:
+    """
+    Describe the podcast pipeline as stages.
+
+    Args:
+        transcript_file: Transcript the pipeline starts from
+        max_workers: Number of topics structured concurrently
+        judge_by_topic: Judge the summary section by section against the topic transcripts
+        regenerate_by_topic: Regenerate the podcast one topic per request, concurrently
+        sub_chunks: Structure long topics in sub-chunks extracted in parallel
+
+    Returns:
+        The stages, in an order compatible with their dependencies
+    """
+    topics_file = transcript_file.replace(".txt", "_topics.json")
+    structured_file = "structured_output_2.json"
+    final_file = "final_result.json"
+
+    return [
+        Stage(
+            "topics",
+            _run_topics,
+            inputs=[transcript_file],
+            outputs=[topics_file],
+            modules=local_modules("topic_extraction.py")
+        ),
+        Stage(
+            "structure",
+            # The number of workers does not change the output, so it is not
+            # one of the fingerprinted params
+            partial(_run_structure, max_workers=max_workers),
+            inputs=[topics_file],
+            outputs=[structured_file],
+            modules=local_modules("text_to_structure.py"),
+            params={"sub_chunks": True} if sub_chunks else None
+        ),
+        Stage(
+            "filter",
+            _run_filter,
+            inputs=[structured_file],
+            outputs=[final_file],
+            modules=local_modules("filter_structure.py")
+        ),
+        Stage(
+            "summary",
+            _run_summary,
+            inputs=[final_file, transcript_file, topics_file],
+            outputs=[
+                os.path.join("summaries", "summary_from_structured_data.txt"),
+                os.path.join("summaries", "judgment.json")
+            ],
+            modules=local_modules("summarize_podcast.py"),
+            params={"judge_by_topic": True} if judge_by_topic else None
+        ),
+        Stage(
+            "regenerate",
+            _run_regenerate,
+            inputs=[final_file],
+            outputs=[os.path.join("Regenerated_Podcasts", "regenerated_podcast.txt")],
+            modules=local_modules("constructive.py"),
+            params={"by_topic": True} if regenerate_by_topic else None
+        )
+    ]
+
+
+def _dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """Map each stage to the stages producing its inputs."""
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"'{output}' is produced by both {producers[output]} and {stage.name}")
+            producers[output] = stage.name
+
+    return {
+        stage.name: sorted({producers[path] for path in stage.inputs if path in producers})
+        for stage in stages
+    }
+
+
+def _load_state(state_file: str) -> Dict[str, str]:
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(state_file: str, state: Dict[str, str]) -> None:
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, state_file)
+
+
+def run_pipeline(
+    stages: List[Stage],
+    state_file: str = STATE_FILE,
+    force: bool = False,
+    max_parallel_stages: int = 2,
+    dry_run: bool = False
+) -> Dict[str, str]:
+    """
+    Run the stages as a DAG, skipping the ones that are up to date.
+
+    A stage starts as soon as all the stages it depends on have finished, so
+    independent stages (e.g., summary and regenerate) run concurrently. A
+    stage is skipped when its fingerprint matches the one recorded after its
+    last successful run and all its outputs exist.
+
+    Args:
+        stages: Stages of the pipeline
+        state_file: File recording the fingerprint of each completed stage
+        force: If True, run every stage even if it is up to date
+        max_parallel_stages: Maximum number of stages running at once
+        dry_run: If True, only report which stages would run
+
+    Returns:
+        Status of each stage: "up to date", "done", "would run", "failed" or "blocked"
+    """
+    dependencies = _dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    state = _load_state(state_file)
+    state_lock = threading.Lock()
+    status = {}
+
+    def is_up_to_date(stage: Stage) -> bool:
+        if force or not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        # Inputs may not exist yet when an upstream stage will produce them
+        if not all(os.path.exists(path) for path in stage.inputs):
+            return False
+        return state.get(stage.name) == stage.fingerprint()
+
+    def execute(stage: Stage) -> None:
+        print(f"\n[PIPELINE] Running stage '{stage.name}'...")
+        start = time.perf_counter()
+        for path in stage.outputs:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        stage.run(stage.inputs, stage.outputs, **stage.params)
+        with state_lock:
+            state[stage.name] = stage.fingerprint()
+            _save_state(state_file, state)
+        print(f"[PIPELINE] ✓ Stage '{stage.name}' done in {time.perf_counter() - start:.1f}s")
+
+    pending = {stage.name for stage in stages}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_stages)) as executor:
+        while pending or running:
+            for name in sorted(pending):
+                deps = dependencies[name]
+                if any(status.get(dep) in ("failed", "blocked") for dep in deps):
+                    status[name] = "blocked"
+                    pending.discard(name)
+                    continue
+                if not all(status.get(dep) in ("up to date", "done", "would run") for dep in deps):
+                    continue
+
+                pending.discard(name)
+                stage = by_name[name]
+                # Fingerprints cover input contents, so a rerun upstream stage
+                # that produced identical outputs does not invalidate this one
+                upstream_pending = any(status[dep] == "would run" for dep in deps)
+                if not upstream_pending and is_up_to_date(stage):
+                    status[name] = "up to date"
+                    print(f"[PIPELINE] Stage '{name}' is up to date, skipping")
+                elif dry_run:
+                    status[name] = "would run"
+                    print(f"[PIPELINE] Stage '{name}' would run")
+                else:
+                    running[executor.submit(execute, stage)] = name
+
+            if not running:
+                if pending and not any(
+                    all(status.get(dep) for dep in dependencies[name]) for name in pending
+                ):
+                    raise ValueError(f"Cycle between stages: {sorted(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    status[name] = "done"
+                except BaseException as e:
+                    # The stage modules call sys.exit on errors
+                    print(f"[PIPELINE] ✗ Stage '{name}' failed: {e!r}")
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                    status[name] = "failed"
+
+    return status
+
+
+def main():
+    """Main function for command-line usage."""
+    force = "--force" in sys.argv
+    dry_run = "--dry-run" in sys.argv
+    judge_by_topic = "--judge-by-topic" in sys.argv
+    regenerate_by_topic = "--regenerate-by-topic" in sys.argv
+    sub_chunks = "--sub-chunks" in sys.argv
+    args = [arg for arg in sys.argv if not arg.startswith("--")]
+
+    transcript_file = args[1] if len(args) > 1 else "transcription.txt"
+    max_workers = int(args[2]) if len(args) > 2 else 4
+
+    print("=" * 80)
+    print(f"PODCAST PIPELINE ({transcript_file})")
+    print("=" * 80)
+
+    status = run_pipeline(build_stages(transcript_file, max_workers, judge_by_topic, regenerate_by_topic, sub_chunks), force=force, dry_run=dry_run)
+
+    print("\n" + "=" * 80)
+    print("PIPELINE SUMMARY")
+    print("=" * 80)
+    for name, stage_status in status.items():
+        print(f"  - {name}: {stage_status}")
+    print("=" * 80)
+
+    if any(stage_status in ("failed", "blocked") for stage_status in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import os
+from typing import Dict, Any, List, Callable, Optional, Tuple, Union
+from graph_model import LAYOUTS
+
+
+def _typed(fields: Tuple[str, ...]) -> List[str]:
+    # Same fields with the element type after the id
+    return [fields[0], "type", *fields[1:]]
+
+
+# Built-in projections. A spec has up to five keys:
+#   topic, nodes, connections: {"include": [fields]} (in that order) or
+#       {"exclude": [fields]} (all other fields, in file order); nodes and
+#       connections may be None to drop them. A topic's "nodes" and
+#       "connections" fields are projected with the nodes / connections specs.
+#   truncate: {field: max_chars}, applied to string fields at every level
+#   defaults: if True, missing or null included fields are written as ""
+#       (or [] for nodes and connections)
+# The node and connection fields of "filtered" and "typed" come from
+# graph_model.LAYOUTS, so that both write final_result.json the same way.
+PRESETS = {
+    # final_result.json, as written by filter_structure
+    "filtered": {
+        "topic": {"include": ["title", "nodes", "connections"]},
+        "nodes": {"include": list(LAYOUTS["filtered"]["nodes"])},
+        "connections": {"include": list(LAYOUTS["filtered"]["connections"])},
+        "defaults": True
+    },
+    # filtered, with node and connection types
+    "typed": {
+        "topic": {"include": ["title", "schema_type", "nodes", "connections"]},
+        "nodes": {"include": _typed(LAYOUTS["filtered"]["nodes"])},
+        "connections": {"include": _typed(LAYOUTS["filtered"]["connections"])},
+        "defaults": True
+    },
+    # Everything but the transcript, with long text cut (e.g., for prompts)
+    "compact": {
+        "topic": {"exclude": ["original_transcript"]},
+        "truncate": {"content": 300, "text_reference": 200}
+    }
+}
+
+_SPEC_KEYS = {"topic", "nodes", "connections", "truncate", "defaults"}
+_TRUNCATION_MARK = "..."
+
+
+def _compile_fields(
+    level: str,
+    spec: Dict[str, Any],
+    truncate: Dict[str, int],
+    defaults: bool,
+    children: Optional[Dict[str, Callable[[List[Any]], List[Any]]]] = None
+) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Build the function projecting one object (topic, node or connection)."""
+    if not isinstance(spec, dict) or ("include" in spec) == ("exclude" in spec):
+        raise ValueError(f"projection of {level} needs exactly one of 'include' or 'exclude'")
+    children = children or {}
+
+    def transform(field: str) -> Optional[Callable[[Any], Any]]:
+        if field in children:
+            return children[field]
+        if field in truncate:
+            limit = truncate[field]
+            return lambda value: (
+                value[:limit] + _TRUNCATION_MARK
+                if isinstance(value, str) and len(value) > limit else value
+            )
+        return None
+
+    if "include" in spec:
+        # (field, transform) pairs resolved once, in output order
+        fields = tuple((field, transform(field)) for field in spec["include"])
+        plain = all(function is None for _, function in fields)
+
+        if plain and defaults:
+            def project(item: Dict[str, Any]) -> Dict[str, Any]:
+                return {field: "" if item.get(field) is None else item[field] for field, _ in fields}
+        elif plain:
+            def project(item: Dict[str, Any]) -> Dict[str, Any]:
+                return {field: item[field] for field, _ in fields if item.get(field) is not None}
+        else:
+            def project(item: Dict[str, Any]) -> Dict[str, Any]:
+                result = {}
+                for field, function in fields:
+                    value = item.get(field)
+                    if value is None:
+                        if defaults:
+                            # Child lists (nodes, connections) default to an empty list
+                            result[field] = [] if field in children else ""
+                        continue
+                    result[field] = function(value) if function is not None else value
+                return result
+        return project
+
+    excluded = frozenset(spec["exclude"])
+    transforms = {field: function for field in set(truncate) | set(children) if (function := transform(field))}
+
+    def project(item: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for field, value in item.items():
+            if field in excluded:
+                continue
+            function = transforms.get(field)
+            result[field] = function(value) if function is not None and value is not None else value
+        return result
+    return project
+
+
+class Projection:
+    """
+    A view of structured output topics, compiled from a declarative spec.
+
+    The spec (see PRESETS) is checked and turned into nested extractor
+    functions once; project() then only runs those functions, so a
+    projection can be applied to every topic of a large file cheaply.
+    """
+
+    __slots__ = ("name", "spec", "_project")
+
+    def __init__(self, spec: Dict[str, Any], name: str = "custom"):
+        """
+        Initialize a Projection instance.
+
+        Args:
+            spec: Projection spec (see PRESETS)
+            name: Name of the projection, for messages
+
+        Raises:
+            ValueError: If the spec is not valid
+        """
+        unknown = set(spec) - _SPEC_KEYS
+        if unknown:
+            raise ValueError(f"unknown projection keys: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.spec = spec
+        truncate = spec.get("truncate") or {}
+        defaults = bool(spec.get("defaults", False))
+
+        children = {}
+        for kind in ("nodes", "connections"):
+            kind_spec = spec.get(kind, {"exclude": []})
+            if kind_spec is None:
+                children[kind] = None
+                continue
+            project_item = _compile_fields(kind, kind_spec, truncate, defaults)
+            children[kind] = lambda items, project_item=project_item: [
+                project_item(item) for item in items if isinstance(item, dict)
+            ]
+
+        topic_spec = dict(spec.get("topic", {"exclude": []}))
+        # Dropped nodes / connections are left out of the topic too
+        dropped = [kind for kind, function in children.items() if function is None]
+        if dropped:
+            if "include" in topic_spec:
+                topic_spec["include"] = [field for field in topic_spec["include"] if field not in dropped]
+            else:
+                topic_spec["exclude"] = list(topic_spec["exclude"]) + dropped
+        self._project = _compile_fields(
+            "topic",
+            topic_spec,
+            truncate,
+            defaults,
+            {kind: function for kind, function in children.items() if function is not None}
+        )
+
+    @classmethod
+    def load(cls, spec: Union[str, Dict[str, Any]]) -> "Projection":
+        """
+        Get a projection from a preset name, a JSON spec file, or a spec.
+
+        Raises:
+            ValueError: If the name is neither a preset nor a file, or the spec is not valid
+        """
+        if isinstance(spec, dict):
+            return cls(spec)
+        if spec in PRESETS:
+            return cls(PRESETS[spec], spec)
+        if os.path.isfile(spec):
+            with open(spec, "r", encoding="utf-8") as f:
+                return cls(json.load(f), os.path.basename(spec))
+        raise ValueError(f"'{spec}' is neither a projection preset ({', '.join(PRESETS)}) nor a spec file")
+
+    def project(self, topic_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Project one topic entry of a structured output file."""
+        return self._project(topic_data)
+
+    def __repr__(self) -> str:
+        return f"Projection(name={self.name})"
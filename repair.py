@@ -0,0 +1,272 @@
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from schema.schema_type import SchemaType
+from llm_cache import cached_chat_completion
+from llm_client import get_client
+from stream_json import iter_array_items
+from graph_validator import validate_structure
+
+
+# Follow-up rounds before giving up on a response
+DEFAULT_REPAIR_ROUNDS = 2
+
+
+def parse_structure(content: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Parse a structure response, recovering what can be recovered from invalid JSON.
+
+    Returns:
+        (structure, error): the parsed structure and None, or, when the
+        response is not valid JSON (e.g., cut off), the nodes and connections
+        that were complete and a description of the problem
+    """
+    try:
+        structure = json.loads(content)
+        if isinstance(structure, dict):
+            return structure, None
+        error = "the response is not a JSON object"
+    except json.JSONDecodeError as e:
+        error = f"the response is not valid JSON ({e})"
+
+    structure = {"nodes": [], "connections": []}
+    for kind, item in iter_array_items([content]):
+        structure[kind].append(item)
+    ids = [item.get("id") for item in structure["nodes"] + structure["connections"]]
+    if ids:
+        error += f"; it was read up to {ids[-1]}"
+    return structure, error
+
+
+def structure_violations(structure: Dict[str, Any], schema_type: Optional[SchemaType] = None) -> List[Dict[str, Any]]:
+    """
+    List the violations of a structure that must be repaired.
+
+    Only errors are reported (dangling connections, illegal or unknown types,
+    duplicate ids); warnings such as unexpected node pairs are not worth a request.
+    """
+    result = dict(structure)
+    if schema_type is not None:
+        result["schema_type"] = schema_type.value
+    return [violation for violation in validate_structure(result) if violation["severity"] == "error"]
+
+
+def structure_problems(structure: Dict[str, Any], schema_type: Optional[SchemaType] = None) -> List[str]:
+    """Describe the violations of a structure that must be repaired (see structure_violations)."""
+    return [violation["message"] for violation in structure_violations(structure, schema_type)]
+
+
+def repair_prompt(
+    problems: List[str],
+    structure: Optional[Dict[str, Any]] = None,
+    violations: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """
+    Create the request asking for corrections only.
+
+    Instead of the whole response, only the elements with problems and the
+    ids (and types) of the nodes are sent, which is what a fix refers to.
+
+    Args:
+        problems: Descriptions of the problems
+        structure: Structure the problems were found in
+        violations: Violations of the structure (their ids select the elements sent)
+    """
+    problem_lines = "\n".join(f"- {problem}" for problem in problems)
+    context = ""
+    if structure is not None:
+        failing = {violation["id"] for violation in violations or [] if violation.get("id") is not None}
+        elements = [
+            json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+            for item in structure.get("nodes", []) + structure.get("connections", [])
+            if isinstance(item, dict) and item.get("id") in failing
+        ]
+        node_ids = ", ".join(
+            f"{node.get('id')} ({node.get('type')})" if node.get("type") else str(node.get("id"))
+            for node in structure.get("nodes", [])
+            if isinstance(node, dict)
+        )
+        element_lines = "\n".join(elements)
+        context = f"""
+Elements with problems:
+{element_lines}
+
+Nodes of the structure: {node_ids or "none"}
+"""
+    prompt = f"""A structure you extracted has the following problems:
+{problem_lines}
+{context}
+Fix only these problems. A connection may only refer to the nodes listed above. Do not repeat the nodes and connections that are correct.
+Return a JSON object with:
+{{
+    "nodes": [nodes to add or replace (matched by id), with the same fields as before],
+    "connections": [connections to add or replace (matched by id), with the same fields as before],
+    "remove": [ids of nodes or connections to delete]
+}}
+"""
+    return prompt
+
+
+def apply_patch(structure: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply a repair response to a structure.
+
+    Nodes and connections of the patch replace those with the same id, or are
+    appended; ids listed in "remove" are deleted, along with the connections
+    of removed nodes.
+    """
+    remove = set(item for item in patch.get("remove") or [] if isinstance(item, str))
+    patched = dict(structure)
+    for kind in ("nodes", "connections"):
+        replacements = {
+            item.get("id"): item
+            for item in patch.get(kind) or []
+            if isinstance(item, dict)
+        }
+        items = []
+        for item in structure.get(kind, []):
+            item_id = item.get("id") if isinstance(item, dict) else None
+            if item_id in remove:
+                continue
+            items.append(replacements.pop(item_id, item))
+        items.extend(replacements.values())
+        patched[kind] = items
+
+    if remove:
+        patched["connections"] = [
+            conn for conn in patched["connections"]
+            if not isinstance(conn, dict)
+            or (conn.get("source_node_id") not in remove and conn.get("target_node_id") not in remove)
+        ]
+    return patched
+
+
+def repair_messages(
+    messages: List[Dict[str, str]],
+    structure: Dict[str, Any],
+    error: Optional[str],
+    violations: List[Dict[str, Any]]
+) -> List[Dict[str, str]]:
+    """
+    Build a standalone repair request.
+
+    The system prompt (schema rules) is kept, but neither the original
+    request nor the faulty response is sent again: only the problems and
+    the elements they concern. A response that could not be parsed needs
+    the transcript to be completed, so then the original request is sent
+    once more, with the ids already read instead of the response.
+    """
+    problems = ([error] if error else []) + [violation["message"] for violation in violations]
+    system = [message for message in messages if message.get("role") == "system"]
+    prompt = repair_prompt(problems, structure, violations)
+    if error:
+        original = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        prompt = f"""{original}
+
+---
+
+{prompt}"""
+    return system + [{"role": "user", "content": prompt}]
+
+
+def repair_structure(
+    messages: List[Dict[str, str]],
+    content: str,
+    schema_type: Optional[SchemaType] = None,
+    max_rounds: int = DEFAULT_REPAIR_ROUNDS
+) -> Dict[str, Any]:
+    """
+    Validate a structure response and repair it with minimal follow-ups.
+
+    Instead of extracting the structure again, each round sends the problems
+    found (e.g., "connection conn_5 refers to missing node(s) node_12") with
+    the elements concerned, and asks for the corrected nodes and connections
+    only, which are patched into the response (see repair_messages).
+
+    Args:
+        messages: Conversation that produced the response
+        content: Raw response
+        schema_type: Schema the structure must follow
+        max_rounds: Follow-ups to send before returning the structure as is
+
+    Returns:
+        Dictionary with topic, nodes and connections
+    """
+    structure, error = parse_structure(content)
+    violations = structure_violations(structure, schema_type)
+
+    for round_number in range(1, max_rounds + 1):
+        problems = ([error] if error else []) + [violation["message"] for violation in violations]
+        if not problems:
+            break
+        print(f"Repairing structure (round {round_number}): {'; '.join(problems[:3])}"
+              f"{f' (+{len(problems) - 3} more)' if len(problems) > 3 else ''}")
+        content = cached_chat_completion(
+            get_client(),
+            model="gpt-4o",
+            messages=repair_messages(messages, structure, error, violations),
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            stage="repair"
+        )
+        patch, error = parse_structure(content)
+        structure = apply_patch(structure, patch)
+        violations = structure_violations(structure, schema_type)
+
+    problems = ([error] if error else []) + [violation["message"] for violation in violations]
+    if problems:
+        print(f"Warning: {len(problems)} problems left after repair ({'; '.join(problems[:3])})")
+    return structure
+
+
+def schema_selection_problem(selection_content: str) -> Optional[str]:
+    """Describe what is wrong with a step 1 response, or None if it is usable."""
+    try:
+        selected_schema = json.loads(selection_content).get("selected_schema")
+    except (json.JSONDecodeError, AttributeError) as e:
+        return f"The response is not a valid JSON object ({e})."
+    try:
+        SchemaType(selected_schema)
+    except ValueError:
+        return f"'{selected_schema}' is not one of the schema types."
+    return None
+
+
+def repair_schema_selection(
+    messages: List[Dict[str, str]],
+    selection_content: str,
+    max_rounds: int = DEFAULT_REPAIR_ROUNDS
+) -> str:
+    """
+    Make sure a step 1 response names a known schema, asking again if not.
+
+    Args:
+        messages: Conversation that produced the response
+        selection_content: Raw response
+        max_rounds: Follow-ups to send before returning the response as is
+
+    Returns:
+        The first usable response (the last one if none is)
+    """
+    conversation = list(messages)
+    for round_number in range(1, max_rounds + 1):
+        problem = schema_selection_problem(selection_content)
+        if problem is None:
+            break
+        print(f"Repairing schema selection (round {round_number}): {problem}")
+        schema_values = ", ".join(schema_type.value for schema_type in SchemaType)
+        conversation += [
+            {"role": "assistant", "content": selection_content},
+            {
+                "role": "user",
+                "content": f"""{problem} Return the same JSON object with "selected_schema" set to one of: {schema_values}."""
+            }
+        ]
+        selection_content = cached_chat_completion(
+            get_client(),
+            model="gpt-4o",
+            messages=conversation,
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            stage="repair"
+        )
+    return selection_content
@@ -200,6 +200,98 @@ class ConnectionTypeDefinition:
         }
     }
     
+    # Examples of allowed (source, target) node type pairs for each connection type
+    ALLOWED_NODE_PAIRS = {
+        ConnectionType.ACTION_RELATION: [
+            ("CHARACTER", "OBJECT"),
+            ("CHARACTER", "LOCATION"),
+            ("GROUP", "OBJECT")
+        ],
+        ConnectionType.SPATIAL_RELATION: [
+            ("CHARACTER", "LOCATION"),
+            ("OBJECT", "LOCATION"),
+            ("GROUP", "LOCATION")
+        ],
+        ConnectionType.TEMPORAL_RELATION: [
+            ("CHARACTER", "CHARACTER"),  # Character's actions over time
+            ("OBJECT", "OBJECT")   # Object states over time
+        ],
+        ConnectionType.HAS: [
+            ("SUBJECT", "ATTRIBUTE"),
+            ("SUBJECT", "FEATURE"),
+            ("SUBJECT", "DETAILS")
+        ],
+        ConnectionType.IS: [
+            ("SUBJECT", "FEATURE"),
+            ("SUBJECT", "ATTRIBUTE")
+        ],
+        ConnectionType.CONCEPT_TO_CONCEPT: [
+            ("CONCEPT", "CONCEPT")
+        ],
+        ConnectionType.IS_DEFINITION: [
+            ("CONCEPT", "DEFINITION")
+        ],
+        ConnectionType.IS_EXAMPLE: [
+            ("CONCEPT", "EXAMPLE"),
+            ("FACT", "EXAMPLE")
+        ],
+        ConnectionType.IS_EXPLANATION: [
+            ("CONCEPT", "EXPLANATION"),
+            ("FACT", "EXPLANATION")
+        ],
+        ConnectionType.SEQUENTIAL_RELATION: [
+            ("STEP", "STEP"),
+            ("ACTION", "ACTION")
+        ],
+        ConnectionType.CONDITIONAL_RELATION: [
+            ("ACTION", "CONDITION"),
+            ("STEP", "CONDITION"),
+            ("ACTION", "TOOL")
+        ],
+        ConnectionType.SUPPORTING_RELATION: [
+            ("EVIDENCE", "CLAIM"),
+            ("ARGUMENT", "CLAIM"),
+            ("FACT", "CLAIM")
+        ],
+        ConnectionType.COUNTER_SUPPORTING_RELATION: [
+            ("COUNTER_ARGUMENT", "CLAIM"),
+            ("EVIDENCE", "CLAIM")
+        ],
+        ConnectionType.CONCLUSION_RELATION: [
+            ("ARGUMENT", "CONCLUSION"),
+            ("EVIDENCE", "CONCLUSION"),
+            ("CLAIM", "CONCLUSION")
+        ]
+    }
+    
+    # Connection types of each schema category
+    CONNECTION_TYPES_BY_CATEGORY = {
+        "narrative": [
+            ConnectionType.ACTION_RELATION.value,
+            ConnectionType.SPATIAL_RELATION.value,
+            ConnectionType.TEMPORAL_RELATION.value
+        ],
+        "descriptive": [
+            ConnectionType.HAS.value,
+            ConnectionType.IS.value
+        ],
+        "informative": [
+            ConnectionType.CONCEPT_TO_CONCEPT.value,
+            ConnectionType.IS_DEFINITION.value,
+            ConnectionType.IS_EXAMPLE.value,
+            ConnectionType.IS_EXPLANATION.value
+        ],
+        "instructional": [
+            ConnectionType.SEQUENTIAL_RELATION.value,
+            ConnectionType.CONDITIONAL_RELATION.value
+        ],
+        "argumentative": [
+            ConnectionType.SUPPORTING_RELATION.value,
+            ConnectionType.COUNTER_SUPPORTING_RELATION.value,
+            ConnectionType.CONCLUSION_RELATION.value
+        ]
+    }
+    
     @classmethod
     def get_definition(cls, connection_type: ConnectionType) -> Dict[str, Any]:
         """Get the complete definition for a connection type."""
@@ -221,32 +313,7 @@ class ConnectionTypeDefinition:
     @classmethod
     def get_connection_types_by_category(cls) -> Dict[str, List[str]]:
         """Get connection types organized by schema category."""
-        return {
-            "narrative": [
-                ConnectionType.ACTION_RELATION.value,
-                ConnectionType.SPATIAL_RELATION.value,
-                ConnectionType.TEMPORAL_RELATION.value
-            ],
-            "descriptive": [
-                ConnectionType.HAS.value,
-                ConnectionType.IS.value
-            ],
-            "informative": [
-                ConnectionType.CONCEPT_TO_CONCEPT.value,
-                ConnectionType.IS_DEFINITION.value,
-                ConnectionType.IS_EXAMPLE.value,
-                ConnectionType.IS_EXPLANATION.value
-            ],
-            "instructional": [
-                ConnectionType.SEQUENTIAL_RELATION.value,
-                ConnectionType.CONDITIONAL_RELATION.value
-            ],
-            "argumentative": [
-                ConnectionType.SUPPORTING_RELATION.value,
-                ConnectionType.COUNTER_SUPPORTING_RELATION.value,
-                ConnectionType.CONCLUSION_RELATION.value
-            ]
-        }
+        return {category: list(types) for category, types in cls.CONNECTION_TYPES_BY_CATEGORY.items()}
     
     @classmethod
     def get_directionality(cls, connection_type: ConnectionType) -> str:
@@ -267,67 +334,4 @@ class ConnectionTypeDefinition:
         Get examples of allowed node type pairs for a connection type.
         This helps validate graph construction.
         """
-        pairs = {
-            ConnectionType.ACTION_RELATION: [
-                ("CHARACTER", "OBJECT"),
-                ("CHARACTER", "LOCATION"),
-                ("GROUP", "OBJECT")
-            ],
-            ConnectionType.SPATIAL_RELATION: [
-                ("CHARACTER", "LOCATION"),
-                ("OBJECT", "LOCATION"),
-                ("GROUP", "LOCATION")
-            ],
-            ConnectionType.TEMPORAL_RELATION: [
-                ("CHARACTER", "CHARACTER"),  # Character's actions over time
-                ("OBJECT", "OBJECT")   # Object states over time
-            ],
-            ConnectionType.HAS: [
-                ("SUBJECT", "ATTRIBUTE"),
-                ("SUBJECT", "FEATURE"),
-                ("SUBJECT", "DETAILS")
-            ],
-            ConnectionType.IS: [
-                ("SUBJECT", "FEATURE"),
-                ("SUBJECT", "ATTRIBUTE")
-            ],
-            ConnectionType.CONCEPT_TO_CONCEPT: [
-                ("CONCEPT", "CONCEPT")
-            ],
-            ConnectionType.IS_DEFINITION: [
-                ("CONCEPT", "DEFINITION")
-            ],
-            ConnectionType.IS_EXAMPLE: [
-                ("CONCEPT", "EXAMPLE"),
-                ("FACT", "EXAMPLE")
-            ],
-            ConnectionType.IS_EXPLANATION: [
-                ("CONCEPT", "EXPLANATION"),
-                ("FACT", "EXPLANATION")
-            ],
-            ConnectionType.SEQUENTIAL_RELATION: [
-                ("STEP", "STEP"),
-                ("ACTION", "ACTION")
-            ],
-            ConnectionType.CONDITIONAL_RELATION: [
-                ("ACTION", "CONDITION"),
-                ("STEP", "CONDITION"),
-                ("ACTION", "TOOL")
-            ],
-            ConnectionType.SUPPORTING_RELATION: [
-                ("EVIDENCE", "CLAIM"),
-                ("ARGUMENT", "CLAIM"),
-                ("FACT", "CLAIM")
-            ],
-            ConnectionType.COUNTER_SUPPORTING_RELATION: [
-                ("COUNTER_ARGUMENT", "CLAIM"),
-                ("EVIDENCE", "CLAIM")
-            ],
-            ConnectionType.CONCLUSION_RELATION: [
-                ("ARGUMENT", "CONCLUSION"),
-                ("EVIDENCE", "CONCLUSION"),
-                ("CLAIM", "CONCLUSION")
-            ]
-        }
-        return pairs.get(connection_type, [])
-
+        return list(cls.ALLOWED_NODE_PAIRS.get(connection_type, []))
@@ -295,6 +295,44 @@ class NodeTypeDefinition:
         }
     }
     
+    # Node types of each schema category
+    NODE_TYPES_BY_CATEGORY = {
+        "narrative": [
+            NodeType.CHARACTER.value,
+            NodeType.LOCATION.value,
+            NodeType.OBJECT.value,
+            NodeType.GROUP.value
+        ],
+        "descriptive": [
+            NodeType.SUBJECT.value,
+            NodeType.ATTRIBUTE.value,
+            NodeType.FEATURE.value,
+            NodeType.DETAILS.value
+        ],
+        "informative": [
+            NodeType.CONCEPT.value,
+            NodeType.FACT.value,
+            NodeType.DEFINITION.value,
+            NodeType.EXAMPLE.value,
+            NodeType.EXPLANATION.value
+        ],
+        "instructional": [
+            NodeType.STEP.value,
+            NodeType.ACTION.value,
+            NodeType.TOOL.value,
+            NodeType.CONDITION.value,
+            NodeType.WARNING.value,
+            NodeType.GOAL.value
+        ],
+        "argumentative": [
+            NodeType.CLAIM.value,
+            NodeType.ARGUMENT.value,
+            NodeType.COUNTER_ARGUMENT.value,
+            NodeType.EVIDENCE.value,
+            NodeType.CONCLUSION.value
+        ]
+    }
+    
     @classmethod
     def get_definition(cls, node_type: NodeType) -> Dict[str, Any]:
         """Get the complete definition for a node type."""
@@ -315,40 +353,5 @@ class NodeTypeDefinition:
     @classmethod
     def get_node_types_by_category(cls) -> Dict[str, List[str]]:
         """Get node types organized by schema category."""
-        return {
-            "narrative": [
-                NodeType.CHARACTER.value,
-                NodeType.LOCATION.value,
-                NodeType.OBJECT.value,
-                NodeType.GROUP.value
-            ],
-            "descriptive": [
-                NodeType.SUBJECT.value,
-                NodeType.ATTRIBUTE.value,
-                NodeType.FEATURE.value,
-                NodeType.DETAILS.value
-            ],
-            "informative": [
-                NodeType.CONCEPT.value,
-                NodeType.FACT.value,
-                NodeType.DEFINITION.value,
-                NodeType.EXAMPLE.value,
-                NodeType.EXPLANATION.value
-            ],
-            "instructional": [
-                NodeType.STEP.value,
-                NodeType.ACTION.value,
-                NodeType.TOOL.value,
-                NodeType.CONDITION.value,
-                NodeType.WARNING.value,
-                NodeType.GOAL.value
-            ],
-            "argumentative": [
-                NodeType.CLAIM.value,
-                NodeType.ARGUMENT.value,
-                NodeType.COUNTER_ARGUMENT.value,
-                NodeType.EVIDENCE.value,
-                NodeType.CONCLUSION.value
-            ]
-        }
+        return {category: list(types) for category, types in cls.NODE_TYPES_BY_CATEGORY.items()}
 
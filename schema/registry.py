@@ -0,0 +1,146 @@
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Tuple, Union
+from schema.schema_type import Schema, SchemaType
+from schema.nodes_type import NodeType, NodeTypeDefinition
+from schema.connections_type import ConnectionType, ConnectionTypeDefinition
+
+
+def _schema_key(schema_type: Union[SchemaType, str]) -> str:
+    return schema_type.value if isinstance(schema_type, SchemaType) else schema_type
+
+
+def _freeze(table: Dict) -> Mapping:
+    return MappingProxyType(table)
+
+
+class SchemaRegistry:
+    """
+    Read-only lookup tables compiled from Schema, NodeTypeDefinition and ConnectionTypeDefinition.
+
+    The registry classes build lists and dicts on every call; the tables here
+    are built once (see get_registry) and every lookup is a dict access or a
+    frozenset membership test. Schemas are keyed by their value (e.g.,
+    "narrative"), node and connection types by their name (e.g., "CHARACTER").
+    """
+
+    __slots__ = (
+        "node_types", "connection_types",
+        "node_types_by_schema", "connection_types_by_schema",
+        "node_type_sets", "connection_type_sets",
+        "schemas_by_node_type", "schemas_by_connection_type",
+        "node_pairs", "legal_triples",
+        "node_descriptions", "connection_descriptions",
+        "_frozen"
+    )
+
+    def __init__(self):
+        """Compile the tables from the schema classes."""
+        self.node_types: Tuple[str, ...] = tuple(node_type.value for node_type in NodeType)
+        self.connection_types: Tuple[str, ...] = tuple(conn_type.value for conn_type in ConnectionType)
+
+        # Allowed types of each schema, in registry order (for prompts) and as sets (for checks)
+        self.node_types_by_schema: Mapping[str, Tuple[str, ...]] = _freeze({
+            schema_type.value: tuple(Schema.ALLOWED_NODE_TYPES[schema_type]) for schema_type in SchemaType
+        })
+        self.connection_types_by_schema: Mapping[str, Tuple[str, ...]] = _freeze({
+            schema_type.value: tuple(Schema.ALLOWED_CONNECTION_TYPES[schema_type]) for schema_type in SchemaType
+        })
+        self.node_type_sets: Mapping[str, FrozenSet[str]] = _freeze({
+            schema: frozenset(types) for schema, types in self.node_types_by_schema.items()
+        })
+        self.connection_type_sets: Mapping[str, FrozenSet[str]] = _freeze({
+            schema: frozenset(types) for schema, types in self.connection_types_by_schema.items()
+        })
+
+        # Reverse maps: schemas in which each type is allowed
+        schemas_by_node_type = {node_type: [] for node_type in self.node_types}
+        for schema, types in self.node_types_by_schema.items():
+            for node_type in types:
+                schemas_by_node_type.setdefault(node_type, []).append(schema)
+        self.schemas_by_node_type: Mapping[str, Tuple[str, ...]] = _freeze({
+            node_type: tuple(schemas) for node_type, schemas in schemas_by_node_type.items()
+        })
+        schemas_by_connection_type = {conn_type: [] for conn_type in self.connection_types}
+        for schema, types in self.connection_types_by_schema.items():
+            for conn_type in types:
+                schemas_by_connection_type.setdefault(conn_type, []).append(schema)
+        self.schemas_by_connection_type: Mapping[str, Tuple[str, ...]] = _freeze({
+            conn_type: tuple(schemas) for conn_type, schemas in schemas_by_connection_type.items()
+        })
+
+        # (source type, target type) pairs of each connection type, and the
+        # (source type, target type, connection type) triples they allow
+        self.node_pairs: Mapping[str, FrozenSet[Tuple[str, str]]] = _freeze({
+            conn_type.value: frozenset(ConnectionTypeDefinition.ALLOWED_NODE_PAIRS.get(conn_type, ()))
+            for conn_type in ConnectionType
+        })
+        self.legal_triples: FrozenSet[Tuple[str, str, str]] = frozenset(
+            (source, target, conn_type)
+            for conn_type, pairs in self.node_pairs.items()
+            for source, target in pairs
+        )
+
+        self.node_descriptions: Mapping[str, str] = _freeze({
+            node_type.value: NodeTypeDefinition.get_definition(node_type)["description"]
+            for node_type in NodeType
+        })
+        self.connection_descriptions: Mapping[str, str] = _freeze({
+            conn_type.value: ConnectionTypeDefinition.get_definition(conn_type)["description"]
+            for conn_type in ConnectionType
+        })
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("SchemaRegistry is read-only")
+        object.__setattr__(self, name, value)
+
+    def allowed_node_types(self, schema_type: Union[SchemaType, str]) -> FrozenSet[str]:
+        """Get the node types allowed in a schema (empty for an unknown schema)."""
+        return self.node_type_sets.get(_schema_key(schema_type), frozenset())
+
+    def allowed_connection_types(self, schema_type: Union[SchemaType, str]) -> FrozenSet[str]:
+        """Get the connection types allowed in a schema (empty for an unknown schema)."""
+        return self.connection_type_sets.get(_schema_key(schema_type), frozenset())
+
+    def is_node_allowed(self, schema_type: Union[SchemaType, str], node_type: str) -> bool:
+        """Check that a node type is allowed in a schema."""
+        return node_type in self.allowed_node_types(schema_type)
+
+    def is_connection_allowed(self, schema_type: Union[SchemaType, str], connection_type: str) -> bool:
+        """Check that a connection type is allowed in a schema."""
+        return connection_type in self.allowed_connection_types(schema_type)
+
+    def is_legal_pair(self, source_type: str, target_type: str, connection_type: str) -> bool:
+        """Check that a connection type is expected between two node types."""
+        return (source_type, target_type, connection_type) in self.legal_triples
+
+    def schemas_for_node_type(self, node_type: str) -> Tuple[str, ...]:
+        """Get the schemas in which a node type is allowed."""
+        return self.schemas_by_node_type.get(node_type, ())
+
+    def schemas_for_connection_type(self, connection_type: str) -> Tuple[str, ...]:
+        """Get the schemas in which a connection type is allowed."""
+        return self.schemas_by_connection_type.get(connection_type, ())
+
+    def node_description(self, node_type: str) -> str:
+        """Get the description of a node type, for prompts."""
+        return self.node_descriptions.get(node_type, f"Node type: {node_type}")
+
+    def connection_description(self, connection_type: str) -> str:
+        """Get the description of a connection type, for prompts."""
+        return self.connection_descriptions.get(connection_type, f"Connection type: {connection_type}")
+
+    def __repr__(self) -> str:
+        return (
+            f"SchemaRegistry(schemas={len(self.node_types_by_schema)}, node_types={len(self.node_types)}, "
+            f"connection_types={len(self.connection_types)}, legal_triples={len(self.legal_triples)})"
+        )
+
+
+_registry = SchemaRegistry()
+
+
+def get_registry() -> SchemaRegistry:
+    """Get the registry compiled at import, shared by all modules."""
+    return _registry
@@ -1,19 +1,29 @@
-from openai import OpenAI
 from dotenv import load_dotenv
-import os
-import sys
 import json
-from typing import Dict, Any, List, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from schema.schema_type import Schema, SchemaType
-from schema.nodes_type import NodeType, NodeTypeDefinition
-from schema.connections_type import ConnectionType, ConnectionTypeDefinition
+from schema.registry import get_registry
+from llm_cache import cached_chat_completion, cached_chat_completion_stream
+from llm_client import get_client
+from stream_json import IncrementalArrayParser
+from token_budget import count_message_tokens, count_tokens, fit_to_budget, prompt_budget
+from sub_chunking import split_into_sub_chunks, stitch_structures
+from schema_classifier import classify_schema
+from graph_validator import validate_structure, format_violation_counts
+from repair import repair_structure, repair_schema_selection, schema_selection_problem
 
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+client = get_client()
+registry = get_registry()
 
+# System prompts only depend on the schema registry, so each one is built
+# once per process. Keeping them byte-identical across calls also lets
+# provider-side prompt caching reuse the shared prefix.
+@lru_cache(maxsize=None)
 def system_prompt():
     schema_info = Schema.get_all_schemas()
     
@@ -39,33 +49,24 @@ Return a JSON object with:
     return prompt
 
 
+def get_node_descriptions(allowed_nodes: List[str]) -> Dict[str, str]:
+    """Map each allowed node type name to its description."""
+    return {node_type_str: registry.node_description(node_type_str) for node_type_str in allowed_nodes}
+
+
+def get_connection_descriptions(allowed_connections: List[str]) -> Dict[str, str]:
+    """Map each allowed connection type name to its description."""
+    return {conn_type_str: registry.connection_description(conn_type_str) for conn_type_str in allowed_connections}
+
+
+@lru_cache(maxsize=None)
 def structure_system_prompt(
      schema_type: SchemaType
 ) -> str:
     """Create a prompt for extracting nodes and connections based on the selected schema."""
     schema = Schema(schema_type)
-    allowed_nodes = schema.get_allowed_node_types()
-    allowed_connections = schema.get_allowed_connection_types()
-    
-    # Get node type descriptions
-    node_descriptions = {}
-    for node_type_str in allowed_nodes:
-        try:
-            node_type = NodeType[node_type_str]
-            node_def = NodeTypeDefinition.get_definition(node_type)
-            node_descriptions[node_type_str] = node_def["description"]
-        except KeyError:
-            node_descriptions[node_type_str] = f"Node type: {node_type_str}"
-    
-    # Get connection type descriptions
-    connection_descriptions = {}
-    for conn_type_str in allowed_connections:
-        try:
-            conn_type = ConnectionType[conn_type_str]
-            conn_def = ConnectionTypeDefinition.get_definition(conn_type)
-            connection_descriptions[conn_type_str] = conn_def["description"]
-        except KeyError:
-            connection_descriptions[conn_type_str] = f"Connection type: {conn_type_str}"
+    node_descriptions = get_node_descriptions(schema.get_allowed_node_types())
+    connection_descriptions = get_connection_descriptions(schema.get_allowed_connection_types())
     
     prompt = f"""You are an expert at rewriting text into structured information.
     Use the following schema to rewrite the full complete transcript into a structured format. 
@@ -122,70 +123,509 @@ def structure_user_prompt(transcript_chunk: str, transcript_topic) -> str:
     return prompt
 
 
-def transcript_to_structured_format(transcript_chunk: str, transcript_topic: str) -> Dict[str, Any]:
-    try:
-        # Initialize conversation with system prompt
-        messages = [
+def schema_selection_messages(transcript_chunk: str) -> List[Dict[str, str]]:
+    """Build the conversation for step 1 (schema selection)."""
+    def build(chunk: str) -> List[Dict[str, str]]:
+        return [
             {
                 "role": "system",
                 "content": system_prompt()
             },
             {
                 "role": "user",
-                "content": user_prompt(transcript_chunk)
+                "content": user_prompt(chunk)
+            }
+        ]
+    
+    # The beginning of an over-long topic is enough to pick its schema
+    return fit_to_budget(build, transcript_chunk, label="schema selection input")
+
+
+def parse_schema_selection(selection_content: str) -> Tuple[SchemaType, Dict[str, Any]]:
+    """
+    Parse the step 1 response.
+    
+    Returns:
+        (schema_type, schema_selection); unknown schemas default to informative
+    """
+    schema_selection = json.loads(selection_content)
+    selected_schema_str = schema_selection.get("selected_schema")
+    
+    try:
+        schema_type = SchemaType(selected_schema_str)
+    except ValueError:
+        print(f"Warning: Invalid schema type '{selected_schema_str}', defaulting to informative")
+        schema_type = SchemaType.INFORMATIVE
+    return schema_type, schema_selection
+
+
+def structure_messages(
+    transcript_chunk: str,
+    transcript_topic: str,
+    schema_type: SchemaType,
+    selection_content: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the conversation for step 2 (structure extraction).
+    
+    Args:
+        transcript_chunk: Transcript text of one topic
+        transcript_topic: Title of the topic
+        schema_type: Selected schema
+        selection_content: Raw step 1 response, carried over as conversation
+            history when the schema was selected by the LLM
+    """
+    build = _structure_builder(transcript_topic, schema_type, selection_content)
+    return fit_to_budget(build, transcript_chunk, label=f"topic '{transcript_topic}'")
+
+
+def split_over_budget(
+    transcript_chunk: str,
+    transcript_topic: str,
+    schema_type: SchemaType,
+    selection_content: Optional[str] = None
+) -> List[str]:
+    """
+    Split a topic whose structure extraction request is over the token budget.
+    
+    Trimming the transcript would silently leave its end out of the
+    structure, so an over-long topic is split into sub-chunks of whole
+    speaker turns that each fit a request (without step 1 history, as in
+    structure_sub_chunks).
+    
+    Returns:
+        None if the request fits, otherwise the sub-chunks (a single one
+        when the transcript only fits without the step 1 history)
+    """
+    budget = prompt_budget()
+    build = _structure_builder(transcript_topic, schema_type, selection_content)
+    if count_message_tokens(build(transcript_chunk)) <= budget:
+        return None
+    
+    text_tokens = budget - count_message_tokens(_structure_builder(transcript_topic, schema_type)(""))
+    # Token budget in characters of this transcript, with a margin for uneven turns
+    chars_per_token = len(transcript_chunk) / max(1, count_tokens(transcript_chunk))
+    max_chars = max(1, int(text_tokens * chars_per_token * 0.9))
+    sub_chunks = split_into_sub_chunks(transcript_chunk, max_chars)
+    print(f"Topic '{transcript_topic}' is over the token budget, splitting it into {len(sub_chunks)} sub-chunks")
+    return sub_chunks
+
+
+def _structure_builder(
+    transcript_topic: str,
+    schema_type: SchemaType,
+    selection_content: Optional[str] = None
+) -> Callable[[str], List[Dict[str, str]]]:
+    # Messages of structure_messages around a transcript, before any trimming
+    def build(chunk: str) -> List[Dict[str, str]]:
+        # System message with schema-specific instructions
+        messages = [
+            {
+                "role": "system",
+                "content": structure_system_prompt(schema_type)
             }
         ]
         
-        # Step 1: Select schema
-        print("Step 1: Selecting schema...")
-        response1 = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        
-        schema_selection = json.loads(response1.choices[0].message.content)
-        selected_schema_str = schema_selection.get("selected_schema")
-        
-        try:
-            schema_type = SchemaType(selected_schema_str)
-        except ValueError:
-            print(f"Warning: Invalid schema type '{selected_schema_str}', defaulting to informative")
-            schema_type = SchemaType.INFORMATIVE
-        
-        print(f"Selected schema: {selected_schema_str} (confidence: {schema_selection.get('confidence', 'unknown')})")
-        print(f"Reasoning: {schema_selection.get('reasoning', 'N/A')}")
-        
-        # Add assistant's response to conversation history
-        messages.append({
-            "role": "assistant",
-            "content": response1.choices[0].message.content
-        })
-        
-        # Step 2: Generate structured format based on selected schema
-        print("Step 2: Generating structured format...")
-        
-        # Update system message with schema-specific instructions
-        messages[0] = {
-            "role": "system",
-            "content": structure_system_prompt(schema_type)
-        }
+        if selection_content is not None:
+            messages.append({
+                "role": "user",
+                "content": user_prompt(chunk)
+            })
+            # Add assistant's response to conversation history
+            messages.append({
+                "role": "assistant",
+                "content": selection_content
+            })
         
         # Add user message for structure extraction
         messages.append({
             "role": "user",
-            "content": structure_user_prompt(transcript_chunk, transcript_topic)
+            "content": structure_user_prompt(chunk, transcript_topic)
         })
+        return messages
+    
+    return build
+
+
+@lru_cache(maxsize=None)
+def fused_system_prompt() -> str:
+    """Create a prompt for selecting the schema and extracting its structure in one call."""
+    schemas = {}
+    for schema_type in SchemaType:
+        schema = Schema(schema_type)
+        schemas[schema_type.value] = {
+            "definition": schema.get_definition(),
+            "key_characteristics": schema.get_key_characteristics(),
+            "allowed_node_types": get_node_descriptions(schema.get_allowed_node_types()),
+            "allowed_connection_types": get_connection_descriptions(schema.get_allowed_connection_types())
+        }
+    
+    prompt = f"""You are an expert at analyzing text, identifying its schema type and rewriting it into structured information.
+    First identify which schema type best fits the transcript, then use that schema to rewrite the full complete transcript into a structured format.
+    The following are the schema types, their key characteristics, and the node and connection types allowed for each of them:
+    {json.dumps(schemas, indent=2)}
+    """
+    return prompt
+
+
+def fused_user_prompt(transcript_chunk: str, transcript_topic) -> str:
+    prompt = f"""Transcript chunk:
+    {transcript_chunk}
+
+    1. Determine which schema type best fits the transcript chunk.
+    2. Extract the complete structure using ONLY the node and connection types allowed for the selected schema:
+       identify all entities/concepts as nodes and all relationships as connections,
+       preserving the full content of the transcript chunk in the structure.
+
+    Return a JSON object with this structure:
+    {{
+        "selected_schema": "one of: narrative, descriptive, informative, instructional, argumentative",
+        "confidence": "high, medium, or low",
+        "reasoning": "brief explanation of why this schema was chosen",
+        "topic": "{transcript_topic}",
+        "nodes": [
+            {{
+                "id": "unique identifier (e.g., node_1, node_2)",
+                "type": "one of the allowed node types of the selected schema",
+                "content": "the text content or description of this node",
+                "speaker": "the speaker of the node",
+                "text_reference": "the exact text from the transcript that this node represents"
+            }}
+        ],
+        "connections": [
+            {{
+                "id": "unique identifier (e.g., conn_1, conn_2)",
+                "type": "one of the allowed connection types of the selected schema",
+                "content": "the text content or description of this connection",
+                "source_node_id": "id of the source node",
+                "target_node_id": "id of the target node",
+                "text_reference": "the exact text from the transcript that this connection represents"
+            }}
+        ]
+    }}
+
+    Important:
+    - The structure should fully represent the content of the transcript chunk
+    - The output JSON object MUST cover the whole transcript chunk, from the beginning to the end. 
+    - ALL THE NODES SHOULD BE CONNECTED TO EACH OTHER.
+    """
+    return prompt
+
+
+_FUSED_SELECTION_FIELD = re.compile(r'"(selected_schema|confidence|reasoning)"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def validate_fused_result(result: Dict[str, Any]) -> List[str]:
+    """
+    Check a fused response before accepting it.
+    
+    Returns:
+        List of problems found; empty if the response can be used as is
+    """
+    try:
+        schema = Schema(SchemaType(result.get("selected_schema")))
+    except ValueError:
+        return [f"invalid schema type '{result.get('selected_schema')}'"]
+    
+    nodes = result.get("nodes")
+    connections = result.get("connections")
+    if not isinstance(nodes, list) or not isinstance(connections, list):
+        return ["nodes and connections must be lists"]
+    
+    problems = []
+    allowed_nodes = registry.allowed_node_types(schema.schema_type)
+    allowed_connections = registry.allowed_connection_types(schema.schema_type)
+    for node in nodes:
+        if not isinstance(node, dict) or not isinstance(node.get("type"), str) or node["type"] not in allowed_nodes:
+            problems.append(f"node {node.get('id') if isinstance(node, dict) else node} has a type not allowed for {schema.schema_type.value}")
+    for conn in connections:
+        if not isinstance(conn, dict) or not isinstance(conn.get("type"), str) or conn["type"] not in allowed_connections:
+            problems.append(f"connection {conn.get('id') if isinstance(conn, dict) else conn} has a type not allowed for {schema.schema_type.value}")
+    return problems
+
+
+def _fused_selection(content: str) -> Dict[str, Any]:
+    # The selected_schema, confidence and reasoning fields of a fused response that is not valid JSON
+    selection = {}
+    for match in _FUSED_SELECTION_FIELD.finditer(content):
+        try:
+            selection.setdefault(match.group(1), json.loads(match.group(2)))
+        except json.JSONDecodeError:
+            continue
+    return selection
+
+
+def _fused_response_is_usable(content: str) -> bool:
+    try:
+        result = json.loads(content)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(result, dict) and not validate_fused_result(result)
+
+
+def fused_structured_format(
+    transcript_chunk: str,
+    transcript_topic: str,
+    repair: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Select the schema and extract the structure in a single call.
+    
+    Args:
+        transcript_chunk: Transcript text of one topic
+        transcript_topic: Title of the topic
+        repair: If the response selects a valid schema but its structure
+              does not validate or is not valid JSON (e.g., cut off),
+              repair it with follow-ups (see repair.repair_structure)
+              instead of giving up
+    
+    Returns:
+        The result in the same format as transcript_to_structured_format,
+        or None if the response does not validate
+    """
+    print("Selecting schema and generating structured format in one call...")
+    messages = fit_to_budget(
+        lambda chunk: [
+            {
+                "role": "system",
+                "content": fused_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": fused_user_prompt(chunk, transcript_topic)
+            }
+        ],
+        transcript_chunk,
+        label=f"topic '{transcript_topic}'"
+    )
+    content = cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=messages,
+        temperature=0.3,
+        response_format={"type": "json_object"},
+        stage="fused",
+        # Without repair an invalid response falls back to two-step: do not replay it
+        validate=None if repair else _fused_response_is_usable
+    )
+    
+    try:
+        result = json.loads(content)
+        if not isinstance(result, dict):
+            raise ValueError("not a JSON object")
+        problems = validate_fused_result(result)
+    except ValueError as e:
+        print(f"Warning: fused response is not valid JSON ({e})")
+        if not repair:
+            return None
+        # The schema selection comes first, so it usually survives a cut-off
+        result = _fused_selection(content)
+        problems = [f"the response is not valid JSON ({e})"]
+    
+    selected_schema = result.get("selected_schema")
+    if problems and repair and isinstance(selected_schema, str) and selected_schema in registry.node_types_by_schema:
+        # The schema selection is usable, only the structure needs fixing;
+        # two-step is only the fallback when this fails
+        result = {**result, **repair_structure(messages, content, SchemaType(selected_schema))}
+        problems = validate_fused_result(result)
+    if problems:
+        print(f"Warning: fused response failed validation ({'; '.join(problems[:3])})")
+        return None
+    
+    schema_selection = {
+        "selected_schema": result.pop("selected_schema"),
+        "confidence": result.pop("confidence", "unknown"),
+        "reasoning": result.pop("reasoning", "N/A")
+    }
+    print(f"Selected schema: {schema_selection['selected_schema']} (confidence: {schema_selection['confidence']})")
+    print(f"Extracted {len(result.get('nodes', []))} nodes and {len(result.get('connections', []))} connections")
+    
+    fused_result = {
+        "schema_type": schema_selection["selected_schema"],
+        "schema_selection": schema_selection,
+        **result
+    }
+    print(f"Validation: {format_violation_counts(validate_structure(fused_result, transcript_topic))}")
+    return fused_result
+
+
+def structure_sub_chunks(
+    sub_chunks: List[str],
+    transcript_topic: str,
+    schema_type: SchemaType,
+    max_workers: int = 4,
+    repair: bool = False
+) -> Dict[str, Any]:
+    """
+    Extract the structure of each sub-chunk of a topic in parallel and stitch them.
+    
+    Args:
+        sub_chunks: Consecutive parts of the topic transcript
+        transcript_topic: Title of the topic
+        schema_type: Schema selected for the whole topic
+        max_workers: Number of sub-chunks extracted concurrently
+        repair: Repair invalid responses with follow-ups (see repair.repair_structure)
         
-        response2 = client.chat.completions.create(
+    Returns:
+        Dictionary with topic, nodes and connections, ids renumbered across sub-chunks
+    """
+    print(f"Splitting topic into {len(sub_chunks)} sub-chunks ({', '.join(str(len(c)) for c in sub_chunks)} characters)...")
+    
+    def extract(sub_chunk: str) -> Dict[str, Any]:
+        # The step 1 conversation covers the whole topic, so it is not carried over
+        messages = structure_messages(sub_chunk, transcript_topic, schema_type)
+        content = cached_chat_completion(
+            client,
             model="gpt-4o",
             messages=messages,
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stage="structure"
         )
+        if repair:
+            return repair_structure(messages, content, schema_type)
+        return json.loads(content)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sub_chunks)))) as executor:
+        partials = list(executor.map(extract, sub_chunks))
+    
+    return {"topic": transcript_topic, **stitch_structures(partials, sub_chunks)}
+
+
+def transcript_to_structured_format(
+    transcript_chunk: str,
+    transcript_topic: str,
+    mode: str = "two_step",
+    classifier_threshold: Optional[float] = None,
+    on_item: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    sub_chunk_chars: Optional[int] = None,
+    repair: bool = False
+) -> Dict[str, Any]:
+    """
+    Select a schema for a transcript chunk and extract its structure.
+    
+    Args:
+        transcript_chunk: Transcript text of one topic
+        transcript_topic: Title of the topic
+        mode: "two_step" (select the schema, then extract the structure) or
+              "fused" (both in one call, falling back to two_step if the
+              fused response does not validate)
+        classifier_threshold: If set, let the local schema classifier pick
+              the schema without an API call when its confidence reaches
+              this threshold (two_step mode only)
+        on_item: If set, the structure is streamed and on_item("nodes", node)
+              or on_item("connections", connection) is called as soon as
+              each object is complete, before the rest is generated
+              (two_step mode only)
+        sub_chunk_chars: If set, topics longer than this are split into
+              speaker-turn sub-chunks whose structures are extracted in
+              parallel and stitched together (two_step mode without on_item
+              only; e.g., DEFAULT_SUB_CHUNK_CHARS)
+        repair: Validate each response and, when it is not usable, send
+              only the problems found as a follow-up and patch in the
+              corrections (see repair.py), instead of defaulting an unknown
+              schema to informative or failing on malformed JSON
+              
+    Returns:
+        Dictionary with schema_type, schema_selection, topic, nodes and connections
+        
+    Raises:
+        RuntimeError: If the topic could not be structured
+    """
+    try:
+        if mode == "fused":
+            fused_result = fused_structured_format(transcript_chunk, transcript_topic, repair=repair)
+            if fused_result is not None:
+                return fused_result
+            print("Falling back to two-step structuring...")
+        
+        local_schema = None
+        if classifier_threshold is not None:
+            local_schema, local_confidence = classify_schema(transcript_chunk, classifier_threshold)
+        
+        if local_schema is not None:
+            # Step 1: The local classifier is confident enough, no API call needed
+            print("Step 1: Schema selected locally...")
+            selected_schema_str = local_schema.value
+            schema_type = local_schema
+            schema_selection = {
+                "selected_schema": selected_schema_str,
+                "confidence": "high",
+                "reasoning": f"Selected by the local keyword classifier (p={local_confidence:.2f})",
+                "source": "local"
+            }
+            print(f"Selected schema: {selected_schema_str} (local confidence: {local_confidence:.2f})")
+            # Nothing to carry over from a step 1 conversation
+            selection_content = None
+        else:
+            # Step 1: Select schema
+            print("Step 1: Selecting schema...")
+            selection_messages = schema_selection_messages(transcript_chunk)
+            selection_content = cached_chat_completion(
+                client,
+                model="gpt-4o",
+                messages=selection_messages,
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                stage="schema_selection",
+                validate=lambda content: schema_selection_problem(content) is None
+            )
+            if repair:
+                selection_content = repair_schema_selection(selection_messages, selection_content)
+            
+            schema_type, schema_selection = parse_schema_selection(selection_content)
+            selected_schema_str = schema_selection.get("selected_schema")
+            
+            print(f"Selected schema: {selected_schema_str} (confidence: {schema_selection.get('confidence', 'unknown')})")
+            print(f"Reasoning: {schema_selection.get('reasoning', 'N/A')}")
+        
+        # Step 2: Generate structured format based on selected schema
+        print("Step 2: Generating structured format...")
+        sub_chunks = None
+        if sub_chunk_chars is not None and on_item is None:
+            sub_chunks = split_into_sub_chunks(transcript_chunk, sub_chunk_chars)
+            if len(sub_chunks) == 1:
+                sub_chunks = None
+        if sub_chunks is None and on_item is None:
+            # Streamed topics are still trimmed (with a warning) if over budget
+            sub_chunks = split_over_budget(transcript_chunk, transcript_topic, schema_type, selection_content)
         
-        structure_result = json.loads(response2.choices[0].message.content)
+        if sub_chunks is not None:
+            structure_result = structure_sub_chunks(sub_chunks, transcript_topic, schema_type, repair=repair)
+        elif on_item is not None:
+            # Stream the response and hand over each node/connection as soon as it closes
+            parser = IncrementalArrayParser(("nodes", "connections"))
+            messages = structure_messages(transcript_chunk, transcript_topic, schema_type, selection_content)
+            for delta in cached_chat_completion_stream(
+                client,
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                stage="structure"
+            ):
+                for kind, item in parser.feed(delta):
+                    on_item(kind, item)
+            if repair:
+                # Repaired nodes and connections are not streamed
+                structure_result = repair_structure(messages, parser.text(), schema_type)
+            else:
+                structure_result = parser.result()
+        else:
+            messages = structure_messages(transcript_chunk, transcript_topic, schema_type, selection_content)
+            structure_content = cached_chat_completion(
+                client,
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                stage="structure"
+            )
+            
+            if repair:
+                structure_result = repair_structure(messages, structure_content, schema_type)
+            else:
+                structure_result = json.loads(structure_content)
         
         # Combine results
         final_result = {
@@ -195,14 +635,15 @@ def transcript_to_structured_format(transcript_chunk: str, transcript_topic: str
         }
         
         print(f"Extracted {len(structure_result.get('nodes', []))} nodes and {len(structure_result.get('connections', []))} connections")
+        print(f"Validation: {format_violation_counts(validate_structure(final_result, transcript_topic))}")
         
         return final_result
         
     except Exception as e:
         print(f"Error in transcript_to_structured_format: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+        # Raised rather than exiting: topics run in worker threads, and the
+        # caller records the failure for this topic and keeps the others going
+        raise RuntimeError(f"structuring topic '{transcript_topic}' failed: {e}") from e
 
 
 def process_transcript_chunk(transcript_chunk: str, transcript_topic: str) -> Dict[str, Any]:
@@ -0,0 +1,244 @@
+import json
+from typing import Dict, Any, List, Tuple, Iterable, Iterator, TextIO
+
+
+class IncrementalArrayParser:
+    """
+    Incrementally parse the objects of top-level arrays in a JSON document.
+
+    Text is fed in chunks as it arrives (e.g., from a streamed completion).
+    Whenever an object inside one of the watched top-level arrays closes,
+    it is parsed and returned, without waiting for the rest of the document.
+
+    Example:
+        parser = IncrementalArrayParser(("nodes", "connections"))
+        for chunk in chunks:
+            for key, item in parser.feed(chunk):
+                ...
+        document = parser.result()
+    """
+
+    def __init__(self, keys: Iterable[str] = ("nodes", "connections")):
+        """
+        Initialize an IncrementalArrayParser instance.
+
+        Args:
+            keys: Names of the top-level arrays whose objects are emitted
+        """
+        self.keys = set(keys)
+        self._parts: List[str] = []
+        self._buffer = ""
+        self._offset = 0
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._array_key = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Consume the next chunk of text.
+
+        Returns:
+            List of (array_name, object) for every object completed in this chunk
+        """
+        self._parts.append(chunk)
+        self._buffer += chunk
+        items = []
+
+        for i in range(len(self._buffer) - len(chunk), len(self._buffer)):
+            char = self._buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = self._buffer[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2:
+                    self._array_key = self._last_key
+                elif char == "{" and self._depth == 3 and self._array_key in self.keys:
+                    self._item_start = i
+            elif char in "}]":
+                if char == "}" and self._depth == 3 and self._item_start is not None:
+                    items.append((self._array_key, json.loads(self._buffer[self._item_start:i + 1])))
+                    self._item_start = None
+                elif char == "]" and self._depth == 2:
+                    self._array_key = None
+                self._depth -= 1
+
+        # Only the object being parsed needs to stay in the working buffer
+        keep_from = self._item_start if self._item_start is not None else len(self._buffer)
+        if self._in_string and self._depth == 1:
+            keep_from = min(keep_from, self._string_start)
+        if keep_from:
+            self._buffer = self._buffer[keep_from:]
+            if self._item_start is not None:
+                self._item_start -= keep_from
+            if self._in_string:
+                self._string_start -= keep_from
+
+        return items
+
+    def text(self) -> str:
+        """Get all the text fed so far."""
+        return "".join(self._parts)
+
+    def result(self) -> Dict[str, Any]:
+        """Parse the complete document once the stream has ended."""
+        return json.loads(self.text())
+
+
+def iter_array_items(
+    chunks: Iterable[str],
+    keys: Iterable[str] = ("nodes", "connections")
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (array_name, object) pairs from a stream of JSON text chunks.
+
+    Args:
+        chunks: Text chunks of a single JSON document
+        keys: Names of the top-level arrays whose objects are emitted
+    """
+    parser = IncrementalArrayParser(keys)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_object_members(
+    file: TextIO,
+    chunk_size: int = 1 << 16
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield the (key, value) members of a JSON document's top-level object, one at a time.
+
+    Only the member being parsed is held in memory, so a file of many topics
+    can be processed in memory bounded by its largest topic. Members are
+    decoded by the standard JSON decoder; when a member is not complete yet,
+    more text is read (twice as much each time, so a large member is not
+    re-parsed once per chunk).
+
+    Args:
+        file: Text file positioned at the start of the document
+        chunk_size: Characters read at a time
+
+    Raises:
+        json.JSONDecodeError: If the document is not a JSON object
+    """
+    buffer = ""
+    position = 0
+    eof = False
+    read_size = chunk_size
+
+    def skip_whitespace() -> None:
+        nonlocal position
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+
+    def fill() -> bool:
+        # Drop the text already consumed and read more; False at end of file
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = file.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def expect(chars: str) -> str:
+        nonlocal position
+        skip_whitespace()
+        while position >= len(buffer):
+            if not fill():
+                raise json.JSONDecodeError(f"Expecting one of {chars!r}", buffer, position)
+            skip_whitespace()
+        char = buffer[position]
+        if char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", buffer, position)
+        position += 1
+        return char
+
+    def decode() -> Any:
+        nonlocal position, read_size
+        while True:
+            skip_whitespace()
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    position = end
+                    read_size = chunk_size
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill():
+                continue
+            read_size *= 2
+
+    expect("{")
+    skip_whitespace()
+    while position >= len(buffer) and fill():
+        skip_whitespace()
+    if buffer[position:position + 1] == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        yield key, decode()
+        if expect(",}") == "}":
+            return
+
+
+class ObjectWriter:
+    """
+    Write a JSON object member by member, laid out as json.dump(indent=2) would.
+
+    Example:
+        with open(path, "w", encoding="utf-8") as f:
+            writer = ObjectWriter(f)
+            for key, value in members:
+                writer.write(key, value)
+            writer.close()
+    """
+
+    def __init__(self, file: TextIO):
+        """
+        Initialize an ObjectWriter instance.
+
+        Args:
+            file: Text file to write the object to
+        """
+        self.file = file
+        self.count = 0
+
+    def write(self, key: str, value: Any) -> None:
+        """Write one member."""
+        # JSON strings cannot hold raw newlines, so every newline is layout
+        member = json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        self.file.write(f"{',' if self.count else '{'}\n  {json.dumps(key, ensure_ascii=False)}: {member}")
+        self.count += 1
+
+    def close(self) -> None:
+        """Close the object (the file itself stays open)."""
+        self.file.write("\n}" if self.count else "{}")
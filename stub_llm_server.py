@@ -0,0 +1,547 @@
+import json
+import random
+import re
+from email.parser import BytesParser
+from email.policy import HTTP
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough estimate: 1 token ≈ 4 characters
+    return max(1, len(text) // 4)
+
+
+def _last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content", "")
+    return ""
+
+
+def stub_completion_content(messages: List[Dict[str, Any]]) -> str:
+    """
+    Build a plausible response for the prompts used in this project.
+
+    The stub looks at markers in the prompts (the JSON keys each call site
+    asks for) to decide which kind of answer the caller is waiting for, so it
+    can stand in for every call site without knowing about them.
+    """
+    prompt = _last_user_message(messages)
+    system = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+
+    if '"segments"' in system:
+        turn_numbers = [int(n) for n in re.findall(r"^\s*\[(\d+)\]", prompt, re.MULTILINE)]
+        return json.dumps({
+            "segments": [
+                {"start_turn": turn, "title": f"Stub topic {turn // 8 + 1}"}
+                for turn in turn_numbers
+                if turn == turn_numbers[0] or turn % 8 == 0
+            ]
+        })
+
+    if '"topic_1"' in system:
+        # Full-transcript topic extraction: echo the transcript as one topic
+        transcript = prompt.split("Transcript:", 1)[-1].strip()
+        return json.dumps({
+            "topic_1": {"title": "Stub topic 1", "transcript": " ".join(transcript.split())}
+        })
+
+    if '"first_sentence"' in system:
+        sentence_count = len(re.findall(r"^\s*\[\d+\]", prompt, re.MULTILINE))
+        return json.dumps({
+            "topics": [
+                {
+                    "title": f"Stub topic {start // 40 + 1}",
+                    "first_sentence": start,
+                    "last_sentence": min(start + 40, sentence_count) - 1
+                }
+                for start in range(0, sentence_count, 40)
+            ]
+        })
+
+    if '"selected_schema"' in prompt and '"nodes"' not in prompt:
+        return json.dumps({
+            "selected_schema": "informative",
+            "confidence": "high",
+            "reasoning": "Stub response"
+        })
+
+    if '"remove"' in prompt:
+        # Repair follow-up: correct the elements named in the problems
+        return json.dumps({
+            "nodes": [
+                {
+                    "id": node_id,
+                    "type": "CONCEPT",
+                    "content": f"Repaired concept {node_id}",
+                    "speaker": "Stub Speaker",
+                    "text_reference": f"Repaired reference {node_id}"
+                }
+                for node_id in re.findall(r"^- node (\S+) has", prompt, re.MULTILINE)
+            ],
+            "connections": [
+                {
+                    "id": conn_id,
+                    "type": "CONCEPT_TO_CONCEPT",
+                    "content": f"Repaired connection {conn_id}",
+                    "source_node_id": "node_1",
+                    "target_node_id": "node_2",
+                    "text_reference": f"Repaired reference {conn_id}"
+                }
+                for conn_id in re.findall(r"^- connection (\S+) ", prompt, re.MULTILINE)
+            ],
+            "remove": []
+        })
+
+    if '"nodes"' in prompt:
+        # One node per 500 characters of transcript, so longer chunks take
+        # longer to generate, as real extractions do
+        chunk = re.search(r"Transcript chunk:\s*(.*?)\n\s*\n", prompt, re.DOTALL)
+        chunk_text = chunk.group(1) if chunk else ""
+        node_count = max(3, len(chunk_text) // 500)
+        selection = {}
+        if '"selected_schema"' in prompt:
+            # Fused schema selection + structure extraction
+            selection = {
+                "selected_schema": "informative",
+                "confidence": "high",
+                "reasoning": "Stub response"
+            }
+        return json.dumps({
+            **selection,
+            "topic": "Stub topic",
+            "nodes": [
+                {
+                    "id": f"node_{i}",
+                    "type": "CONCEPT",
+                    "content": f"Stub concept {i}",
+                    "speaker": "Stub Speaker",
+                    "text_reference": " ".join(chunk_text[(i - 1) * 500:].split()[:8]) or f"Stub reference {i}"
+                }
+                for i in range(1, node_count + 1)
+            ],
+            "connections": [
+                {
+                    "id": f"conn_{i}",
+                    "type": "CONCEPT_TO_CONCEPT",
+                    "content": f"Stub connection {i}",
+                    "source_node_id": f"node_{i}",
+                    "target_node_id": f"node_{i + 1}",
+                    "text_reference": f"Stub reference {i}"
+                }
+                for i in range(1, node_count)
+            ]
+        })
+
+    if '"score"' in prompt:
+        return json.dumps({
+            "score": 8,
+            "accuracy_score": 8,
+            "completeness_score": 8,
+            "clarity_score": 8,
+            "coherence_score": 8,
+            "justification": "Stub response"
+        })
+
+    if "Speaker1 Name" in prompt:
+        # Regenerated podcast: one turn per node line of the encoded graph
+        turns = re.findall(r"^\d+ (?:\(\S+\) )?\[([^\]]*)\] (.+)$", prompt, re.MULTILINE)
+        if turns:
+            return "\n\n".join(f"{speaker or 'Stub Speaker'}\n{content}" for speaker, content in turns)
+
+    return "Stub Speaker\nThis is a stub response."
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completions and batch endpoints with injected latency."""
+
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def _send_json(
+        self,
+        status: int,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        if self.path.endswith("/chat/completions"):
+            request = self._read_json()
+            status, headers = self.server.admit(request)
+            if status != 200:
+                self._send_json(status, {"error": {"message": "Injected error", "code": str(status)}}, headers)
+                return
+            time.sleep(self.server.latency)
+            if self.server.prompt_token_delay:
+                prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in request.get("messages", []))
+                time.sleep(prompt_tokens * self.server.prompt_token_delay)
+            if request.get("stream"):
+                self._send_stream(self.server.complete(request), headers)
+            else:
+                completion = self.server.complete(request)
+                # A blocking response is only sent once every chunk has been generated
+                content = completion["choices"][0]["message"]["content"]
+                chunks = -(-len(content) // self.server.stream_chunk_chars)
+                time.sleep(chunks * self.server.stream_delay)
+                self._send_json(200, completion, headers)
+        elif self.path.endswith("/files"):
+            self._send_json(200, self.server.store_file(self._read_multipart()))
+        elif self.path.endswith("/batches"):
+            self._send_json(200, self.server.create_batch(self._read_json()))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _send_stream(self, completion: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        """Send a completion as server-sent events, a few characters at a time."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        content = completion["choices"][0]["message"]["content"]
+        size = self.server.stream_chunk_chars
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        for i, piece in enumerate(pieces + [None]):
+            chunk = {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop"
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if piece is not None:
+                time.sleep(self.server.stream_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        match = re.search(r"/files/([^/]+)/content$", self.path)
+        if match and match.group(1) in self.server.files:
+            body = self.server.files[match.group(1)]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        match = re.search(r"/batches/([^/]+)$", self.path)
+        if match and match.group(1) in self.server.batches:
+            self._send_json(200, self.server.batches[match.group(1)])
+            return
+
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _read_multipart(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        form = {}
+        for part in BytesParser(policy=HTTP).parsebytes(header + raw).iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            form[name] = {
+                "filename": part.get_filename(),
+                "content": part.get_payload(decode=True)
+            }
+        return form
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency: float = 0.0,
+        batch_latency: Optional[float] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        error_rate: float = 0.0,
+        fault_rate: float = 0.0
+    ):
+        super().__init__(address, StubLLMHandler)
+        self.latency = latency
+        # Rate limits enforced like the real API: requests over the limit get
+        # a 429 with retry-after, every response carries x-ratelimit-* headers
+        self.limits = {
+            kind: {"limit": limit, "level": max(1.0, limit / 60.0), "updated": time.monotonic()}
+            for kind, limit in (("requests", requests_per_minute), ("tokens", tokens_per_minute))
+            if limit
+        }
+        # Fraction of requests answered with a transient 500
+        self.error_rate = error_rate
+        self.rejected = 0
+        # Fraction of schema selection and structure responses that come back
+        # unusable (unknown schema, dangling connection, unknown node type or
+        # cut-off JSON), drawn from a seeded generator for repeatable runs
+        self.fault_rate = fault_rate
+        self.faults = 0
+        self._fault_random = random.Random(0)
+        # Time a whole batch takes to complete, whatever its size
+        self.batch_latency = latency if batch_latency is None else batch_latency
+        # Streamed responses are sent stream_chunk_chars at a time,
+        # stream_delay seconds apart, to mimic token generation
+        self.stream_chunk_chars = 16
+        self.stream_delay = 0.0
+        # Seconds per prompt token before answering, to mimic prompt
+        # processing time growing with the prompt
+        self.prompt_token_delay = 0.0
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.request_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        request: Dict[str, Any],
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0
+    ) -> None:
+        with self._lock:
+            self.request_count += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.requests.append(request)
+
+    def admit(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, str]]:
+        """
+        Apply the injected rate limits and errors to an incoming request.
+
+        Returns:
+            (status, headers): 200 if the request may be answered, 429 or 500 otherwise
+        """
+        cost = {
+            "requests": 1.0,
+            "tokens": float(sum(_estimate_tokens(m.get("content", "")) for m in request.get("messages", [])))
+        }
+        with self._lock:
+            now = time.monotonic()
+            headers = {}
+            wait = 0.0
+            for kind, bucket in self.limits.items():
+                per_second = bucket["limit"] / 60.0
+                capacity = max(1.0, per_second)
+                bucket["level"] = min(capacity, bucket["level"] + (now - bucket["updated"]) * per_second)
+                bucket["updated"] = now
+                needed = min(cost[kind], capacity)
+                if bucket["level"] < needed:
+                    wait = max(wait, (needed - bucket["level"]) / per_second)
+
+            if wait == 0.0:
+                for kind, bucket in self.limits.items():
+                    bucket["level"] -= cost[kind]
+            for kind, bucket in self.limits.items():
+                per_second = bucket["limit"] / 60.0
+                headers[f"x-ratelimit-limit-{kind}"] = str(int(bucket["limit"]))
+                headers[f"x-ratelimit-remaining-{kind}"] = str(max(0, int(bucket["level"])))
+                reset = max(0.0, (max(1.0, per_second) - bucket["level"]) / per_second)
+                headers[f"x-ratelimit-reset-{kind}"] = f"{reset * 1000:.0f}ms"
+
+            if wait > 0.0:
+                self.rejected += 1
+                headers["retry-after-ms"] = f"{wait * 1000:.0f}"
+                return 429, headers
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, {}
+        return 200, headers
+
+    def complete(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a chat completion request body."""
+        messages = request.get("messages", [])
+        content = self.inject_fault(messages, stub_completion_content(messages))
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = _estimate_tokens(content)
+        self.record_request(request, prompt_tokens, completion_tokens)
+        return {
+            "id": f"chatcmpl-stub-{self.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def inject_fault(self, messages: List[Dict[str, Any]], content: str) -> str:
+        """Make a schema selection or structure response unusable, fault_rate of the time."""
+        prompt = _last_user_message(messages)
+        if not self.fault_rate or '"remove"' in prompt or not ('"nodes"' in content or '"selected_schema"' in content):
+            return content
+        with self._lock:
+            if self._fault_random.random() >= self.fault_rate:
+                return content
+            self.faults += 1
+            fault = self._fault_random.choice(("dangling", "type", "truncated"))
+
+        response = json.loads(content)
+        if "nodes" not in response:
+            response["selected_schema"] = "informational"
+        elif fault == "dangling" and response["connections"]:
+            response["connections"][-1]["target_node_id"] = "node_999"
+        elif fault == "type":
+            response["nodes"][0]["type"] = "IDEA"
+        else:
+            return content[:len(content) * 3 // 4]
+        return json.dumps(response)
+
+    def store_file(self, form: Dict[str, Any], content: Optional[bytes] = None) -> Dict[str, Any]:
+        """Store an uploaded (or generated) file and return its file object."""
+        with self._lock:
+            file_id = f"file-stub-{len(self.files) + 1}"
+            upload = form.get("file", {})
+            data = content if content is not None else upload.get("content", b"")
+            file_object = {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(data),
+                "created_at": int(time.time()),
+                "filename": upload.get("filename") or f"{file_id}.jsonl",
+                "purpose": (form.get("purpose", {}).get("content") or b"batch").decode("utf-8"),
+                "status": "processed"
+            }
+            self.files[file_id] = {**file_object, "content": data}
+        return file_object
+
+    def create_batch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a batch and complete it in the background after batch_latency."""
+        with self._lock:
+            batch_id = f"batch-stub-{len(self.batches) + 1}"
+            batch = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": request.get("input_file_id"),
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "in_progress",
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0}
+            }
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return dict(batch)
+
+    def _run_batch(self, batch: Dict[str, Any]) -> None:
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        time.sleep(self.batch_latency)
+
+        output = []
+        for line in lines:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            output.append(json.dumps({
+                "id": f"batch-req-{len(output) + 1}",
+                "custom_id": entry["custom_id"],
+                "response": {"status_code": 200, "body": self.complete(entry["body"])},
+                "error": None
+            }))
+
+        output_file = self.store_file({}, ("\n".join(output) + "\n").encode("utf-8"))
+        batch.update({
+            "status": "completed",
+            "completed_at": int(time.time()),
+            "output_file_id": output_file["id"],
+            "request_counts": {"total": len(output), "completed": len(output), "failed": 0}
+        })
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_stub_server(
+    latency: float = 0.0,
+    port: int = 0,
+    batch_latency: Optional[float] = None,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    error_rate: float = 0.0,
+    fault_rate: float = 0.0
+) -> StubLLMServer:
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        latency: Seconds to sleep before answering each request
+        port: Port to bind on localhost (0 picks a free port)
+        batch_latency: Seconds a batch takes to complete (default: latency)
+        requests_per_minute: Requests/min limit to enforce with 429s (default: none)
+        tokens_per_minute: Prompt tokens/min limit to enforce with 429s (default: none)
+        error_rate: Fraction of requests failing with a transient 500
+        fault_rate: Fraction of schema selection and structure responses made unusable
+
+    Returns:
+        The running server; call shutdown() when done
+    """
+    server = StubLLMServer(
+        ("127.0.0.1", port),
+        latency=latency,
+        batch_latency=batch_latency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        error_rate=error_rate,
+        fault_rate=fault_rate
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    """Main function for command-line usage."""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8808
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    requests_per_minute = float(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    server = StubLLMServer(("127.0.0.1", port), latency=latency, requests_per_minute=requests_per_minute)
+    print(f"Stub LLM server listening on {server.base_url} (latency: {latency}s)")
+    print(f"Point the pipeline at it with: OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down stub server")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+
+# Topics longer than this are structured in sub-chunks
+DEFAULT_SUB_CHUNK_CHARS = 2500
+# A speaker name at the start of a turn: two capitalized words, then a capitalized word
+_SPEAKER_CANDIDATE = re.compile(r"(?:^|(?<=[.!?] ))([A-Z][\w'-]+ [A-Z][\w'-]+)(?= [A-Z\"'])")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def infer_speakers(transcript_chunk: str) -> List[str]:
+    """
+    Guess the speaker names of a topic transcript.
+
+    Topics are stored as "Speaker Name what they said Other Speaker ..." on
+    one line, so turns are not delimited. A speaker name is a pair of
+    capitalized words opening a sentence; it is kept if it opens the topic
+    or opens sentences at least twice.
+    """
+    counts = Counter(_SPEAKER_CANDIDATE.findall(transcript_chunk))
+    first = _SPEAKER_CANDIDATE.match(transcript_chunk)
+    return [
+        name for name, count in counts.items()
+        if count >= 2 or (first is not None and first.group(1) == name)
+    ]
+
+
+def split_turns(transcript_chunk: str, speakers: Optional[List[str]] = None) -> List[str]:
+    """
+    Split a topic transcript into speaker turns.
+
+    Args:
+        transcript_chunk: Transcript of one topic
+        speakers: Speaker names (default: inferred from the transcript)
+
+    Returns:
+        The turns, in transcript order
+    """
+    if "\n\n" in transcript_chunk.strip():
+        # Blank-line separated blocks, as in the raw transcript
+        return [block.strip() for block in re.split(r"\n\s*\n", transcript_chunk) if block.strip()]
+
+    speakers = speakers if speakers is not None else infer_speakers(transcript_chunk)
+    if not speakers:
+        return [transcript_chunk.strip()] if transcript_chunk.strip() else []
+
+    names = "|".join(re.escape(name) for name in sorted(speakers, key=len, reverse=True))
+    boundary = re.compile(rf"(?<=[.!?])\s+(?=(?:{names}) )")
+    return [turn.strip() for turn in boundary.split(transcript_chunk) if turn.strip()]
+
+
+def split_into_sub_chunks(
+    transcript_chunk: str,
+    max_chars: int = DEFAULT_SUB_CHUNK_CHARS,
+    speakers: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Split a topic transcript into sub-chunks of whole speaker turns.
+
+    Sub-chunks are balanced (a topic slightly over max_chars becomes two
+    halves rather than max_chars and a remainder). A turn longer than a
+    sub-chunk is cut at sentence ends.
+
+    Args:
+        transcript_chunk: Transcript of one topic
+        max_chars: Maximum length of a sub-chunk
+        speakers: Speaker names (default: inferred from the transcript)
+
+    Returns:
+        The sub-chunks in transcript order; the whole transcript if it is not over max_chars
+    """
+    if len(transcript_chunk) <= max_chars:
+        return [transcript_chunk]
+
+    target = len(transcript_chunk) / math.ceil(len(transcript_chunk) / max_chars)
+    separator = "\n\n" if "\n\n" in transcript_chunk.strip() else " "
+
+    units = []
+    for turn in split_turns(transcript_chunk, speakers):
+        if len(turn) <= max_chars:
+            units.append(turn)
+        else:
+            units.extend(sentence for sentence in _SENTENCE_END.split(turn) if sentence)
+
+    sub_chunks = []
+    current = []
+    current_chars = 0
+    for unit in units:
+        # Close the sub-chunk when the unit would overflow it, or would take it
+        # further past the target than stopping short of it
+        if current and (
+            current_chars + len(unit) > max_chars
+            or current_chars + len(unit) // 2 > target
+        ):
+            sub_chunks.append(separator.join(current))
+            current, current_chars = [], 0
+        current.append(unit)
+        current_chars += len(unit) + len(separator)
+    if current:
+        sub_chunks.append(separator.join(current))
+    return sub_chunks
+
+
+def _normalize(text: Any) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text or "").lower()).split())
+
+
+def _node_key(node: Dict[str, Any]) -> Optional[Tuple[Any, str, str]]:
+    """Key under which two nodes extracted from different sub-chunks may be the same node."""
+    reference = _normalize(node.get("text_reference"))
+    if not reference:
+        # Without a reference there is nothing to tell two nodes apart by
+        return None
+    return node.get("type"), reference, _normalize(node.get("content"))
+
+
+def stitch_structures(
+    partials: List[Dict[str, Any]],
+    sub_chunks: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Merge the structures extracted from the sub-chunks of a topic.
+
+    Node and connection ids are renumbered node_1..node_N and
+    conn_1..conn_M in sub-chunk order. A node is merged into an earlier one
+    only if it comes from a different sub-chunk, both have the same type,
+    content and non-empty text reference, and (when sub_chunks is given)
+    the reference occurs in the text of both sub-chunks, i.e. the sub-chunks
+    overlap on it. Nodes of the same sub-chunk are never merged. Connections
+    are redirected to merged nodes; connections that become duplicates or
+    self-loops are dropped, as are connections to ids the sub-chunk did not
+    define.
+
+    Args:
+        partials: Structures with "nodes" and "connections", in transcript order
+        sub_chunks: Text of each sub-chunk, in the same order as partials
+
+    Returns:
+        Dictionary with the merged "nodes" and "connections"
+    """
+    nodes = []
+    connections = []
+    # Node key -> (merged id, index of the sub-chunk it was first seen in)
+    merged_ids = {}
+    seen_connections = set()
+    dropped = 0
+    texts = [_normalize(text) for text in sub_chunks] if sub_chunks is not None else None
+
+    for index, partial in enumerate(partials):
+        id_map = {}
+        # Earlier nodes already merged with a node of this sub-chunk
+        taken = set()
+        for node in partial.get("nodes", []):
+            if not isinstance(node, dict):
+                continue
+            key = _node_key(node)
+            earlier = merged_ids.get(key) if key is not None else None
+            if earlier is not None and earlier[1] != index and earlier[0] not in taken and (
+                texts is None or (key[1] in texts[earlier[1]] and key[1] in texts[index])
+            ):
+                taken.add(earlier[0])
+                id_map[node.get("id")] = earlier[0]
+                continue
+            node_id = f"node_{len(nodes) + 1}"
+            nodes.append({**node, "id": node_id})
+            if key is not None:
+                merged_ids.setdefault(key, (node_id, index))
+            id_map[node.get("id")] = node_id
+
+        for conn in partial.get("connections", []):
+            if not isinstance(conn, dict):
+                continue
+            source = id_map.get(conn.get("source_node_id"))
+            target = id_map.get(conn.get("target_node_id"))
+            if source is None or target is None:
+                dropped += 1
+                continue
+            key = (conn.get("type"), source, target)
+            if source == target or key in seen_connections:
+                continue
+            seen_connections.add(key)
+            connections.append({
+                **conn,
+                "id": f"conn_{len(connections) + 1}",
+                "source_node_id": source,
+                "target_node_id": target
+            })
+
+    if dropped:
+        print(f"Warning: dropped {dropped} connections to unknown nodes while stitching sub-chunks")
+    return {"nodes": nodes, "connections": connections}
@@ -1,15 +1,31 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import re
 import sys
 import json
-from typing import Dict, Any
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from llm_cache import LLMCache, cached_chat_completion, print_cache_stats
+from token_budget import fit_to_budget, print_token_totals
+from graph_prompt import GRAPH_FORMAT, encode_graph, encode_topic
+from llm_client import get_client
 
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+client = get_client()
+
+# Summaries merged by each reduce call of the hierarchical mode
+DEFAULT_FAN_IN = 6
+
+# Scores of a judgment, averaged over sections by judge_summary_by_topic
+JUDGMENT_SCORES = ("score", "accuracy_score", "completeness_score", "clarity_score", "coherence_score")
+
+# Section headings of a summary: "## Title" or a "**Title**" line
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s+(.+?)|\*\*([^*].*?)\*\*:?)\s*$")
+# Words compared to align summary sections to topics
+_WORD = re.compile(r"[a-z0-9']{4,}")
 
 
 def summarize_from_structured_data(structured_file: str) -> str:
@@ -25,37 +41,216 @@ def summarize_from_structured_data(structured_file: str) -> str:
         sys.exit(1)
     
     # Prepare the structured data for the LLM
-    structured_summary = json.dumps(data, indent=2, ensure_ascii=False)
+    structured_summary = encode_graph(data)
     
-    prompt = f"""You are an expert at analyzing podcast content and creating comprehensive summaries.
+    def build(structured_summary: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert at analyzing podcast content and creating comprehensive summaries.
     I will provide you with a structured representation of a podcast transcript that has been organized into topics, 
     nodes (key concepts/entities), and connections (relationships between concepts). The summary should be based on the given structured data ONLY.
 
+    Format of the data: {GRAPH_FORMAT}
+
     Structured Podcast Data:
     {structured_summary}
 
     The summary should be detailed enough to give someone who hasn't listened to the podcast a complete understanding of the content, but concise enough to be readable.
     Format your response as a clear, well-structured summary with appropriate sections if needed.
     """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert at analyzing and summarizing podcast content. Provide clear, comprehensive, and well-structured summaries."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
     
     print("Generating summary from structured data...")
     try:
-        response = client.chat.completions.create(
+        summary = cached_chat_completion(
+            client,
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert at analyzing and summarizing podcast content. Provide clear, comprehensive, and well-structured summaries."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7
+            messages=fit_to_budget(build, structured_summary, label="structured data"),
+            temperature=0.7,
+            stage="summary"
         )
         
-        summary = response.choices[0].message.content
+        print("✓ Summary generated from structured data")
+        return summary
+        
+    except Exception as e:
+        print(f"Error generating summary: {e}")
+        sys.exit(1)
+
+
+def summarize_topic(
+    topic_key: str,
+    topic: Dict[str, Any],
+    cache: Optional[LLMCache] = None
+) -> str:
+    """
+    Summarize the graph of a single topic (map step of the hierarchical mode).
+    
+    The prompt only depends on the topic, so the response cache serves an
+    unchanged topic's summary again when other topics are edited.
+    
+    Args:
+        topic_key: Key of the topic (e.g., topic_1)
+        topic: Topic entry of the structured file (title, nodes, connections)
+        cache: Response cache (default: the shared cache)
+        
+    Returns:
+        Summary of the topic
+    """
+    topic_data = encode_topic(topic_key, topic)
+    
+    def build(topic_data: str) -> List[Dict[str, str]]:
+        prompt = f"""Summarize one topic of a podcast from its structured representation: nodes (key concepts/entities) and connections (relationships between concepts). The summary should be based on the given structured data ONLY.
+
+    Topic: {topic.get("title", topic_key)}
+
+    Format of the data: {GRAPH_FORMAT}
+
+    Structured Topic Data:
+    {topic_data}
+
+    Cover every important point and who made it, in one or two short paragraphs.
+    """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert at analyzing and summarizing podcast content. Provide clear, accurate and concise summaries."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    return cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=fit_to_budget(build, topic_data, label=f"{topic_key} structured data"),
+        temperature=0.7,
+        cache=cache,
+        stage="summary_topic"
+    )
+
+
+def reduce_summaries(
+    summaries: List[Tuple[str, str]],
+    final: bool = False,
+    cache: Optional[LLMCache] = None
+) -> str:
+    """
+    Merge consecutive summaries into one (reduce step of the hierarchical mode).
+    
+    Args:
+        summaries: (title, summary) pairs in podcast order
+        final: Whether this is the episode summary (full format) or an
+            intermediate section summary
+        cache: Response cache (default: the shared cache)
+        
+    Returns:
+        The merged summary
+    """
+    parts = "\n\n".join(f"## {title}\n{summary}" for title, summary in summaries)
+    if final:
+        instructions = """The summary should be detailed enough to give someone who hasn't listened to the podcast a complete understanding of the content, but concise enough to be readable.
+    Format your response as a clear, well-structured summary with appropriate sections if needed."""
+    else:
+        instructions = """Merge them into a single summary of this part of the podcast, in podcast order. Keep every important point; drop repetition."""
+    
+    def build(parts: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert at analyzing podcast content and creating comprehensive summaries.
+    I will provide you with summaries of consecutive parts of a podcast, in order. The summary should be based on these summaries ONLY.
+
+    Part Summaries:
+    {parts}
+
+    {instructions}
+    """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert at analyzing and summarizing podcast content. Provide clear, comprehensive, and well-structured summaries."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    return cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=fit_to_budget(build, parts, label="part summaries"),
+        temperature=0.7,
+        cache=cache,
+        stage="summary_reduce"
+    )
+
+
+def summarize_hierarchically(
+    structured_file: str,
+    max_workers: int = 8,
+    fan_in: int = DEFAULT_FAN_IN,
+    cache: Optional[LLMCache] = None
+) -> str:
+    """
+    Summarize the structured data with map-reduce instead of one prompt.
+    
+    Every topic is summarized on its own, concurrently; groups of fan_in
+    consecutive summaries are then merged into section summaries,
+    concurrently, level after level, until one episode summary is left.
+    Each prompt holds one topic or fan_in summaries, whatever the length of
+    the episode. Topic summaries come from the response cache when their
+    topic is unchanged, so editing one topic re-runs its summary and the
+    merges above it only.
+    
+    Args:
+        structured_file: Path to the filtered structured JSON file
+        max_workers: Requests in flight at once
+        fan_in: Summaries merged per reduce call
+        cache: Response cache (default: the shared cache)
+        
+    Returns:
+        Summary of the episode
+    """
+    try:
+        print("Reading structured data...")
+        with open(structured_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: File '{structured_file}' not found.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        sys.exit(1)
+    
+    fan_in = max(2, fan_in)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            print(f"Summarizing {len(data)} topics...")
+            summaries = list(zip(
+                [topic.get("title", key) for key, topic in data.items()],
+                executor.map(lambda item: summarize_topic(item[0], item[1], cache), data.items())
+            ))
+            
+            level = 1
+            while len(summaries) > fan_in:
+                groups = [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+                print(f"Merging {len(summaries)} summaries into {len(groups)} section summaries (level {level})...")
+                summaries = list(zip(
+                    [" / ".join(dict.fromkeys([group[0][0], group[-1][0]])) for group in groups],
+                    executor.map(lambda group: reduce_summaries(group, cache=cache), groups)
+                ))
+                level += 1
+        
+        print("Merging section summaries into the episode summary...")
+        summary = reduce_summaries(summaries, final=True, cache=cache)
         print("✓ Summary generated from structured data")
         return summary
         
@@ -82,7 +277,8 @@ def judge_summary(
     """
     print("Evaluating summary against full transcript...")
     
-    prompt = f"""You are an expert judge evaluating a summary of a podcast against the original transcript.
+    def build(full_transcript: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert judge evaluating a summary of a podcast against the original transcript.
 
             I will provide you with:
             1. The full transcript of the podcast (the ground truth)
@@ -115,25 +311,28 @@ def judge_summary(
                 "justification": <explanation your choice of the scores>
             }}
         """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert judge evaluating summaries. Be thorough, fair, and provide detailed reasoning. Always return valid JSON."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
     
     try:
-        response = client.chat.completions.create(
+        judgment_content = cached_chat_completion(
+            client,
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert judge evaluating summaries. Be thorough, fair, and provide detailed reasoning. Always return valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=fit_to_budget(build, full_transcript, label="full transcript"),
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stage="judge"
         )
         
-        judgment = json.loads(response.choices[0].message.content)
+        judgment = json.loads(judgment_content)
         print("✓ Judgment completed")
         return judgment
         
@@ -144,6 +343,254 @@ def judge_summary(
         sys.exit(1)
 
 
+def split_summary_sections(summary: str) -> List[Tuple[str, str]]:
+    """
+    Split a summary into sections at its markdown headings ("## ..." or "**...**" lines).
+
+    Headings without text below them (e.g., a document title) are dropped.
+    A summary with fewer than two sections is split into paragraphs instead.
+
+    Returns:
+        (heading, text) pairs in order; text starts with the heading, if any
+    """
+    sections = []
+    heading, lines = "", []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append((heading, f"{heading}\n{body}" if heading else body))
+
+    for line in summary.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            flush()
+            heading, lines = (match.group(1) or match.group(2)).strip(), []
+        else:
+            lines.append(line)
+    flush()
+
+    if len(sections) < 2:
+        sections = [("", paragraph.strip()) for paragraph in summary.split("\n\n") if paragraph.strip()]
+    return sections
+
+
+def align_sections(sections: List[Tuple[str, str]], topics: List[Dict[str, Any]]) -> List[int]:
+    """
+    Find the summary section covering each topic.
+
+    Sections and topics (title and transcript) are compared as sets of words
+    weighted by how specific each word is to a few topics (cosine of the
+    idf-weighted word sets). Summaries follow the podcast order, so topics
+    are assigned to sections in order (a topic never goes to a section
+    before the previous topic's) with the highest total similarity.
+
+    Args:
+        sections: (heading, text) pairs from split_summary_sections
+        topics: Topic entries of the topics file (title, transcript), in order
+
+    Returns:
+        Index of the section of each topic
+    """
+    topic_words = [set(_WORD.findall(f"{t.get('title', '')} {t.get('transcript', '')}".lower())) for t in topics]
+    section_words = [set(_WORD.findall(text.lower())) for _, text in sections]
+    document_counts = Counter(word for words in topic_words for word in words)
+    weights = {word: math.log(1 + len(topics) / count) ** 2 for word, count in document_counts.items()}
+
+    topic_norms = [math.sqrt(sum(weights[w] for w in words)) or 1.0 for words in topic_words]
+    section_norms = [math.sqrt(sum(weights.get(w, 0.0) for w in words)) or 1.0 for words in section_words]
+
+    # totals[j]: best total similarity of the topics so far, the last one in section j;
+    # choices[i][j]: section of topic i - 1 in that best assignment
+    totals = [0.0] * len(sections)
+    choices = []
+    for i, (words, topic_norm) in enumerate(zip(topic_words, topic_norms)):
+        scores = [
+            sum(weights[w] for w in words & other) / (topic_norm * section_norm)
+            for other, section_norm in zip(section_words, section_norms)
+        ]
+        best, best_j, row = float("-inf"), 0, []
+        new_totals = []
+        for j, score in enumerate(scores):
+            if i and totals[j] > best:
+                best, best_j = totals[j], j
+            row.append(best_j)
+            new_totals.append(score + (best if i else 0.0))
+        totals = new_totals
+        choices.append(row)
+
+    j = max(range(len(totals)), key=totals.__getitem__) if totals else 0
+    alignment = []
+    for row in reversed(choices):
+        alignment.append(j)
+        j = row[j]
+    return alignment[::-1]
+
+
+def judge_section(
+    section: str,
+    transcript_excerpt: str,
+    summary_source: str = "Structured Data",
+    cache: Optional[LLMCache] = None
+) -> Dict[str, Any]:
+    """
+    Judge one section of a summary against the part of the transcript it covers.
+
+    Args:
+        section: Text of the summary section
+        transcript_excerpt: Transcript of the topics aligned to the section
+        summary_source: Label for the summary source
+        cache: Response cache (default: the shared cache)
+
+    Returns:
+        Dictionary with the same scores and justification as judge_summary
+    """
+    def build(transcript_excerpt: str) -> List[Dict[str, str]]:
+        prompt = f"""You are an expert judge evaluating one section of a summary of a podcast against the part of the original transcript it covers.
+
+            I will provide you with:
+            1. The transcript of one or more consecutive topics of the podcast (the ground truth)
+            2. The section of a summary generated from {summary_source} that covers these topics
+
+            Your task is to evaluate the section based on:
+            - Accuracy: How well does it capture the actual content of this part of the podcast?
+            - Completeness: Does it cover the main points of these topics?
+            - Clarity: Is it well-written and easy to understand?
+            - Coherence: Does it flow well and make sense as a narrative?
+            - Insight: Does it capture the key insights and important takeaways?
+
+            Transcript of the Topics (Ground Truth):
+            {transcript_excerpt}
+
+            ---
+
+            Summary Section (from {summary_source}):
+            {section}
+
+            ---
+
+            Please provide your evaluation as a JSON object with the following structure:
+            {{
+                "score": <overall score from 1-10>,
+                "accuracy_score": <score from 1-10 for accuracy>,
+                "completeness_score": <score from 1-10 for completeness>,
+                "clarity_score": <score from 1-10 for clarity>,
+                "coherence_score": <score from 1-10 for coherence>
+                "justification": <explanation your choice of the scores>
+            }}
+        """
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert judge evaluating summaries. Be thorough, fair, and provide detailed reasoning. Always return valid JSON."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    judgment_content = cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=fit_to_budget(build, transcript_excerpt, label="topic transcripts"),
+        temperature=0.3,
+        response_format={"type": "json_object"},
+        cache=cache,
+        stage="judge_topic"
+    )
+    return json.loads(judgment_content)
+
+
+def judge_summary_by_topic(
+    summary: str,
+    topics: Dict[str, Dict[str, Any]],
+    summary_source: str = "Structured Data",
+    max_workers: int = 16,
+    cache: Optional[LLMCache] = None
+) -> Dict[str, Any]:
+    """
+    Judge a summary section by section against the transcript of its topics.
+
+    The summary is split into sections, each topic of the topics file is
+    aligned to the section covering it (see align_sections), and each
+    section is judged against the transcript of its topics only, all
+    sections concurrently. Sections no topic was aligned to are judged with
+    the topics of the section before them. Scores are averaged, weighted by
+    the length of the transcript each section covers, into the judge_summary
+    format, so the judgment takes about as long as one section's and each
+    prompt holds a few topics whatever the length of the episode.
+
+    Args:
+        summary: Summary text to evaluate
+        topics: Topics file content (topic key -> title, transcript), in podcast order
+        summary_source: Label for the summary source
+        max_workers: Requests in flight at once (the client's limiter may allow fewer)
+        cache: Response cache (default: the shared cache)
+
+    Returns:
+        Dictionary with the same keys as judge_summary
+    """
+    print("Evaluating summary section by section against the topic transcripts...")
+    topic_list = [topic for topic in topics.values() if isinstance(topic, dict)]
+    sections = split_summary_sections(summary)
+    if not sections or not topic_list:
+        print("Error in judgment: the summary or the topics file is empty")
+        sys.exit(1)
+    alignment = align_sections(sections, topic_list)
+
+    # One group per section with topics; other sections join the group before them
+    groups: List[Tuple[List[int], List[int]]] = []
+    for j in range(len(sections)):
+        topic_indexes = [i for i, section in enumerate(alignment) if section == j]
+        if topic_indexes or not groups:
+            groups.append((topic_indexes, [j]))
+        else:
+            groups[-1][1].append(j)
+    if not groups[0][0]:
+        # Sections before the first aligned section go with it
+        leading = groups.pop(0)[1]
+        groups[0] = (groups[0][0], leading + groups[0][1])
+
+    def judge_group(group: Tuple[List[int], List[int]]) -> Dict[str, Any]:
+        topic_indexes, section_indexes = group
+        excerpt = "\n\n".join(
+            f"[{topic_list[i].get('title', '')}]\n{topic_list[i].get('transcript', '')}" for i in topic_indexes
+        )
+        section = "\n\n".join(sections[j][1] for j in section_indexes)
+        return judge_section(section, excerpt, summary_source, cache)
+
+    try:
+        print(f"Judging {len(groups)} sections aligned to {len(topic_list)} topics...")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            judgments = list(executor.map(judge_group, groups))
+    except Exception as e:
+        print(f"Error in judgment: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+    weights = [
+        sum(len(topic_list[i].get("transcript", "")) for i in topic_indexes) or 1
+        for topic_indexes, _ in groups
+    ]
+    judgment: Dict[str, Any] = {}
+    for key in JUDGMENT_SCORES:
+        scored = [
+            (judgment_part[key], weight)
+            for judgment_part, weight in zip(judgments, weights)
+            if isinstance(judgment_part.get(key), (int, float))
+        ]
+        if scored:
+            judgment[key] = round(sum(score * weight for score, weight in scored) / sum(w for _, w in scored), 1)
+    judgment["justification"] = "\n".join(
+        f"{sections[section_indexes[0]][0] or f'Section {section_indexes[0] + 1}'}: {judgment_part.get('justification', '')}"
+        for (_, section_indexes), judgment_part in zip(groups, judgments)
+    )
+    print("✓ Judgment completed")
+    return judgment
+
+
 def save_summary_and_judgment(
     summary: str,
     judgment: Dict[str, Any],
@@ -182,6 +629,11 @@ def save_summary_and_judgment(
 
 def main():
     """Main function to run the complete summarization and judgment pipeline."""
+    # --hierarchical: summarize topics concurrently, then merge the summaries
+    hierarchical = "--hierarchical" in sys.argv
+    # --judge-by-topic: judge each summary section against its topics' transcript, concurrently
+    judge_by_topic = "--judge-by-topic" in sys.argv
+    
     print("=" * 80)
     print("PODCAST SUMMARIZATION AND EVALUATION")
     print("=" * 80)
@@ -189,11 +641,15 @@ def main():
     # File paths
     structured_file = "final_result.json"
     transcript_file = "transcription.txt"
+    topics_file = "transcription_topics.json"
     
     # Step 1: Generate summary from structured data
     print("\n[STEP 1] Generating summary from structured data...")
     print("-" * 80)
-    summary = summarize_from_structured_data(structured_file)
+    if hierarchical:
+        summary = summarize_hierarchically(structured_file)
+    else:
+        summary = summarize_from_structured_data(structured_file)
     
     # Step 2: Read full transcript
     print("\n[STEP 2] Reading full transcript...")
@@ -212,11 +668,24 @@ def main():
     # Step 3: Evaluate summary against transcript
     print("\n[STEP 3] Evaluating summary against transcript...")
     print("-" * 80)
-    judgment = judge_summary(
-        summary,
-        full_transcript,
-        summary_source="Structured Data"
-    )
+    if judge_by_topic:
+        try:
+            with open(topics_file, "r", encoding="utf-8") as f:
+                topics = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: Topics file '{topics_file}' not found.")
+            sys.exit(1)
+        judgment = judge_summary_by_topic(
+            summary,
+            topics,
+            summary_source="Structured Data"
+        )
+    else:
+        judgment = judge_summary(
+            summary,
+            full_transcript,
+            summary_source="Structured Data"
+        )
     
     # Step 4: Save results
     print("\n[STEP 4] Saving results...")
@@ -239,6 +708,8 @@ def main():
     print(f"\nWeaknesses:\n{judgment.get('weaknesses', 'N/A')}")
     print("=" * 80)
     
+    print_cache_stats()
+    print_token_totals()
     print("\n✓ Summary and evaluation saved to 'summaries/' directory")
 
 
@@ -1,14 +1,146 @@
 import json
 import sys
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from schema_manager import transcript_to_structured_format
+from sub_chunking import DEFAULT_SUB_CHUNK_CHARS
+from llm_cache import print_cache_stats
+from token_budget import print_token_totals
+from checkpoint import TopicJournal, topic_fingerprint
+from graph_model import EpisodeGraph
+from graph_validator import validate_episode, format_violation_counts
+
+
+def process_topic(
+    topic_key: str,
+    topic_data: Dict[str, Any],
+    mode: str = "two_step",
+    classifier_threshold: Optional[float] = None,
+    journal: Optional[TopicJournal] = None,
+    sub_chunk_chars: Optional[int] = None,
+    repair: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Structure a single topic from the topics file.
+    
+    Args:
+        topic_key: Key of the topic (e.g., topic_1)
+        topic_data: Topic entry with "title" and "transcript"
+        mode: Structuring mode passed to transcript_to_structured_format
+        classifier_threshold: Confidence above which the local schema
+            classifier replaces the schema selection call (None disables it)
+        journal: If given, reuse the journaled result when the topic inputs
+            are unchanged, and journal the result once it is computed
+        sub_chunk_chars: If set, length above which a topic is structured
+            in sub-chunks (disabled by default)
+        repair: Repair invalid responses with minimal follow-ups
+        
+    Returns:
+        The structured result for the topic, or None if it has no transcript
+    """
+    topic_title = topic_data.get("title")
+    transcript = topic_data.get("transcript")
+    
+    if not transcript:
+        print(f"\nWarning: {topic_key} has no transcript, skipping...")
+        return None
+    
+    # repair is only part of the fingerprint when enabled, so that journals
+    # written without it stay valid
+    fingerprint = topic_fingerprint(
+        transcript,
+        topic_title,
+        mode=mode,
+        classifier_threshold=classifier_threshold,
+        sub_chunk_chars=sub_chunk_chars,
+        **({"repair": True} if repair else {})
+    )
+    if journal is not None:
+        checkpointed = journal.get(fingerprint)
+        if checkpointed is not None:
+            print(f"\n✓ Reusing checkpointed result for {topic_key}: {topic_title}")
+            return checkpointed
+    
+    print(f"\nProcessing {topic_key}: {topic_title}")
+    print(f"Transcript length: {len(transcript)} characters")
+    print("-" * 80)
+    
+    try:
+        # Process the transcript chunk
+        structured_result = transcript_to_structured_format(
+            transcript,
+            topic_title,
+            mode=mode,
+            classifier_threshold=classifier_threshold,
+            sub_chunk_chars=sub_chunk_chars,
+            repair=repair
+        )
+        
+        # Store the result with the same topic key
+        result = {
+            "title": topic_title,
+            "original_transcript": transcript,
+            "schema_type": structured_result.get("schema_type"),
+            "schema_selection": structured_result.get("schema_selection"),
+            "topic": structured_result.get("topic", topic_title),
+            "nodes": structured_result.get("nodes", []),
+            "connections": structured_result.get("connections", [])
+        }
+        
+        print(f"✓ Successfully processed {topic_key}")
+        print(f"  - Schema: {structured_result.get('schema_type', 'unknown')}")
+        print(f"  - Nodes: {len(structured_result.get('nodes', []))}")
+        print(f"  - Connections: {len(structured_result.get('connections', []))}")
+        
+        if journal is not None:
+            journal.append(fingerprint, topic_key, result)
+        
+    except Exception as e:
+        print(f"✗ Error processing {topic_key}: {e}")
+        import traceback
+        traceback.print_exc()
+        # Store error information
+        result = {
+            "title": topic_title,
+            "original_transcript": transcript,
+            "error": str(e),
+            "nodes": [],
+            "connections": []
+        }
+    
+    return result
 
 
 def process_transcript_topics_file(
     input_file: str,
-    output_file: str
+    output_file: str,
+    max_workers: int = 1,
+    mode: str = "two_step",
+    classifier_threshold: Optional[float] = None,
+    checkpoint: bool = False,
+    sub_chunk_chars: Optional[int] = None,
+    repair: bool = False
 ) -> Dict[str, Any]:
- 
+    """
+    Structure every topic of a topics file and save the results.
+    
+    Args:
+        input_file: Path to the topics JSON file
+        output_file: Path to save the structured output JSON file
+        max_workers: Number of topics processed concurrently
+        mode: Structuring mode passed to transcript_to_structured_format
+        classifier_threshold: Confidence above which the schema is picked locally
+        checkpoint: If True, journal each completed topic to
+            <output_file>.journal.jsonl and skip topics already journaled
+            with the same inputs
+        sub_chunk_chars: If set, length above which a topic is structured
+            in sub-chunks (disabled by default)
+        repair: Repair invalid responses with minimal follow-ups instead of
+            defaulting or failing (see repair.py)
+            
+    Returns:
+        Dictionary of structured results keyed by topic
+    """
     try:
         # Read the input file
         print(f"Reading transcript topics from: {input_file}")
@@ -24,57 +156,45 @@ def process_transcript_topics_file(
         print(f"Error reading input file: {e}")
         sys.exit(1)
     
+    journal = None
+    if checkpoint:
+        journal = TopicJournal(output_file + ".journal.jsonl")
+        print(f"Checkpoint journal: {journal.path} ({len(journal)} topics already done)")
+    
     # Process each topic
     results = {}
     total_topics = len(topics_data)
     
     print(f"\nFound {total_topics} topics to process")
+    if max_workers > 1:
+        print(f"Processing with up to {max_workers} topics in flight")
     print("=" * 80)
     
-    for topic_key, topic_data in topics_data.items():
-        topic_title = topic_data.get("title")
-        transcript = topic_data.get("transcript")
-        
-        if not transcript:
-            print(f"\nWarning: {topic_key} has no transcript, skipping...")
-            continue
-        
-        print(f"\nProcessing {topic_key}: {topic_title}")
-        print(f"Transcript length: {len(transcript)} characters")
-        print("-" * 80)
-        
-        try:
-            # Process the transcript chunk
-            structured_result = transcript_to_structured_format(transcript, topic_title)
-            
-            # Store the result with the same topic key
-            results[topic_key] = {
-                "title": topic_title,
-                "original_transcript": transcript,
-                "schema_type": structured_result.get("schema_type"),
-                "schema_selection": structured_result.get("schema_selection"),
-                "topic": structured_result.get("topic", topic_title),
-                "nodes": structured_result.get("nodes", []),
-                "connections": structured_result.get("connections", [])
-            }
-            
-            print(f"✓ Successfully processed {topic_key}")
-            print(f"  - Schema: {structured_result.get('schema_type', 'unknown')}")
-            print(f"  - Nodes: {len(structured_result.get('nodes', []))}")
-            print(f"  - Connections: {len(structured_result.get('connections', []))}")
-            
-        except Exception as e:
-            print(f"✗ Error processing {topic_key}: {e}")
-            import traceback
-            traceback.print_exc()
-            # Store error information
-            results[topic_key] = {
-                "title": topic_title,
-                "original_transcript": transcript,
-                "error": str(e),
-                "nodes": [],
-                "connections": []
+    if max_workers <= 1:
+        for topic_key, topic_data in topics_data.items():
+            result = process_topic(topic_key, topic_data, mode, classifier_threshold, journal, sub_chunk_chars, repair)
+            if result is not None:
+                results[topic_key] = result
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                topic_key: executor.submit(
+                    process_topic,
+                    topic_key,
+                    topic_data,
+                    mode,
+                    classifier_threshold,
+                    journal,
+                    sub_chunk_chars,
+                    repair
+                )
+                for topic_key, topic_data in topics_data.items()
             }
+            # Collect in the original topic_N order, whatever the completion order
+            for topic_key, future in futures.items():
+                result = future.result()
+                if result is not None:
+                    results[topic_key] = result
     
     # Save results to output file
     print("\n" + "=" * 80)
@@ -95,6 +215,7 @@ def process_transcript_topics_file(
     
     # Count by schema type
     schema_counts = {}
+    local_selections = 0
     total_nodes = 0
     total_connections = 0
     
@@ -102,15 +223,23 @@ def process_transcript_topics_file(
         if "error" not in result:
             schema = result.get("schema_type", "unknown")
             schema_counts[schema] = schema_counts.get(schema, 0) + 1
+            if (result.get("schema_selection") or {}).get("source") == "local":
+                local_selections += 1
             total_nodes += len(result.get("nodes", []))
             total_connections += len(result.get("connections", []))
     
     print(f"\nSchema distribution:")
     for schema, count in sorted(schema_counts.items()):
         print(f"  - {schema}: {count} topics")
+    if classifier_threshold is not None:
+        print(f"Schema selected locally (LLM call skipped): {local_selections} topics")
     
     print(f"\nTotal nodes extracted: {total_nodes}")
     print(f"Total connections extracted: {total_connections}")
+    violations = validate_episode(EpisodeGraph.from_dict(results))
+    print(f"Schema validation: {format_violation_counts(violations)}")
+    print_cache_stats()
+    print_token_totals()
     print("=" * 80)
     
     return results
@@ -118,18 +247,42 @@ def process_transcript_topics_file(
 
 def main():
     """Main function for command-line usage."""
-    if len(sys.argv) < 3:
-        print("Usage: python text_to_structure.py <input_topics_file> <output_file>")
+    # --checkpoint, --repair and --sub-chunks can appear anywhere on the command line
+    checkpoint = "--checkpoint" in sys.argv
+    repair = "--repair" in sys.argv
+    sub_chunks = "--sub-chunks" in sys.argv
+    args = [arg for arg in sys.argv if arg not in ("--checkpoint", "--repair", "--sub-chunks")]
+    
+    if len(args) < 3:
+        print("Usage: python text_to_structure.py <input_topics_file> <output_file> [max_workers] [mode] [classifier_threshold] [--checkpoint] [--repair] [--sub-chunks]")
         print("  input_topics_file: Path to JSON file with topics (e.g., transcription_topics.json)")
         print("  output_file: Path to save the structured output JSON file")
+        print("  max_workers: Number of topics processed concurrently (default: 1)")
+        print("  mode: two_step or fused (default: two_step)")
+        print("  classifier_threshold: Confidence (0-1) above which the schema is picked locally (default: none, disabled; the classifier is only validated in-sample)")
+        print("  --checkpoint: Journal each completed topic and resume from the journal on rerun")
+        print("  --repair: Fix invalid responses with short corrective follow-ups instead of failing")
+        print(f"  --sub-chunks: Structure topics longer than {DEFAULT_SUB_CHUNK_CHARS} characters in parallel sub-chunks")
         print("\nExample:")
-        print("  python text_to_structure.py transcription_topics.json structured_output.json")
+        print("  python text_to_structure.py transcription_topics.json structured_output.json 8 --checkpoint")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = args[1]
+    output_file = args[2]
+    max_workers = int(args[3]) if len(args) > 3 else 1
+    mode = args[4] if len(args) > 4 else "two_step"
+    classifier_threshold = float(args[5]) if len(args) > 5 and args[5] != "none" else None
     
-    process_transcript_topics_file(input_file, output_file)
+    process_transcript_topics_file(
+        input_file,
+        output_file,
+        max_workers=max_workers,
+        mode=mode,
+        classifier_threshold=classifier_threshold,
+        checkpoint=checkpoint,
+        sub_chunk_chars=DEFAULT_SUB_CHUNK_CHARS if sub_chunks else None,
+        repair=repair
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,219 @@
+import math
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List, Callable, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    # Listed in requirements.txt; without it, tokens are estimated from the text length
+    tiktoken = None
+
+
+# Context window of each model, in tokens
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_TOKENS = 128000
+# Maximum completion tokens of each model
+MODEL_MAX_OUTPUT_TOKENS = {
+    "gpt-4o": 16384,
+    "gpt-4o-mini": 16384,
+}
+DEFAULT_MAX_OUTPUT_TOKENS = 16384
+# Tokens kept free for the response
+DEFAULT_OUTPUT_TOKENS = 16384
+# Chat formatting overhead: per message, and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+
+
+class TokenBudgetExceeded(ValueError):
+    """Raised before sending a request whose prompt does not fit the budget."""
+
+
+_fallback_warned = False
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    global _fallback_warned
+    if tiktoken is None:
+        if not _fallback_warned:
+            _fallback_warned = True
+            print("Warning: tiktoken is not installed; token counts are estimated as 1 token per 4 characters "
+                  "(pip install tiktoken for exact counts)")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count the tokens of a text, with tiktoken if installed."""
+    encoding = _encoding(model)
+    if encoding is None:
+        # Rough estimate: 1 token ≈ 4 characters
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str = "gpt-4o") -> int:
+    """Count the prompt tokens of a chat request."""
+    total = REPLY_OVERHEAD_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(str(message.get("content") or ""), model)
+    return total
+
+
+def prompt_budget(model: str = "gpt-4o", output_tokens: Optional[int] = None) -> int:
+    """
+    Get the number of prompt tokens a request may use.
+
+    Configured through the environment:
+        LLM_CONTEXT_TOKENS: context window (default: the model's)
+        LLM_OUTPUT_TOKENS: tokens kept free for the response (default: 16384)
+    """
+    context = int(os.getenv("LLM_CONTEXT_TOKENS", MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)))
+    if output_tokens is None:
+        output_tokens = int(os.getenv("LLM_OUTPUT_TOKENS", DEFAULT_OUTPUT_TOKENS))
+    return context - output_tokens
+
+
+def max_output_tokens(model: str = "gpt-4o") -> int:
+    """Get the number of tokens a response may have (env: LLM_MAX_OUTPUT_TOKENS)."""
+    return int(os.getenv("LLM_MAX_OUTPUT_TOKENS", MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)))
+
+
+def check_budget(
+    messages: List[Dict[str, Any]],
+    model: str = "gpt-4o",
+    output_tokens: Optional[int] = None
+) -> int:
+    """
+    Check that a request fits the budget before sending it.
+
+    Returns:
+        The prompt tokens of the request
+
+    Raises:
+        TokenBudgetExceeded: If the prompt is over the budget
+    """
+    tokens = count_message_tokens(messages, model)
+    budget = prompt_budget(model, output_tokens)
+    if tokens > budget:
+        raise TokenBudgetExceeded(f"prompt has {tokens} tokens, budget is {budget}")
+    return tokens
+
+
+def trim_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """Keep the beginning of a text, up to max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def fit_to_budget(
+    build: Callable[[str], List[Dict[str, Any]]],
+    text: str,
+    model: str = "gpt-4o",
+    output_tokens: Optional[int] = None,
+    label: str = "input"
+) -> List[Dict[str, Any]]:
+    """
+    Build a request, trimming the variable text if the request is over budget.
+
+    Args:
+        build: Function building the messages around a text
+        text: Variable part of the request (e.g., a transcript)
+        model: Model the request is for
+        output_tokens: Tokens kept free for the response
+        label: Name of the text in the warning printed when trimming
+
+    Returns:
+        The messages, built with the whole text or with its longest prefix that fits
+    """
+    messages = build(text)
+    budget = prompt_budget(model, output_tokens)
+    tokens = count_message_tokens(messages, model)
+    if tokens <= budget:
+        return messages
+
+    # The text may appear more than once in the messages (e.g., conversation history)
+    overhead = count_message_tokens(build(""), model)
+    text_tokens = count_tokens(text, model)
+    per_text = max(1, tokens - overhead) / max(1, text_tokens)
+    keep = int((budget - overhead) / per_text)
+    while True:
+        trimmed = trim_to_tokens(text, keep, model)
+        messages = build(trimmed)
+        if count_message_tokens(messages, model) <= budget or keep <= 0:
+            break
+        keep -= max(1, keep // 100)
+
+    print(
+        f"Warning: {label} is over the token budget ({tokens} > {budget}), trimmed to {keep} of {text_tokens} "
+        f"tokens: the last {len(text) - len(trimmed)} of {len(text)} characters are dropped"
+    )
+    return messages
+
+
+class TokenLedger:
+    """Per-stage totals of the tokens sent to and received from the API."""
+
+    def __init__(self):
+        """Initialize a TokenLedger instance."""
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, prompt_tokens: int, completion_tokens: int, cached: bool = False) -> None:
+        """Add one request to the totals of a stage."""
+        with self._lock:
+            totals = self._totals.setdefault(
+                stage,
+                {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_requests": 0}
+            )
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_requests"] += cached
+
+    def get_totals(self) -> Dict[str, Dict[str, int]]:
+        """Get a copy of the totals of every stage."""
+        with self._lock:
+            return {stage: dict(totals) for stage, totals in self._totals.items()}
+
+    def __repr__(self) -> str:
+        return f"TokenLedger(stages={sorted(self._totals)})"
+
+
+_default_ledger = TokenLedger()
+
+
+def get_token_ledger() -> TokenLedger:
+    """Get the process-wide ledger shared by all call sites."""
+    return _default_ledger
+
+
+def print_token_totals(ledger: Optional[TokenLedger] = None) -> None:
+    """Print the token totals of this run, per stage."""
+    totals = (ledger or get_token_ledger()).get_totals()
+    if not totals:
+        return
+    counter = "tiktoken" if tiktoken is not None else "estimated"
+    print(f"Tokens per stage ({counter}):")
+    for stage, stage_totals in totals.items():
+        print(
+            f"  - {stage}: {stage_totals['requests']} requests "
+            f"({stage_totals['cached_requests']} cached), "
+            f"{stage_totals['prompt_tokens']} prompt + {stage_totals['completion_tokens']} completion tokens"
+        )
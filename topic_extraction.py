@@ -1,13 +1,16 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import re
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+from llm_cache import cached_chat_completion, print_cache_stats
+from token_budget import count_tokens, count_message_tokens, max_output_tokens, prompt_budget, print_token_totals
+from llm_client import get_client
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-    )
+client = get_client()
 
 def System_prompt():
     return f"""You are an expert at reading, understanding and analyzing transcripts of podcasts. 
@@ -51,7 +54,414 @@ def User_prompt(transcript):
             {transcript}
         """
 
-def extract_topics(transcript_path):
+def parse_speaker_turns(transcript: str) -> List[Dict[str, Any]]:
+    """
+    Split a transcript into speaker turns.
+    
+    The transcript is a sequence of blocks separated by blank lines, each
+    block being a speaker name on its own line followed by what they said.
+    
+    Returns:
+        List of turns with "speaker", "text", and the "start"/"end" character
+        offsets of the block in the transcript
+    """
+    turns = []
+    for match in re.finditer(r"[^\n](?:.|\n(?!\s*\n))*", transcript):
+        block = match.group(0)
+        speaker, _, text = block.partition("\n")
+        turns.append({
+            "speaker": speaker.strip(),
+            "text": " ".join(text.split()),
+            "start": match.start(),
+            "end": match.end()
+        })
+    return turns
+
+
+def splice_turns(turns: List[Dict[str, Any]], start: int, end: int) -> str:
+    """Rebuild the transcript of turns[start:end] in the topics file format."""
+    return " ".join(
+        f"{turn['speaker']} {turn['text']}".strip()
+        for turn in turns[start:end]
+    )
+
+
+def format_numbered_turns(turns: List[Dict[str, Any]], start: int, end: int) -> str:
+    """Render turns[start:end] with their global turn index for the model."""
+    return "\n\n".join(
+        f"[{index}] {turns[index]['speaker']}: {turns[index]['text']}"
+        for index in range(start, end)
+    )
+
+
+def split_into_windows(
+    turns: List[Dict[str, Any]],
+    window_chars: int = 12000,
+    overlap_turns: int = 2
+) -> List[Tuple[int, int]]:
+    """
+    Group speaker turns into overlapping windows.
+    
+    Windows always start and end on speaker-turn boundaries. Each window
+    after the first repeats the last overlap_turns turns of the previous one
+    so the model can tell whether a topic carries over the seam.
+    
+    Returns:
+        List of (start_turn, end_turn) ranges, end exclusive
+    """
+    windows = []
+    start = 0
+    while start < len(turns):
+        end = start
+        size = 0
+        while end < len(turns) and (end == start or size + len(turns[end]["text"]) <= window_chars):
+            size += len(turns[end]["text"])
+            end += 1
+        windows.append((start, end))
+        if end >= len(turns):
+            break
+        start = max(end - overlap_turns, start + 1)
+    return windows
+
+
+def Window_system_prompt():
+    return """You are an expert at reading, understanding and analyzing transcripts of podcasts.
+    Your job is to split a window of a podcast transcript into key topics, in the same order as they were discussed.
+    Every speaker turn in the window is prefixed with its turn number in brackets, e.g. [12].
+    
+    You must NOT return the transcript text. Return only where each topic starts, in the following JSON output format:
+    {
+        "segments": [
+            {"start_turn": <turn number where the first topic starts (the first turn of the window)>, "title": "title of the first topic"},
+            {"start_turn": <turn number where the second topic starts>, "title": "title of the second topic"},
+            ...
+        ]
+    }
+
+    Instructions:
+    - Don't include any other text in your response except the JSON output format.
+    - The first segment must start at the first turn of the window. Each segment runs until the next segment starts.
+    - Segments must be in increasing order of start_turn and use only turn numbers present in the window.
+    - The topics must be different. No topic should be a subset of another topic. Limit the number of topics as much as possible.
+    """
+
+
+def Window_user_prompt(numbered_turns):
+    return f"""Read the following window of a podcast transcript and return where each topic starts.
+            Transcript window:
+            {numbered_turns}
+        """
+
+
+def _classify_window(turns: List[Dict[str, Any]], window: Tuple[int, int]) -> List[Tuple[int, str]]:
+    """Ask the model for the topic boundaries of one window."""
+    start, end = window
+    content = cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": Window_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": Window_user_prompt(format_numbered_turns(turns, start, end))
+            }
+        ],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+        stage="topics"
+    )
+    
+    segments = []
+    for segment in json.loads(content).get("segments", []):
+        try:
+            turn = int(segment.get("start_turn"))
+        except (TypeError, ValueError):
+            continue
+        if start <= turn < end and (not segments or turn > segments[-1][0]):
+            segments.append((turn, segment.get("title") or "Untitled topic"))
+    
+    # The first segment always opens the window
+    if not segments:
+        segments = [(start, "Untitled topic")]
+    elif segments[0][0] != start:
+        segments[0] = (start, segments[0][1])
+    return segments
+
+
+def merge_window_segments(
+    windows: List[Tuple[int, int]],
+    window_segments: List[List[Tuple[int, str]]]
+) -> List[Tuple[int, str]]:
+    """
+    Merge per-window segments into topic boundaries for the whole transcript.
+    
+    Turns in an overlap belong to the earlier window; the later window only
+    uses them as context. If the later window's first owned topic already
+    started inside the overlap (or has the same title), it continues the
+    earlier window's last topic and the two are merged.
+    
+    Returns:
+        List of (start_turn, title) boundaries in transcript order
+    """
+    boundaries = []
+    owned_from = 0
+    for (start, end), segments in zip(windows, window_segments):
+        # Topic that covers the first turn this window owns
+        carried_over = [seg for seg in segments if seg[0] <= owned_from]
+        current_start, current_title = carried_over[-1] if carried_over else segments[0]
+        
+        continues_previous = bool(boundaries) and (
+            current_start < owned_from
+            or current_title.strip().lower() == boundaries[-1][1].strip().lower()
+        )
+        if not continues_previous:
+            boundaries.append((owned_from, current_title))
+        
+        for turn, title in segments:
+            if turn > owned_from:
+                if title.strip().lower() != boundaries[-1][1].strip().lower():
+                    boundaries.append((turn, title))
+        owned_from = end
+    return boundaries
+
+
+def extract_topics_chunked(
+    transcript: str,
+    window_chars: int = 12000,
+    overlap_turns: int = 2,
+    max_workers: int = 4
+) -> Dict[str, Dict[str, str]]:
+    """
+    Classify a transcript into topics window by window.
+    
+    The transcript is split into overlapping windows on speaker-turn
+    boundaries, the windows are classified concurrently, and adjacent
+    windows that share a topic are merged. The model only returns turn
+    numbers and titles; topic transcripts are spliced locally.
+    
+    Args:
+        transcript: Full transcript text
+        window_chars: Approximate size of a window in characters
+        overlap_turns: Number of turns repeated between consecutive windows
+        max_workers: Number of windows classified concurrently
+        
+    Returns:
+        Topics in the same format as extract_topics
+    """
+    turns = parse_speaker_turns(transcript)
+    if not turns:
+        return {}
+    
+    windows = split_into_windows(turns, window_chars, overlap_turns)
+    print(f"Classifying {len(turns)} speaker turns in {len(windows)} windows...")
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        window_segments = list(executor.map(lambda window: _classify_window(turns, window), windows))
+    
+    boundaries = merge_window_segments(windows, window_segments)
+    
+    topics = {}
+    for i, (start, title) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(turns)
+        topics[f"topic_{i + 1}"] = {
+            "title": title,
+            "transcript": splice_turns(turns, start, end)
+        }
+    return topics
+
+
+def split_sentences(turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Split speaker turns into sentences.
+    
+    Returns:
+        List of sentences with their "turn" index, "speaker" and "text"
+    """
+    sentences = []
+    for turn_index, turn in enumerate(turns):
+        for text in re.split(r"(?<=[.!?])\s+", turn["text"]):
+            if text:
+                sentences.append({"turn": turn_index, "speaker": turn["speaker"], "text": text})
+    return sentences
+
+
+def splice_sentences(sentences: List[Dict[str, Any]], start: int, end: int) -> str:
+    """
+    Rebuild the transcript of sentences[start:end] in the topics file format.
+    
+    The speaker name is written at the start of every turn, and at the start
+    of the range when a topic begins in the middle of a turn.
+    """
+    parts = []
+    previous_turn = None
+    for sentence in sentences[start:end]:
+        if sentence["turn"] != previous_turn:
+            parts.append(sentence["speaker"])
+            previous_turn = sentence["turn"]
+        parts.append(sentence["text"])
+    return " ".join(part for part in parts if part)
+
+
+def format_numbered_sentences(sentences: List[Dict[str, Any]]) -> str:
+    """Render sentences with their index, opening each turn with the speaker name."""
+    lines = []
+    previous_turn = None
+    for index, sentence in enumerate(sentences):
+        if sentence["turn"] != previous_turn:
+            lines.append(f"[{index}] {sentence['speaker']}: {sentence['text']}")
+            previous_turn = sentence["turn"]
+        else:
+            lines.append(f"[{index}] {sentence['text']}")
+    return "\n".join(lines)
+
+
+def verify_topic_coverage(ranges: List[Tuple[int, int]], total: int) -> List[str]:
+    """
+    Check that topic ranges cover every sentence exactly once, in order.
+    
+    Args:
+        ranges: (first_sentence, last_sentence) pairs, both inclusive
+        total: Number of sentences in the transcript
+        
+    Returns:
+        List of problems found; empty if the coverage is full and non-overlapping
+    """
+    problems = []
+    if not ranges:
+        return [f"no topics returned for {total} sentences"] if total else []
+    
+    expected = 0
+    for i, (first, last) in enumerate(ranges):
+        if first > last:
+            problems.append(f"topic {i + 1} is empty or reversed ({first}-{last})")
+        if first > expected:
+            problems.append(f"sentences {expected}-{first - 1} are not covered (gap before topic {i + 1})")
+        elif first < expected:
+            problems.append(f"sentences {first}-{expected - 1} are covered twice (topic {i + 1} overlaps)")
+        expected = max(expected, last + 1)
+    
+    if expected < total:
+        problems.append(f"sentences {expected}-{total - 1} are not covered (after the last topic)")
+    elif expected > total:
+        problems.append(f"topics reference sentences up to {expected - 1}, but there are only {total}")
+    return problems
+
+
+def normalize_topic_ranges(ranges: List[Tuple[int, int]], total: int) -> List[Tuple[int, int]]:
+    """
+    Turn possibly overlapping or gapped ranges into a contiguous partition.
+    
+    Each topic keeps its start; it runs until the next topic starts, so gaps
+    are absorbed by the preceding topic and overlaps are cut.
+    """
+    starts = sorted({min(max(first, 0), total - 1) for first, _ in ranges} | {0})
+    return [
+        (start, (starts[i + 1] if i + 1 < len(starts) else total) - 1)
+        for i, start in enumerate(starts)
+    ]
+
+
+def Offsets_system_prompt():
+    return """You are an expert at reading, understanding and analyzing transcripts of podcasts.
+    Your job is to classify the complete transcript of the podcast into key topics, in the same order as they were discussed.
+    Every sentence of the transcript is prefixed with its sentence number in brackets, e.g. [12]. The first sentence of each speaker turn also carries the speaker name.
+    
+    You must NOT return the transcript text. Return only the sentence range of each topic, in the following JSON output format:
+    {
+        "topics": [
+            {"title": "title of the first topic", "first_sentence": 0, "last_sentence": <last sentence number of the first topic>},
+            {"title": "title of the second topic", "first_sentence": <last sentence of the previous topic + 1>, "last_sentence": <...>},
+            ...
+            {"title": "title of the last topic", "first_sentence": <...>, "last_sentence": <number of the last sentence of the transcript>}
+        ]
+    }
+
+    Instructions:
+    - Don't include any other text in your response except the JSON output format.
+    - The topics should cover the whole conversation, FROM THE VERY BEGINNING TO THE VERY END: every sentence belongs to exactly one topic and the ranges must not overlap.
+    - The topics must be different. No topic should be a subset of another topic. Limit the number of topics as much as possible.
+    - Each topic should cover a considerable amount of the transcript.
+    """
+
+
+def Offsets_user_prompt(numbered_sentences):
+    return f"""Read the following podcast transcript and return the sentence range of every topic.
+            Transcript:
+            {numbered_sentences}
+        """
+
+
+def extract_topics_by_offsets(transcript: str) -> Dict[str, Dict[str, str]]:
+    """
+    Classify a transcript into topics from sentence ranges.
+    
+    The model returns only a title and a (first_sentence, last_sentence)
+    range per topic. The ranges are checked with verify_topic_coverage and
+    each topic transcript is sliced from the source locally.
+    
+    Args:
+        transcript: Full transcript text
+        
+    Returns:
+        Topics in the same format as extract_topics
+    """
+    sentences = split_sentences(parse_speaker_turns(transcript))
+    if not sentences:
+        return {}
+    
+    print(f"Classifying {len(sentences)} sentences by offsets...")
+    content = cached_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": Offsets_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": Offsets_user_prompt(format_numbered_sentences(sentences))
+            }
+        ],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+        stage="topics"
+    )
+    
+    titles = []
+    ranges = []
+    for topic in json.loads(content).get("topics", []):
+        try:
+            ranges.append((int(topic.get("first_sentence")), int(topic.get("last_sentence"))))
+        except (TypeError, ValueError):
+            continue
+        titles.append(topic.get("title") or "Untitled topic")
+    
+    problems = verify_topic_coverage(ranges, len(sentences))
+    if problems:
+        print("Warning: topic ranges do not cover the transcript exactly:")
+        for problem in problems:
+            print(f"  - {problem}")
+        # Keep the title of the topic that starts at each boundary
+        title_by_start = {}
+        for (first, _), title in zip(ranges, titles):
+            title_by_start.setdefault(min(max(first, 0), len(sentences) - 1), title)
+        ranges = normalize_topic_ranges(ranges, len(sentences))
+        titles = [title_by_start.get(first, "Untitled topic") for first, _ in ranges]
+    
+    return {
+        f"topic_{i + 1}": {
+            "title": title,
+            "transcript": splice_sentences(sentences, first, last + 1)
+        }
+        for i, ((first, last), title) in enumerate(zip(ranges, titles))
+    }
+
+
+def extract_topics(transcript_path, mode="full", max_workers=4):
     try:
         with open(transcript_path, "r", encoding="utf-8") as f:
             transcript = f.read()
@@ -62,30 +472,50 @@ def extract_topics(transcript_path):
         print(f"Error reading transcript file: {e}")
         sys.exit(1)
     
-    # Check if transcript is too long (OpenAI has token limits)
-    # Rough estimate: 1 token ≈ 4 characters
-    if len(transcript) > 100000:  # Approx 25k tokens
-        print("Warning: Transcript is very long. Consider chunking it for better results.")
+    if mode in ("chunked", "offsets"):
+        try:
+            if mode == "chunked":
+                return extract_topics_chunked(transcript, max_workers=max_workers)
+            return extract_topics_by_offsets(transcript)
+        except Exception as e:
+            print(f"Error extracting topics in {mode} mode: {e}")
+            sys.exit(1)
+    
+    messages = [
+        {
+            "role": "system",
+            "content": System_prompt()
+        },
+        {
+            "role": "user",
+            "content": User_prompt(transcript)
+        }
+    ]
+    
+    # The model has to return the whole transcript, so the response needs as
+    # many tokens as the transcript itself: both the response and the prompt
+    # must fit
+    transcript_tokens = count_tokens(transcript)
+    if (transcript_tokens > max_output_tokens()
+            or count_message_tokens(messages) > prompt_budget(output_tokens=transcript_tokens)):
+        print(f"Transcript is too long for full mode ({transcript_tokens} tokens), switching to chunked mode")
+        try:
+            return extract_topics_chunked(transcript, max_workers=max_workers)
+        except Exception as e:
+            print(f"Error extracting topics in chunked mode: {e}")
+            sys.exit(1)
     
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
+        topics_json = cached_chat_completion(
+            client,
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": System_prompt()
-                },
-                {
-                    "role": "user",
-                    "content": User_prompt(transcript)
-                }
-            ],
+            messages=messages,
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stage="topics"
         )
         
-        topics_json = response.choices[0].message.content
         try:
             topics = json.loads(topics_json)
             return topics
@@ -103,11 +533,14 @@ def extract_topics(transcript_path):
 def main():
     # Default transcript file, but allow command line argument
     transcript_file = sys.argv[1] if len(sys.argv) > 1 else "transcription.txt"
+    # Mode: "full" (model returns the whole transcript), "offsets" (sentence ranges)
+    # or "chunked" (windowed turn boundaries)
+    mode = sys.argv[2] if len(sys.argv) > 2 else "full"
     
-    print(f"Extracting topics from: {transcript_file}")
+    print(f"Extracting topics from: {transcript_file} (mode: {mode})")
     print("This may take a moment...\n")
     
-    topics = extract_topics(transcript_file)
+    topics = extract_topics(transcript_file, mode=mode)
     
     print("=" * 80)
     print("MAIN TOPICS EXTRACTED:")
@@ -121,6 +554,8 @@ def main():
         json.dump(topics, f, indent=2, ensure_ascii=False)
     
     print(f"\nTopics saved to: {output_file}")
+    print_cache_stats()
+    print_token_totals()
 
 
 if __name__ == "__main__":